@@ -66,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'shop.context_processors.wishlist',
             ],
         },
     },
@@ -85,6 +86,30 @@ DATABASES = {
 }
 
 
+# Cache (catalog query results are memoized here)
+# Buffered product view counters (shop.view_counter) live in their own 'views'
+# cache so catalog entries never evict them; use a shared backend
+# (Redis/Memcached) in production so every worker and the flush_view_counts
+# command see the same counters.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'online-shop',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    'views': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'online-shop-views',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -163,6 +188,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'shop.views': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
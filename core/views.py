@@ -7,14 +7,17 @@ from django.contrib import messages
 from django.core.files.storage import default_storage
 from django.http import JsonResponse
 from django.db.models import F
+from shop.page_cache import anonymous_page_cache
 
+@anonymous_page_cache('home')
 def home(request):
-    """Home page with latest/most viewed products and recent blog posts"""
-    from shop.models import Product, Banner
+    """Home page with latest/most viewed/trending products and recent blog posts"""
+    from shop.models import ProductCard, Banner
     from blog.models import Post
 
-    latest_products = Product.objects.filter(is_active=True).order_by('-created_at')[:5]
-    most_viewed_products = Product.objects.filter(is_active=True).order_by('-view_count')[:5]
+    latest_products = ProductCard.objects.filter(is_active=True).order_by('-created_at')[:5]
+    most_viewed_products = ProductCard.objects.filter(is_active=True).order_by('-view_count')[:5]
+    trending_products = ProductCard.objects.filter(is_active=True, trending_score__gt=0).order_by('-trending_score', '-pk')[:5]
     recent_posts = Post.objects.filter(status='published').order_by('-published_at')[:3]
     
     # Get active banner
@@ -23,6 +26,7 @@ def home(request):
     return render(request, 'home.html', {
         'latest_products': latest_products,
         'most_viewed_products': most_viewed_products,
+        'trending_products': trending_products,
         'recent_posts': recent_posts,
         'active_banner': active_banner,
     })
@@ -197,17 +201,19 @@ def profile(request):
     """Profile view - display user information"""
     user = request.user
     # سفارش‌ها و علاقه‌مندی‌ها برای نمایش در تب‌ها
-    from shop.models import Order, Wishlist
+    from shop.models import Order, Wishlist, ProductCard
     orders = Order.objects.filter(user=user).order_by('-created_at')
     wishlist = None
     try:
         wishlist = Wishlist.objects.get(user=user)
     except Wishlist.DoesNotExist:
         wishlist = None
+    wishlist_cards = ProductCard.objects.filter(product__wishlisted_by=wishlist) if wishlist else []
     return render(request, 'core/profile.html', {
         'user': user,
         'orders': orders,
         'wishlist': wishlist,
+        'wishlist_cards': wishlist_cards,
     })
 
 def get_cities(request):
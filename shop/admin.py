@@ -4,10 +4,14 @@ from django.utils import timezone
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.contrib.admin import AdminSite
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
-from .models import Category, Product, ProductImage, ProductSpecification, Brand, Comment, Cart, CartItem, Wishlist, Order, OrderItem, Settings, Banner, ShippingSettings
+import time
+from .models import Category, Product, ProductImage, ProductSpecification, Brand, Comment, Cart, CartItem, Wishlist, Order, OrderItem, Settings, Banner, ShippingSettings, StockReservation
+from .counts import brand_products_count, category_products_count
+from .inventory import release_holds
+from .ratings import moderate
 
 # Custom Admin Site
 class BeautyShopAdminSite(AdminSite):
@@ -82,7 +86,7 @@ class BrandAdmin(admin.ModelAdmin):
     ordering = ['name']
     
     def get_products_count(self, obj):
-        return obj.get_products_count()
+        return brand_products_count(obj.id)
     get_products_count.short_description = 'تعداد محصولات'
 
 @admin.register(Category)
@@ -94,7 +98,7 @@ class CategoryAdmin(admin.ModelAdmin):
     ordering = ['name']
     
     def get_products_count(self, obj):
-        return obj.get_products_count()
+        return category_products_count(obj.id)
     get_products_count.short_description = 'تعداد محصولات'
 
 @admin.register(Product)
@@ -109,7 +113,7 @@ class ProductAdmin(admin.ModelAdmin):
     ]
     search_fields = ['name', 'description', 'brand__name', 'model']
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ['rating', 'review_count', 'created_at', 'updated_at', 'get_comments_summary']
+    readonly_fields = ['rating', 'review_count', 'reserved_quantity', 'created_at', 'updated_at', 'get_comments_summary']
     inlines = [ProductImageInline, ProductSpecificationInline]
     
     fieldsets = (
@@ -120,7 +124,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('price', 'original_price', 'discount_percentage', 'discount_amount')
         }),
         ('موجودی', {
-            'fields': ('stock_quantity', 'min_stock_alert')
+            'fields': ('stock_quantity', 'reserved_quantity', 'min_stock_alert')
         }),
         ('جزئیات محصول', {
             'fields': ('model', 'color', 'size', 'weight', 'dimensions')
@@ -295,28 +299,23 @@ class CommentAdmin(CommentStatsWidget):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('product', 'user')
     
-    def save_model(self, request, obj, form, change):
-        super().save_model(request, obj, form, change)
-        # Update product rating when comment is approved/unapproved
-        if 'is_approved' in form.changed_data:
-            obj.product.update_rating()
-    
     actions = ['approve_comments', 'disapprove_comments', 'delete_selected']
     
     def approve_comments(self, request, queryset):
-        updated = queryset.update(is_approved=True)
-        self.message_user(request, f'{updated} نظر تایید شد.')
-        # Update ratings for affected products
-        for comment in queryset:
-            comment.product.update_rating()
+        started = time.monotonic()
+        # Set-based: one UPDATE plus one grouped recompute for the affected products
+        updated, products = moderate(queryset, approved=True)
+        self.message_user(
+            request, f'{updated} نظر تایید شد؛ امتیاز {products} محصول در {time.monotonic() - started:.2f} ثانیه بازمحاسبه شد.'
+        )
     approve_comments.short_description = 'تایید نظرات انتخاب شده'
     
     def disapprove_comments(self, request, queryset):
-        updated = queryset.update(is_approved=False)
-        self.message_user(request, f'{updated} نظر رد شد.')
-        # Update ratings for affected products
-        for comment in queryset:
-            comment.product.update_rating()
+        started = time.monotonic()
+        updated, products = moderate(queryset, approved=False)
+        self.message_user(
+            request, f'{updated} نظر رد شد؛ امتیاز {products} محصول در {time.monotonic() - started:.2f} ثانیه بازمحاسبه شد.'
+        )
     disapprove_comments.short_description = 'رد نظرات انتخاب شده'
     
     class Media:
@@ -327,13 +326,19 @@ class CommentAdmin(CommentStatsWidget):
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['user', 'is_active', 'created_at', 'updated_at', 'total']
-    list_filter = ['is_active', 'created_at']
-    search_fields = ['user__email', 'user__first_name', 'user__last_name']
-    readonly_fields = ['created_at', 'updated_at']
+    list_display = ['__str__', 'user', 'session_key', 'is_active', 'created_at', 'updated_at', 'total']
+    list_filter = ['is_active', 'created_at', ('user', admin.EmptyFieldListFilter)]
+    search_fields = ['user__email', 'user__first_name', 'user__last_name', 'session_key']
+    readonly_fields = ['session_key', 'created_at', 'updated_at']
+
+    def get_queryset(self, request):
+        # جمع سبدها با یک کوئری گروهی به جای یک aggregate برای هر ردیف
+        return super().get_queryset(request).select_related('user').annotate(
+            subtotal=Sum(F('items__quantity') * F('items__product__price')),
+        )
 
     def total(self, obj):
-        return f"{obj.get_total_amount():,}"
+        return f"{int(obj.subtotal or 0):,}"
 
 
 @admin.register(CartItem)
@@ -426,6 +431,18 @@ class OrderAdmin(admin.ModelAdmin):
         
         super().save_model(request, obj, form, change)
 
+        # لغو یا پرداخت ناموفق از پنل ادمین رزرو موجودی سفارش را آزاد می‌کند
+        if change and obj.status in ('canceled', 'payment_failed'):
+            release_holds([obj.id])
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['order', 'product', 'quantity', 'expires_at', 'created_at']
+    list_filter = ['expires_at']
+    search_fields = ['product__name', 'order__id']
+    raw_id_fields = ['order', 'product']
+
 
 @admin.register(Settings)
 class SettingsAdmin(admin.ModelAdmin):
@@ -0,0 +1,78 @@
+"""همگام‌سازی کارت‌های محصول (ProductCard) با مدل‌های اصلی"""
+from django.db.models import Prefetch
+
+from .models import Product, ProductImage, ProductCard
+
+# فیلدهایی که بدون تغییر از محصول به کارت کپی می‌شوند
+COPIED_FIELDS = [
+    'name', 'slug', 'price', 'original_price', 'discount_percentage', 'has_discount',
+    'rating', 'review_count', 'view_count', 'stock_quantity', 'min_stock_alert',
+    'is_active', 'is_featured', 'is_bestseller', 'is_new', 'is_luxury', 'created_at',
+    'short_description', 'telegram_link', 'instagram_link', 'facebook_link',
+]
+
+DERIVED_FIELDS = [
+    'category', 'category_name', 'category_slug',
+    'brand', 'brand_name', 'brand_slug', 'image_url',
+]
+
+
+def primary_image_url(images):
+    """آدرس تصویر اصلی؛ تصویر علامت‌خورده به عنوان اصلی و در غیر این صورت اولین تصویر"""
+    images = list(images)
+    if not images:
+        return ''
+    image = next((img for img in images if img.is_primary), images[0])
+    try:
+        return image.image.url
+    except ValueError:
+        return ''
+
+
+def build_card(product):
+    """ساخت کارت از محصولی که دسته‌بندی، برند و تصاویر آن بارگذاری شده است"""
+    card = ProductCard(product_id=product.id)
+    for field in COPIED_FIELDS:
+        setattr(card, field, getattr(product, field))
+    card.category_id = product.category_id
+    card.category_name = product.category.name
+    card.category_slug = product.category.slug
+    card.brand_id = product.brand_id
+    card.brand_name = product.brand.name if product.brand else ''
+    card.brand_slug = product.brand.slug if product.brand else ''
+    card.image_url = primary_image_url(product.images.all())
+    return card
+
+
+def refresh_cards(product_ids=None, batch_size=500):
+    """
+    بازسازی کارت محصولات
+
+    Args:
+        product_ids: شناسه محصولات؛ در صورت None همه محصولات بازسازی می‌شوند
+        batch_size: اندازه هر دسته در درج گروهی
+
+    Returns:
+        int: تعداد کارت‌های بازسازی شده
+    """
+    products = Product.objects.select_related('category', 'brand').prefetch_related(
+        Prefetch('images', queryset=ProductImage.objects.order_by('order', 'created_at'))
+    ).order_by()
+    if product_ids is not None:
+        products = products.filter(id__in=list(product_ids))
+
+    cards = [build_card(product) for product in products]
+    ProductCard.objects.bulk_create(
+        cards,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=COPIED_FIELDS + DERIVED_FIELDS + ['updated_at'],
+    )
+    return len(cards)
+
+
+def update_card_fields(product, fields):
+    """به‌روزرسانی مستقیم فیلدهای کپی‌شده کارت با یک UPDATE"""
+    values = {field: getattr(product, field) for field in fields}
+    return ProductCard.objects.filter(product_id=product.id).update(**values)
@@ -0,0 +1,240 @@
+"""سبد خرید سمت سرور روی مدل‌های Cart و CartItem
+
+سبد کاربران وارد شده به کاربر و سبد مهمان‌ها به نشست متصل است (شناسه سبد در
+نشست نگه داشته می‌شود تا پس از تغییر کلید نشست هنگام ورود هم پیدا شود) و هنگام
+ورود با سبد کاربر ادغام می‌شود. افزودن و تغییر تعداد با UPDATE اتمی
+(quantity = quantity + n) انجام می‌شود و تعداد هر قلم به موجودی قابل سفارش
+محصول محدود است. جمع سبد با یک کوئری aggregate محاسبه می‌شود؛ قیمت‌ها همیشه از
+محصول خوانده می‌شوند نه از داده کاربر.
+
+سبد مرورگر (localStorage) فقط تغییراتش نسبت به آخرین نسخه همگام شده را
+می‌فرستد (apply_changes) تا اقلام ادغام شده هنگام ورود یا افزوده شده از
+دستگاه دیگر پاک نشوند؛ جایگزینی کامل (replace_items) فقط با درخواست صریح کاربر.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, Least
+
+from .models import Cart, CartItem, Product
+
+CART_SESSION_KEY = 'cart_id'
+MAX_ITEM_QUANTITY = 100
+# ستون‌های محصول لازم برای قیمت و سقف تعداد اقلام سبد
+PRODUCT_FIELDS = ('id', 'price', 'stock_quantity', 'reserved_quantity')
+
+
+def get_cart(request, create=False):
+    """
+    سبد فعال درخواست (کاربر یا نشست مهمان)
+
+    Args:
+        create: در صورت نبود سبد، سبد جدید ساخته شود
+
+    Returns:
+        Cart یا None
+    """
+    if request.user.is_authenticated:
+        cart = Cart.objects.filter(user=request.user, is_active=True).order_by('-created_at').first()
+        if cart is None and create:
+            cart = Cart.objects.create(user=request.user)
+        return cart
+
+    cart_id = request.session.get(CART_SESSION_KEY)
+    cart = None
+    if cart_id:
+        cart = Cart.objects.filter(id=cart_id, user__isnull=True, is_active=True).first()
+    if cart is None and create:
+        if not request.session.session_key:
+            request.session.save()
+        cart = Cart.objects.create(session_key=request.session.session_key)
+        request.session[CART_SESSION_KEY] = cart.id
+    return cart
+
+
+def item_limit(product):
+    """بیشترین تعداد مجاز یک محصول در سبد (موجودی قابل سفارش، حداکثر MAX_ITEM_QUANTITY)"""
+    return min(product.available_quantity, MAX_ITEM_QUANTITY)
+
+
+def add_item(cart, product, quantity=1):
+    """
+    افزودن محصول به سبد با upsert اتمی؛ تعداد به موجودی قابل سفارش محدود می‌شود
+
+    Args:
+        product: محصول با ستون‌های PRODUCT_FIELDS
+
+    Returns:
+        int: تعداد جدید این محصول در سبد (صفر اگر محصول موجود نباشد)
+    """
+    limit = item_limit(product)
+    if limit <= 0:
+        return 0
+    items = CartItem.objects.filter(cart=cart, product=product)
+    added = Least(F('quantity') + quantity, limit)
+    with transaction.atomic():
+        if not items.update(quantity=added, price=product.price):
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(
+                        cart=cart, product=product, quantity=min(quantity, limit), price=product.price,
+                    )
+            except IntegrityError:
+                # درج همزمان همین محصول؛ افزایش روی ردیف موجود
+                items.update(quantity=added, price=product.price)
+    return items.values_list('quantity', flat=True).first()
+
+
+def set_quantity(cart, product, quantity):
+    """تنظیم تعداد یک محصول (محدود به موجودی)؛ تعداد صفر یا کمتر آن را حذف می‌کند"""
+    quantity = min(quantity, item_limit(product))
+    if quantity <= 0:
+        remove_item(cart, product.id)
+        return 0
+    CartItem.objects.bulk_create(
+        [CartItem(cart=cart, product=product, quantity=quantity, price=product.price)],
+        update_conflicts=True,
+        unique_fields=['cart', 'product'],
+        update_fields=['quantity', 'price'],
+    )
+    return quantity
+
+
+def remove_item(cart, product_id):
+    """حذف یک محصول از سبد"""
+    CartItem.objects.filter(cart=cart, product_id=product_id).delete()
+
+
+def clear(cart):
+    """خالی کردن سبد"""
+    cart.items.all().delete()
+
+
+def apply_changes(cart, changes):
+    """
+    اعمال تغییرات سبد مرورگر (نگاشت شناسه محصول به افزایش یا کاهش تعداد)
+
+    اقلامی که مرورگر از آن‌ها خبر ندارد (ادغام هنگام ورود یا دستگاه دیگر) دست
+    نمی‌خورند؛ اقلامی که تعدادشان به صفر برسد حذف می‌شوند.
+
+    Returns:
+        list: شناسه محصولاتی که نادیده گرفته شدند (غیرفعال یا ناموجود)
+    """
+    products = Product.objects.filter(is_active=True).only(*PRODUCT_FIELDS).in_bulk(list(changes))
+    with transaction.atomic():
+        for product_id, delta in changes.items():
+            if product_id not in products or not delta:
+                continue
+            if delta > 0:
+                add_item(cart, products[product_id], delta)
+                continue
+            items = cart.items.filter(product_id=product_id)
+            # کاهش به صفر یا کمتر قلم را حذف می‌کند
+            if not items.filter(quantity__gt=-delta).update(quantity=F('quantity') + delta):
+                items.delete()
+    return [product_id for product_id in changes if product_id not in products]
+
+
+def replace_items(cart, quantities):
+    """
+    جایگزینی کامل محتوای سبد با نگاشت شناسه محصول به تعداد (فقط با درخواست صریح
+    کاربر، مثل خالی کردن سبد یا ثبت سفارش)
+
+    محصولات با یک کوئری in_bulk خوانده می‌شوند و محصولات غیرفعال کنار گذاشته
+    می‌شوند. تعدادها به موجودی محدود نمی‌شوند تا کمبود هنگام ثبت سفارش گزارش شود.
+
+    Returns:
+        list: شناسه محصولاتی که نادیده گرفته شدند
+    """
+    products = Product.objects.filter(is_active=True).only('id', 'price').in_bulk(list(quantities))
+    rows = [
+        CartItem(cart=cart, product=product, quantity=min(quantities[product_id], MAX_ITEM_QUANTITY), price=product.price)
+        for product_id, product in products.items()
+        if quantities[product_id] > 0
+    ]
+    with transaction.atomic():
+        cart.items.exclude(product_id__in=[row.product_id for row in rows]).delete()
+        CartItem.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'price'],
+        )
+    return [product_id for product_id in quantities if product_id not in products]
+
+
+def cart_totals(cart):
+    """
+    جمع سبد با یک کوئری aggregate بر اساس قیمت فعلی محصولات
+
+    Returns:
+        dict: lines (تعداد ردیف‌ها)، quantity (تعداد کل اقلام) و subtotal
+    """
+    if cart is None:
+        return {'lines': 0, 'quantity': 0, 'subtotal': 0}
+    return cart.items.aggregate(
+        lines=Count('id'),
+        quantity=Coalesce(Sum('quantity'), 0),
+        subtotal=Coalesce(
+            Sum(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=14, decimal_places=0)),
+            0, output_field=DecimalField(max_digits=14, decimal_places=0),
+        ),
+    )
+
+
+def serialize_cart(cart):
+    """داده JSON سبد برای فرانت‌اند"""
+    from .cards import primary_image_url
+
+    items = []
+    for item in cart.items.select_related('product').prefetch_related('product__images').order_by('created_at', 'id') if cart else []:
+        items.append({
+            'id': item.product_id,
+            'name': item.product.name,
+            'slug': item.product.slug,
+            'price': int(item.product.price),
+            'quantity': item.quantity,
+            'image': primary_image_url(item.product.images.all()),
+            'is_active': item.product.is_active,
+        })
+    totals = cart_totals(cart)
+    return {
+        'items': items,
+        'lines': totals['lines'],
+        'quantity': totals['quantity'],
+        'subtotal': int(totals['subtotal']),
+    }
+
+
+def merge_session_cart(request, user):
+    """ادغام سبد مهمان نشست با سبد کاربر پس از ورود"""
+    cart_id = request.session.pop(CART_SESSION_KEY, None)
+    if not cart_id:
+        return
+    guest_cart = Cart.objects.filter(id=cart_id, user__isnull=True, is_active=True).first()
+    if guest_cart is None:
+        return
+
+    user_cart = Cart.objects.filter(user=user, is_active=True).order_by('-created_at').first()
+    if user_cart is None:
+        # سبد مهمان مستقیماً به کاربر منتقل می‌شود
+        guest_cart.user = user
+        guest_cart.session_key = ''
+        guest_cart.save(update_fields=['user', 'session_key', 'updated_at'])
+        return
+
+    with transaction.atomic():
+        existing = set(user_cart.items.values_list('product_id', flat=True))
+        guest_items = guest_cart.items.all()
+        # اقلام مشترک با یک UPDATE به ازای هر قلم جمع زده می‌شوند (محدود به موجودی،
+        # مثل add_item) و اقلام جدید با یک UPDATE گروهی به سبد کاربر منتقل می‌شوند
+        shared = guest_items.filter(product_id__in=existing).select_related('product').only(
+            'quantity', *(f'product__{field}' for field in PRODUCT_FIELDS),
+        )
+        for item in shared:
+            limit = item_limit(item.product)
+            if limit > 0:
+                user_cart.items.filter(product_id=item.product_id).update(
+                    quantity=Least(F('quantity') + item.quantity, limit),
+                )
+        guest_items.exclude(product_id__in=existing).update(cart=user_cart)
+        guest_cart.delete()
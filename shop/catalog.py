@@ -0,0 +1,457 @@
+"""موتور کوئری کاتالوگ محصولات
+
+تمام صفحات لیست محصولات از این ماژول استفاده می‌کنند. ورودی یک «مشخصات فیلتر»
+(دسته‌بندی، برند، جستجو، بازه قیمت، فیلتر سریع و مرتب‌سازی) است و خروجی صفحه
+محصولات به همراه شمارش فیلترها (facet) است. شمارش‌ها با یک کوئری گروه‌بندی شده
+محاسبه می‌شوند و نتایج بر اساس کلید نرمال‌شده فیلتر در کش نگهداری می‌شوند.
+"""
+import base64
+import hashlib
+import json
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, Page, EmptyPage, PageNotAnInteger
+from django.db.models import Case, Count, IntegerField, Max, Min, Q, When
+from django.utils.dateparse import parse_datetime
+
+from .models import Product, ProductCard
+from . import fuzzy, search as fts
+from .conditional import bump_version, get_version, get_versions
+
+PRODUCTS_PER_PAGE = 12
+CATALOG_CACHE_TIMEOUT = 60 * 15
+CATALOG_VERSION_KEY = 'catalog:version'
+PRICE_VERSION_KEY = 'catalog:price_version'
+
+# مرزهای بازه‌های هیستوگرام قیمت (تومان)
+PRICE_BUCKETS = [0, 50000, 100000, 200000, 300000, 500000, 1000000, 2000000]
+
+# فیلدهایی از محصول که روی بازه قیمت فیلترها تاثیر دارند
+PRICE_FACET_FIELDS = {
+    'price', 'is_active', 'stock_quantity', 'category', 'brand',
+    'is_featured', 'is_bestseller', 'is_new', 'is_luxury', 'has_discount',
+}
+
+# فیلترهای سریع و فیلد متناظر هر کدام
+QUICK_FILTERS = {
+    'bestseller': 'is_bestseller',
+    'discount': 'has_discount',
+    'new': 'is_new',
+    'luxury': 'is_luxury',
+    'featured': 'is_featured',
+}
+
+# گزینه‌های مرتب‌سازی؛ شناسه در انتها ترتیب را پایدار می‌کند
+SORT_OPTIONS = {
+    'default': ('-created_at', '-pk'),
+    'price-low': ('price', 'pk'),
+    'price-high': ('-price', '-pk'),
+    'rating': ('-rating', '-pk'),
+    'name': ('name', 'pk'),
+    'most-viewed': ('-view_count', '-pk'),
+    'trending': ('-trending_score', '-pk'),
+}
+
+# مرتب‌سازی‌های قابل استفاده در صفحه‌بندی cursor و نوع مقدار کلید هر کدام
+CURSOR_SORTS = {
+    '-created_at': parse_datetime,
+    'price': Decimal,
+    '-rating': Decimal,
+    '-view_count': int,
+}
+DEFAULT_CURSOR_SORT = '-created_at'
+# بیشترین شناسه قابل مقایسه در SQLite (عدد صحیح ۶۴ بیتی)
+MAX_CURSOR_PK = 2 ** 63 - 1
+
+
+class CountedPaginator(Paginator):
+    """صفحه‌بند با تعداد از پیش محاسبه شده (بدون کوئری COUNT)"""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
+
+
+def get_catalog_version():
+    """نسخه فعلی کاتالوگ؛ با هر تغییر محصول، تصویر، دسته‌بندی یا برند افزایش می‌یابد"""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def catalog_versions():
+    """
+    نسخه کاتالوگ و نسخه بازه قیمت با یک کوئری
+
+    هر درخواست لیست یک بار این مقادیر را می‌خواند و به توابع این ماژول می‌دهد.
+    """
+    versions = get_versions(CATALOG_VERSION_KEY, PRICE_VERSION_KEY)
+    return {'catalog': versions[CATALOG_VERSION_KEY], 'price': versions[PRICE_VERSION_KEY]}
+
+
+def bump_catalog_version():
+    """باطل کردن تمام نتایج کش شده کاتالوگ"""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def _parse_price(value):
+    if value in (None, ''):
+        return None
+    try:
+        price = float(str(value).replace(',', ''))
+    except ValueError:
+        return None
+    # inf، nan یا اعداد خارج از بازه float نادیده گرفته می‌شوند
+    if not math.isfinite(price):
+        return None
+    return int(price)
+
+
+def build_spec(params=None, **overrides):
+    """ساخت مشخصات فیلتر نرمال‌شده از پارامترهای درخواست"""
+    params = params or {}
+    spec = {
+        'category': params.get('category', ''),
+        'brand': params.get('brand', ''),
+        'search': params.get('search', ''),
+        'min_price': params.get('min_price', ''),
+        'max_price': params.get('max_price', ''),
+        'quick_filter': params.get('quick_filter', ''),
+        'sort': params.get('sort', 'default'),
+    }
+    spec.update(overrides)
+
+    spec['category'] = (spec['category'] or '').strip()
+    spec['brand'] = (spec['brand'] or '').strip()
+    spec['search'] = ' '.join((spec['search'] or '').split())
+    spec['min_price'] = _parse_price(spec['min_price'])
+    spec['max_price'] = _parse_price(spec['max_price'])
+    if spec['quick_filter'] not in QUICK_FILTERS:
+        spec['quick_filter'] = ''
+    if spec['sort'] not in SORT_OPTIONS:
+        spec['sort'] = 'default'
+    return spec
+
+
+def spec_key(spec):
+    """کلید پایدار برای یک مشخصات فیلتر"""
+    raw = json.dumps(spec, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _search_queryset(query):
+    """محصولات منطبق با عبارت جستجو (روش جایگزین در نبود ایندکس FTS5)"""
+    return Product.objects.filter(
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(brand__name__icontains=query) |
+        Q(category__name__icontains=query)
+    )
+
+
+def _search_result(query, versions=None):
+    """
+    نتیجه کش‌شده جستجو: آیا جستجوی دقیق نتیجه داشت و در غیر این صورت شناسه‌های جستجوی تقریبی
+
+    نتایج جستجوی دقیق در پایتون خوانده نمی‌شوند و با زیرکوئری FTS فیلتر می‌شوند.
+    """
+    versions = versions or catalog_versions()
+    key = f'catalog:{versions["catalog"]}:search:{hashlib.sha1(query.encode("utf-8")).hexdigest()}'
+    result = cache.get(key)
+    if result is None:
+        ids = []
+        if not fts.has_matches(query):
+            # جستجوی دقیق نتیجه‌ای نداشت؛ نزدیک‌ترین محصولات (غلط تایپی، صفحه‌کلید انگلیسی)
+            ids = fuzzy.fuzzy_product_ids(query)
+        result = {'ids': ids, 'fuzzy': bool(ids)}
+        cache.set(key, result, CATALOG_CACHE_TIMEOUT)
+    return result
+
+
+def is_fuzzy_search(query, versions=None):
+    """آیا نتایج جستجو از جستجوی تقریبی به دست آمده‌اند"""
+    return bool(query) and fts.fts_available() and _search_result(query, versions)['fuzzy']
+
+
+def _search_filter(query, versions=None):
+    """مقدار فیلتر id__in برای جستجو (زیرکوئری FTS، شناسه‌های تقریبی یا کوئری LIKE)"""
+    if not fts.fts_available():
+        return _search_queryset(query).values('id')
+    result = _search_result(query, versions)
+    if result['fuzzy']:
+        return result['ids']
+    return fts.match_subquery(query) or []
+
+
+def _base_queryset(spec, versions=None):
+    """محصولات فعال و موجود با فیلترهای جستجو و قیمت (بدون فیلترهای facet)"""
+    products = Product.objects.filter(is_active=True, stock_quantity__gt=0)
+
+    if spec['search']:
+        products = products.filter(id__in=_search_filter(spec['search'], versions))
+    if spec['min_price'] is not None:
+        products = products.filter(price__gte=spec['min_price'])
+    if spec['max_price'] is not None:
+        products = products.filter(price__lte=spec['max_price'])
+    return products
+
+
+def filtered_queryset(spec, versions=None):
+    """کوئری کارت محصولات بر اساس مشخصات فیلتر و مرتب‌سازی (بدون join)"""
+    cards = ProductCard.objects.filter(is_active=True, stock_quantity__gt=0)
+    if spec['search']:
+        cards = cards.filter(product_id__in=_search_filter(spec['search'], versions))
+    if spec['min_price'] is not None:
+        cards = cards.filter(price__gte=spec['min_price'])
+    if spec['max_price'] is not None:
+        cards = cards.filter(price__lte=spec['max_price'])
+    if spec['category']:
+        cards = cards.filter(category_slug=spec['category'])
+    if spec['brand']:
+        cards = cards.filter(brand_slug=spec['brand'])
+    if spec['quick_filter']:
+        cards = cards.filter(**{QUICK_FILTERS[spec['quick_filter']]: True})
+    if spec['search'] and spec['sort'] == 'default' and fts.fts_available():
+        # در جستجو مرتب‌سازی پیش‌فرض بر اساس رتبه bm25 (یا شباهت در جستجوی تقریبی) است
+        result = _search_result(spec['search'], versions)
+        if result['fuzzy']:
+            relevance = Case(
+                *[When(product_id=pk, then=position) for position, pk in enumerate(result['ids'])],
+                output_field=IntegerField(),
+            )
+            return cards.order_by(relevance, *SORT_OPTIONS['default'])
+        if fts.build_match_query(spec['search']):
+            return cards.order_by(fts.relevance(spec['search'], ProductCard, 'product'), *SORT_OPTIONS['default'])
+    return cards.order_by(*SORT_OPTIONS[spec['sort']])
+
+
+def compute_facets(spec, versions=None):
+    """
+    محاسبه شمارش فیلترها با یک کوئری گروه‌بندی شده روی (دسته‌بندی، برند)
+
+    شمارش هر گروه با در نظر گرفتن سایر فیلترهای انتخاب‌شده محاسبه می‌شود؛
+    یعنی تعداد هر دسته‌بندی با فیلتر برند و فیلتر سریع فعلی و بدون فیلتر دسته‌بندی.
+    """
+    quick_counts = {
+        f'qf_{name}': Count('id', filter=Q(**{field: True}))
+        for name, field in QUICK_FILTERS.items()
+    }
+    rows = list(
+        _base_queryset(spec, versions)
+        .order_by()
+        .values(
+            'category_id', 'category__slug', 'category__name', 'category__icon', 'category__is_active',
+            'brand_id', 'brand__slug', 'brand__name', 'brand__logo', 'brand__is_active',
+        )
+        .annotate(total=Count('id'), **quick_counts)
+    )
+
+    quick_filter = spec['quick_filter']
+
+    def row_count(row):
+        return row[f'qf_{quick_filter}'] if quick_filter else row['total']
+
+    def matches_category(row):
+        return not spec['category'] or row['category__slug'] == spec['category']
+
+    def matches_brand(row):
+        return not spec['brand'] or row['brand__slug'] == spec['brand']
+
+    total = 0
+    categories = {}
+    brands = {}
+    quick_filters = {name: 0 for name in QUICK_FILTERS}
+
+    for row in rows:
+        if matches_brand(row) and row['category__is_active']:
+            entry = categories.setdefault(row['category_id'], {
+                'id': row['category_id'],
+                'slug': row['category__slug'],
+                'name': row['category__name'],
+                'icon': row['category__icon'],
+                'count': 0,
+            })
+            entry['count'] += row_count(row)
+
+        if matches_category(row) and row['brand_id'] and row['brand__is_active']:
+            entry = brands.setdefault(row['brand_id'], {
+                'id': row['brand_id'],
+                'slug': row['brand__slug'],
+                'name': row['brand__name'],
+                'logo': row['brand__logo'] or '',
+                'count': 0,
+            })
+            entry['count'] += row_count(row)
+
+        if matches_category(row) and matches_brand(row):
+            total += row_count(row)
+            for name in QUICK_FILTERS:
+                quick_filters[name] += row[f'qf_{name}']
+
+    return {
+        'total': total,
+        'categories': sorted((c for c in categories.values() if c['count']), key=lambda c: c['name']),
+        'brands': sorted((b for b in brands.values() if b['count']), key=lambda b: b['name']),
+        'quick_filters': quick_filters,
+    }
+
+
+def get_facets(spec, versions=None):
+    """شمارش فیلترها با کش بر اساس کلید فیلتر"""
+    versions = versions or catalog_versions()
+    key = f'catalog:{versions["catalog"]}:facets:{spec_key(spec)}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(spec, versions)
+        cache.set(key, facets, CATALOG_CACHE_TIMEOUT)
+    return facets
+
+
+def bump_price_version():
+    """باطل کردن بازه‌های قیمت کش شده"""
+    bump_version(PRICE_VERSION_KEY)
+
+
+def compute_price_facet(spec, versions=None):
+    """
+    کمترین و بیشترین قیمت و هیستوگرام قیمت با یک کوئری aggregate
+
+    فیلتر قیمت فعلی در نظر گرفته نمی‌شود تا اسلایدر کل بازه را نشان دهد.
+    """
+    spec = dict(spec, min_price=None, max_price=None, sort='default')
+    bounds = list(zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + [None]))
+    buckets = {}
+    for index, (low, high) in enumerate(bounds):
+        condition = Q(price__gte=low) if high is None else Q(price__gte=low, price__lt=high)
+        buckets[f'bucket_{index}'] = Count('pk', filter=condition)
+
+    row = filtered_queryset(spec, versions).order_by().aggregate(min=Min('price'), max=Max('price'), **buckets)
+
+    histogram = [
+        {'min': low, 'max': high, 'count': row[f'bucket_{index}']}
+        for index, (low, high) in enumerate(bounds)
+    ]
+    # حذف بازه‌های خالی ابتدا و انتهای هیستوگرام
+    while histogram and not histogram[-1]['count']:
+        histogram.pop()
+    while histogram and not histogram[0]['count']:
+        histogram.pop(0)
+    largest = max((bucket['count'] for bucket in histogram), default=0)
+    for bucket in histogram:
+        bucket['percent'] = round(bucket['count'] * 100 / largest) if largest else 0
+
+    return {
+        'min': int(row['min']) if row['min'] is not None else None,
+        'max': int(row['max']) if row['max'] is not None else None,
+        'histogram': histogram,
+    }
+
+
+def get_price_facet(spec, versions=None):
+    """بازه و هیستوگرام قیمت با کش بر اساس کلید فیلتر (بدون فیلتر قیمت)"""
+    versions = versions or catalog_versions()
+    key_spec = dict(spec, min_price=None, max_price=None, sort='default')
+    key = f'catalog:{versions["price"]}:price:{spec_key(key_spec)}'
+    facet = cache.get(key)
+    if facet is None:
+        facet = compute_price_facet(spec, versions)
+        cache.set(key, facet, CATALOG_CACHE_TIMEOUT)
+    return facet
+
+
+def query_catalog(spec, page_number=None, per_page=PRODUCTS_PER_PAGE, versions=None):
+    """
+    اجرای کوئری کاتالوگ
+
+    versions (خروجی catalog_versions) اگر داده نشود یک بار خوانده می‌شود.
+
+    Returns:
+        dict: شامل page (صفحه کارت محصولات)، total (تعداد کل) و facets (شمارش فیلترها)
+    """
+    versions = versions or catalog_versions()
+    facets = get_facets(spec, versions)
+    queryset = filtered_queryset(spec, versions)
+    paginator = CountedPaginator(queryset, per_page, count=facets['total'])
+
+    try:
+        number = paginator.validate_number(page_number)
+    except PageNotAnInteger:
+        number = 1
+    except EmptyPage:
+        number = paginator.num_pages
+
+    # در اولین درخواست صفحه مستقیماً خوانده می‌شود و فقط شناسه‌ها کش می‌شوند
+    ids_key = f'catalog:{versions["catalog"]}:page:{spec_key(spec)}:{per_page}:{number}'
+    ids = cache.get(ids_key)
+    if ids is None:
+        bottom = (number - 1) * per_page
+        object_list = list(queryset[bottom:bottom + per_page])
+        cache.set(ids_key, [card.pk for card in object_list], CATALOG_CACHE_TIMEOUT)
+    else:
+        by_id = ProductCard.objects.in_bulk(ids)
+        object_list = [by_id[pk] for pk in ids if pk in by_id]
+
+    return {
+        'page': Page(object_list, number, paginator),
+        'total': facets['total'],
+        'facets': facets,
+    }
+
+
+def encode_cursor(sort_value, pk):
+    """ساخت توکن cursor از مقدار کلید مرتب‌سازی و شناسه"""
+    value = sort_value.isoformat() if hasattr(sort_value, 'isoformat') else str(sort_value)
+    raw = json.dumps([value, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort, parsers=CURSOR_SORTS):
+    """خواندن توکن cursor؛ در صورت نامعتبر بودن ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value = parsers[sort](value)
+        if value is None or (isinstance(value, Decimal) and not value.is_finite()):
+            raise ValueError
+        if isinstance(value, int) and not -MAX_CURSOR_PK <= value <= MAX_CURSOR_PK:
+            raise ValueError
+        if isinstance(pk, bool) or not isinstance(pk, int) or not 1 <= pk <= MAX_CURSOR_PK:
+            raise ValueError
+        return value, pk
+    except (TypeError, ValueError, KeyError, OverflowError, InvalidOperation, UnicodeError):
+        raise ValueError('cursor نامعتبر است')
+
+
+def keyset_page(queryset, sort=DEFAULT_CURSOR_SORT, after=None, size=PRODUCTS_PER_PAGE, parsers=CURSOR_SORTS):
+    """
+    صفحه‌بندی keyset (بدون OFFSET و COUNT)
+
+    Args:
+        queryset: کوئری پایه محصولات یا کارت محصولات
+        sort: یکی از کلیدهای parsers
+        after: توکن cursor آخرین آیتم صفحه قبل
+        size: تعداد آیتم‌های هر صفحه
+        parsers: نگاشت مرتب‌سازی‌های مجاز به تبدیل‌کننده مقدار کلید cursor
+
+    Returns:
+        tuple: (لیست آیتم‌ها، توکن صفحه بعد یا None)
+    """
+    descending = sort.startswith('-')
+    field = sort.lstrip('-')
+    ordering = (f'-{field}', '-pk') if descending else (field, 'pk')
+    queryset = queryset.order_by(*ordering)
+
+    if after:
+        value, pk = decode_cursor(after, sort, parsers)
+        if descending:
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+
+    items = list(queryset[:size + 1])
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
@@ -0,0 +1,96 @@
+"""نسخه‌بندی منابع و درخواست‌های شرطی (ETag / Last-Modified) برای API‌ها
+
+هر منبع (مثل کاتالوگ یا تنظیمات ارسال) یک ردیف ResourceVersion در پایگاه داده
+دارد که با سیگنال‌های ذخیره و حذف با یک UPDATE اتمی افزایش می‌یابد. همه
+پروسه‌ها (workerها) نسخه یکسانی می‌بینند؛ API‌ها با این مقادیر و تنها با یک
+کوئری کلید اصلی، بدون ساخت JSON به درخواست‌های تکراری پاسخ 304 می‌دهند.
+"""
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import ResourceVersion
+
+SHIPPING_VERSION_KEY = 'shipping:version'
+
+
+def _now():
+    # Last-Modified دقت ثانیه دارد
+    return timezone.now().replace(microsecond=0)
+
+
+def _get_row(version_key):
+    """(نسخه، زمان تغییر) یک منبع؛ ردیف در اولین استفاده ساخته می‌شود"""
+    row = ResourceVersion.objects.filter(key=version_key).values_list('version', 'modified_at').first()
+    if row is None:
+        obj, _ = ResourceVersion.objects.get_or_create(key=version_key, defaults={'modified_at': _now()})
+        row = (obj.version, obj.modified_at)
+    return row
+
+
+def get_version(version_key):
+    """نسخه فعلی یک منبع"""
+    return _get_row(version_key)[0]
+
+
+def get_versions(*version_keys):
+    """نسخه فعلی چند منبع با یک کوئری (نگاشت کلید به نسخه)"""
+    versions = dict(ResourceVersion.objects.filter(key__in=version_keys).values_list('key', 'version'))
+    for version_key in version_keys:
+        if version_key not in versions:
+            versions[version_key] = get_version(version_key)
+    return versions
+
+
+def get_modified(version_key):
+    """زمان آخرین تغییر یک منبع"""
+    return _get_row(version_key)[1]
+
+
+def bump_version(version_key):
+    """افزایش نسخه و ثبت زمان تغییر یک منبع"""
+    now = _now()
+    if ResourceVersion.objects.filter(key=version_key).update(version=F('version') + 1, modified_at=now):
+        return
+    try:
+        with transaction.atomic():
+            ResourceVersion.objects.create(key=version_key, version=2, modified_at=now)
+    except IntegrityError:
+        # ساخت همزمان ردیف
+        ResourceVersion.objects.filter(key=version_key).update(version=F('version') + 1, modified_at=now)
+
+
+def versioned_condition(version_key):
+    """
+    دکوریتور GET شرطی بر اساس نسخه منبع
+
+    پاسخ‌ها با Cache-Control: no-cache ارسال می‌شوند تا مرورگر همیشه با
+    If-None-Match اعتبارسنجی کند و در صورت عدم تغییر پاسخ 304 بگیرد.
+    """
+    def request_row(request):
+        # ETag و Last-Modified با یک کوئری برای هر درخواست
+        rows = request.__dict__.setdefault('_resource_versions', {})
+        if version_key not in rows:
+            rows[version_key] = _get_row(version_key)
+        return rows[version_key]
+
+    def etag_func(request, *args, **kwargs):
+        return f'{version_key}-{request_row(request)[0]}'
+
+    def last_modified_func(request, *args, **kwargs):
+        return request_row(request)[1]
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view_func)
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
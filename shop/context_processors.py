@@ -0,0 +1,16 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import wishlists
+
+
+def wishlist(request):
+    """
+    شناسه محصولات علاقه‌مندی کاربر برای قالب‌ها (wishlist_ids)
+
+    مقدار به صورت تنبل ساخته می‌شود؛ فقط قالب‌هایی که از آن استفاده می‌کنند
+    کش را می‌خوانند.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {'wishlist_ids': frozenset()}
+    return {'wishlist_ids': SimpleLazyObject(lambda: wishlists.get_ids(user.id))}
@@ -0,0 +1,51 @@
+"""شمارش محصولات فعال هر دسته‌بندی و برند
+
+تعداد محصولات تمام دسته‌بندی‌ها و برندها با یک کوئری گروه‌بندی شده محاسبه و
+بر اساس نسخه کاتالوگ کش می‌شود؛ بنابراین با سیگنال‌های ذخیره و حذف محصول
+به صورت خودکار باطل می‌شود.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Product
+from .catalog import CATALOG_CACHE_TIMEOUT, get_catalog_version
+
+
+def compute_product_counts():
+    """محاسبه تعداد محصولات فعال هر دسته‌بندی و برند با یک کوئری"""
+    counts = {'categories': {}, 'brands': {}}
+    rows = Product.objects.filter(is_active=True).values('category_id', 'brand_id').annotate(
+        count=Count('id'),
+    ).order_by()
+    for row in rows:
+        categories = counts['categories']
+        categories[row['category_id']] = categories.get(row['category_id'], 0) + row['count']
+        if row['brand_id']:
+            brands = counts['brands']
+            brands[row['brand_id']] = brands.get(row['brand_id'], 0) + row['count']
+    return counts
+
+
+def get_product_counts():
+    """
+    شمارش کش‌شده محصولات
+
+    Returns:
+        dict: شامل categories و brands (نگاشت شناسه به تعداد محصولات فعال)
+    """
+    key = f'catalog:{get_catalog_version()}:product_counts'
+    counts = cache.get(key)
+    if counts is None:
+        counts = compute_product_counts()
+        cache.set(key, counts, CATALOG_CACHE_TIMEOUT)
+    return counts
+
+
+def category_products_count(category_id):
+    """تعداد محصولات فعال یک دسته‌بندی"""
+    return get_product_counts()['categories'].get(category_id, 0)
+
+
+def brand_products_count(brand_id):
+    """تعداد محصولات فعال یک برند"""
+    return get_product_counts()['brands'].get(brand_id, 0)
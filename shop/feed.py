@@ -0,0 +1,165 @@
+"""خروجی جریانی (streaming) کاتالوگ محصولات برای سایت‌های مقایسه قیمت
+
+محصولات به صورت دسته‌ای با iterator خوانده می‌شوند (تصاویر هر دسته با یک
+کوئری prefetch می‌شوند) و هر سطر بلافاصله به صورت JSON Lines یا CSV تولید و
+در صورت نیاز به صورت تدریجی فشرده می‌شود؛ بنابراین مصرف حافظه مستقل از اندازه
+کاتالوگ است. با پارامتر since فقط محصولات تغییر کرده برگردانده می‌شوند؛
+محصولات غیرفعال شده و حذف شده (از جدول DeletedProduct) به صورت سطر tombstone
+با deleted=true می‌آیند تا شریک آن‌ها را حذف کند.
+"""
+import csv
+import io
+import itertools
+import json
+import zlib
+
+from django.db.models import Prefetch
+
+from .cards import primary_image_url
+from .models import DeletedProduct, Product, ProductImage
+
+FEED_CHUNK_SIZE = 500
+FEED_FORMATS = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+FEED_FIELDS = [
+    'id', 'name', 'url', 'price', 'original_price', 'discount_percentage', 'currency',
+    'availability', 'stock_quantity', 'category', 'brand', 'image_url', 'images',
+    'is_active', 'deleted', 'updated_at',
+]
+
+
+def feed_queryset(since=None):
+    """
+    کوئری محصولات خروجی
+
+    Args:
+        since: در صورت تعیین، فقط محصولات تغییر کرده پس از این زمان (شامل
+            محصولات غیرفعال شده که به صورت tombstone خروجی داده می‌شوند)
+    """
+    products = Product.objects.select_related('category', 'brand').prefetch_related(
+        Prefetch('images', queryset=ProductImage.objects.order_by('order', 'created_at'))
+    ).only(
+        'id', 'name', 'slug', 'price', 'original_price', 'discount_percentage', 'stock_quantity',
+        'is_active', 'updated_at', 'category__name', 'brand__name',
+    )
+    if since is None:
+        products = products.filter(is_active=True)
+    else:
+        products = products.filter(updated_at__gt=since)
+    return products.order_by('updated_at', 'id')
+
+
+def tombstone_row(product_id, slug, updated_at, base_url=''):
+    """سطر محصول حذف یا غیرفعال شده؛ فقط شناسه، آدرس و زمان تغییر"""
+    row = dict.fromkeys(FEED_FIELDS, '')
+    row.update({
+        'id': product_id,
+        'url': f'{base_url}/shop/product/{slug}/',
+        'price': None,
+        'original_price': None,
+        'discount_percentage': None,
+        'availability': 'out_of_stock',
+        'stock_quantity': 0,
+        'images': [],
+        'is_active': False,
+        'deleted': True,
+        'updated_at': updated_at.isoformat(),
+    })
+    return row
+
+
+def tombstone_rows(since, base_url=''):
+    """سطرهای محصولات حذف شده پس از since"""
+    deleted = DeletedProduct.objects.filter(deleted_at__gt=since).order_by('deleted_at', 'id')
+    for product_id, slug, deleted_at in deleted.values_list('product_id', 'slug', 'deleted_at').iterator(
+        chunk_size=FEED_CHUNK_SIZE,
+    ):
+        yield tombstone_row(product_id, slug, deleted_at, base_url)
+
+
+def feed_rows(products, base_url=''):
+    """تولید سطرهای خروجی به صورت جریانی"""
+    for product in products.iterator(chunk_size=FEED_CHUNK_SIZE):
+        if not product.is_active:
+            yield tombstone_row(product.id, product.slug, product.updated_at, base_url)
+            continue
+        images = list(product.images.all())
+        image_urls = []
+        for image in images:
+            try:
+                image_urls.append(base_url + image.image.url)
+            except ValueError:
+                continue
+        image_url = primary_image_url(images)
+        yield {
+            'id': product.id,
+            'name': product.name,
+            'url': f'{base_url}/shop/product/{product.slug}/',
+            'price': int(product.price),
+            'original_price': int(product.original_price) if product.original_price else None,
+            'discount_percentage': product.discount_percentage,
+            'currency': 'IRT',
+            'availability': 'in_stock' if product.stock_quantity > 0 else 'out_of_stock',
+            'stock_quantity': product.stock_quantity,
+            'category': product.category.name,
+            'brand': product.brand.name if product.brand else '',
+            'image_url': base_url + image_url if image_url else '',
+            'images': image_urls,
+            'is_active': True,
+            'deleted': False,
+            'updated_at': product.updated_at.isoformat(),
+        }
+
+
+def jsonl_lines(rows):
+    """هر محصول در یک خط JSON"""
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def csv_lines(rows):
+    """خروجی CSV با سطر عنوان؛ تصاویر با | از هم جدا می‌شوند"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value.encode('utf-8')
+
+    # BOM برای نمایش درست حروف فارسی در Excel
+    buffer.write('\ufeff')
+    writer.writerow(FEED_FIELDS)
+    yield flush()
+    for row in rows:
+        row['images'] = '|'.join(row['images'])
+        writer.writerow([row[field] for field in FEED_FIELDS])
+        yield flush()
+
+
+def gzip_stream(chunks, level=6):
+    """فشرده‌سازی تدریجی gzip بدون نگهداری کل خروجی در حافظه"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def generate_feed(feed_format='jsonl', since=None, base_url='', compress=False):
+    """
+    تولید خروجی کامل یا تغییرات کاتالوگ
+
+    Returns:
+        iterator: تکه‌های bytes خروجی
+    """
+    rows = feed_rows(feed_queryset(since), base_url)
+    if since is not None:
+        rows = itertools.chain(rows, tombstone_rows(since, base_url))
+    chunks = csv_lines(rows) if feed_format == 'csv' else jsonl_lines(rows)
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,138 @@
+"""جستجوی تقریبی محصولات با ایندکس سه‌حرفی (trigram)
+
+وقتی جستجوی دقیق نتیجه‌ای ندارد (غلط تایپی، نیم‌فاصله جاافتاده یا تایپ با
+صفحه‌کلید انگلیسی) از این ماژول استفاده می‌شود. ابتدا محصولاتی که بیشترین
+سه‌حرفی مشترک را با عبارت جستجو دارند با یک کوئری گروه‌بندی شده انتخاب
+می‌شوند و سپس با ضریب شباهت Dice امتیازدهی می‌شوند.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductTrigram
+from .search import normalize_persian
+
+FUZZY_RESULT_LIMIT = 20
+CANDIDATE_LIMIT = 100
+# حداقل شباهت برای نمایش نتیجه
+MIN_SIMILARITY = 0.35
+
+# نگاشت صفحه‌کلید انگلیسی (QWERTY) به صفحه‌کلید استاندارد فارسی
+KEYBOARD_MAP = str.maketrans({
+    'q': 'ض', 'w': 'ص', 'e': 'ث', 'r': 'ق', 't': 'ف', 'y': 'غ', 'u': 'ع', 'i': 'ه',
+    'o': 'خ', 'p': 'ح', '[': 'ج', ']': 'چ', 'a': 'ش', 's': 'س', 'd': 'ی', 'f': 'ب',
+    'g': 'ل', 'h': 'ا', 'j': 'ت', 'k': 'ن', 'l': 'م', ';': 'ک', "'": 'گ', 'z': 'ظ',
+    'x': 'ط', 'c': 'ز', 'v': 'ر', 'b': 'ذ', 'n': 'د', 'm': 'پ', ',': 'و', '\\': 'پ',
+})
+
+# نگاشت‌های اضافه برای مقایسه تقریبی
+_FUZZY_CHARS = str.maketrans({'آ': 'ا', 'ة': 'ه', 'ء': ''})
+
+
+def _padded_trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text):
+    """
+    مجموعه سه‌حرفی‌های متن
+
+    سه‌حرفی‌های هر کلمه و سه‌حرفی‌های کل متن بدون فاصله با هم ترکیب می‌شوند
+    تا هم غلط تایپی درون کلمه و هم فاصله یا نیم‌فاصله جاافتاده پوشش داده شود.
+    """
+    words = normalize_persian(text).translate(_FUZZY_CHARS).split()
+    if not words:
+        return set()
+    grams = _padded_trigrams(''.join(words))
+    for word in words:
+        grams |= _padded_trigrams(word)
+    return grams
+
+
+def product_trigrams(product):
+    """سه‌حرفی‌های نام محصول و نام برند آن"""
+    grams = trigrams(product.name)
+    if product.brand:
+        grams |= trigrams(product.brand.name)
+    return grams
+
+
+def index_products(product_ids=None, batch_size=1000):
+    """
+    ساخت (یا بازسازی) ایندکس سه‌حرفی محصولات
+
+    Args:
+        product_ids: شناسه محصولات؛ در صورت None کل ایندکس بازسازی می‌شود
+        batch_size: اندازه هر دسته در درج گروهی
+
+    Returns:
+        int: تعداد سه‌حرفی‌های درج شده
+    """
+    products = Product.objects.select_related('brand').only('id', 'name', 'brand__name').order_by()
+    existing = ProductTrigram.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(id__in=product_ids)
+        existing = existing.filter(product_id__in=product_ids)
+
+    rows = [
+        ProductTrigram(gram=gram, product_id=product.id)
+        for product in products.iterator(chunk_size=500)
+        for gram in product_trigrams(product)
+    ]
+    # حذف و درج در یک تراکنش؛ جستجوی همزمان جدول خالی یا نیمه‌پر نمی‌بیند
+    with transaction.atomic():
+        existing.delete()
+        ProductTrigram.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def query_variants(query):
+    """شکل‌های مختلف عبارت جستجو؛ در صورت تایپ با حروف انگلیسی، معادل فارسی نیز بررسی می‌شود"""
+    variants = [query]
+    lowered = query.lower()
+    if any('a' <= char <= 'z' for char in lowered):
+        variants.append(lowered.translate(KEYBOARD_MAP))
+    return variants
+
+
+def fuzzy_product_ids(query, limit=FUZZY_RESULT_LIMIT):
+    """
+    نزدیک‌ترین محصولات به عبارت جستجو
+
+    Returns:
+        list: شناسه محصولات به ترتیب شباهت (شبیه‌ترین اول)
+    """
+    scores = {}
+    for variant in query_variants(query):
+        grams = trigrams(variant)
+        if not grams:
+            continue
+
+        # تولید کاندید: محصولات با بیشترین سه‌حرفی مشترک
+        candidates = dict(
+            ProductTrigram.objects.filter(gram__in=grams, product__is_active=True)
+            .values_list('product_id')
+            .annotate(shared=Count('id'))
+            .order_by('-shared')[:CANDIDATE_LIMIT]
+        )
+        if not candidates:
+            continue
+
+        sizes = dict(
+            ProductTrigram.objects.filter(product_id__in=list(candidates))
+            .values_list('product_id')
+            .annotate(size=Count('id'))
+            .order_by()
+        )
+
+        # امتیازدهی: پوشش عبارت جستجو و ضریب Dice
+        for product_id, shared in candidates.items():
+            coverage = shared / len(grams)
+            dice = 2 * shared / (len(grams) + sizes.get(product_id, shared))
+            score = (coverage + dice) / 2
+            if coverage >= MIN_SIMILARITY and score > scores.get(product_id, 0):
+                scores[product_id] = score
+
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    return [product_id for product_id, _ in ranked[:limit]]
@@ -0,0 +1,238 @@
+"""رزرو موقت و کاهش موجودی محصولات
+
+ثبت سفارش برای هر قلم یک رزرو با زمان انقضا (StockReservation) می‌سازد و
+مجموع رزروهای باز هر محصول در Product.reserved_quantity نگه داشته می‌شود؛
+موجودی قابل سفارش = stock_quantity - reserved_quantity. رزرو همه اقلام با یک
+UPDATE شرطی انجام می‌شود (فقط ردیف‌هایی که موجودی آزاد کافی دارند تغییر
+می‌کنند) و آزادسازی هنگام پرداخت، پرداخت ناموفق، لغو یا انقضا نیز گروهی است.
+کاهش موجودی هنگام پرداخت هم به همین شکل است: پس از آزاد شدن رزرو خود سفارش،
+فقط موجودی آزاد (WHERE stock_quantity - reserved_quantity >= n) کم می‌شود؛
+بنابراین پرداخت نه موجودی را منفی می‌کند و نه موجودی رزرو شده سفارش‌های دیگر را
+می‌فروشد.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .catalog import bump_catalog_version, bump_price_version
+from .models import Product, ProductCard, StockReservation
+from . import page_cache
+
+HOLD_MINUTES = 15
+RELEASE_BATCH_SIZE = 1000
+DECREMENT_BATCH_SIZE = 500
+
+
+class InsufficientStockError(ValueError):
+    """موجودی آزاد بعضی محصولات برای تعداد درخواستی کافی نیست"""
+
+    def __init__(self, items):
+        self.items = items
+        details = '، '.join(
+            f"'{item['product']}' (موجودی: {item['available']}, درخواستی: {item['requested']})"
+            for item in items
+        )
+        super().__init__(f"موجودی این محصولات کافی نیست: {details}")
+
+
+def _quantity_case(quantities):
+    """عبارت CASE برای مقدار هر محصول در یک UPDATE گروهی"""
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def shortages(quantities, reserved=True):
+    """
+    اقلامی که موجودیشان کمتر از تعداد درخواستی است (یک کوئری)
+
+    Args:
+        reserved: موجودی آزاد (منهای رزروها) مقایسه شود یا کل موجودی
+    """
+    products = Product.objects.only('id', 'name', 'stock_quantity', 'reserved_quantity').in_bulk(list(quantities))
+    items = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        available = 0
+        if product:
+            available = product.available_quantity if reserved else product.stock_quantity
+        if available < quantity:
+            items.append({
+                'product_id': product_id,
+                'product': product.name if product else product_id,
+                'requested': quantity,
+                'available': available,
+            })
+    return items
+
+
+def reserve(order, quantities, minutes=HOLD_MINUTES):
+    """
+    رزرو موجودی اقلام سفارش
+
+    Args:
+        order: سفارش در انتظار پرداخت
+        quantities: نگاشت شناسه محصول به تعداد
+
+    Returns:
+        datetime: زمان انقضای رزرو؛ در صورت کمبود موجودی InsufficientStockError
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return None
+    expires_at = timezone.now() + timedelta(minutes=minutes)
+    with transaction.atomic():
+        release_expired(product_ids=list(quantities))
+        savepoint = transaction.savepoint()
+        condition = Q()
+        for product_id, quantity in quantities.items():
+            condition |= Q(pk=product_id, stock_quantity__gte=F('reserved_quantity') + quantity)
+        updated = Product.objects.filter(condition).update(
+            reserved_quantity=F('reserved_quantity') + _quantity_case(quantities),
+        )
+        if updated != len(quantities):
+            transaction.savepoint_rollback(savepoint)
+            raise InsufficientStockError(shortages(quantities))
+        transaction.savepoint_commit(savepoint)
+        StockReservation.objects.bulk_create([
+            StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    return expires_at
+
+
+def _release(holds):
+    """
+    حذف رزروها و کم کردن مجموعشان از reserved_quantity محصولات
+
+    رزروها ابتدا حذف می‌شوند و فقط سهم ردیف‌هایی که همین تراکنش واقعاً حذف کرده
+    (تعداد ردیف‌های حذف شده) کم می‌شود؛ بنابراین آزادسازی همزمان یک رزرو (مثلاً
+    پرداخت و انقضا) حتی بدون قفل ردیف (SQLite) دو بار کم نمی‌شود. حذف به ازای
+    هر (محصول، تعداد) یک DELETE است.
+    """
+    with transaction.atomic():
+        groups = defaultdict(list)
+        for hold_id, product_id, quantity in holds.values_list('id', 'product_id', 'quantity'):
+            groups[product_id, quantity].append(hold_id)
+        released = 0
+        totals = defaultdict(int)
+        for (product_id, quantity), hold_ids in groups.items():
+            deleted, _ = StockReservation.objects.filter(id__in=hold_ids).delete()
+            released += deleted
+            if deleted:
+                totals[product_id] += deleted * quantity
+        if totals:
+            Product.objects.filter(pk__in=list(totals)).update(
+                reserved_quantity=Greatest(F('reserved_quantity') - _quantity_case(totals), Value(0)),
+            )
+    return released
+
+
+def release_holds(order_ids):
+    """
+    آزاد کردن همه رزروهای سفارش‌ها (پرداخت، پرداخت ناموفق یا لغو)
+
+    Returns:
+        int: تعداد رزروهای آزاد شده
+    """
+    return _release(StockReservation.objects.filter(order_id__in=list(order_ids)))
+
+
+def release_expired(now=None, product_ids=None, batch_size=RELEASE_BATCH_SIZE):
+    """
+    آزاد کردن رزروهای منقضی شده به صورت دسته‌ای
+
+    Args:
+        product_ids: محدود کردن به این محصولات؛ در صورت None همه محصولات
+
+    Returns:
+        int: تعداد رزروهای آزاد شده
+    """
+    now = now or timezone.now()
+    expired = StockReservation.objects.filter(expires_at__lte=now)
+    if product_ids is not None:
+        expired = expired.filter(product_id__in=product_ids)
+    released = 0
+    while True:
+        ids = list(expired.order_by('expires_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return released
+        released += _release(StockReservation.objects.filter(id__in=ids))
+
+
+def order_holds(order_id):
+    """
+    نگاشت شناسه محصول به تعداد رزرو یک سفارش
+
+    رزروهای منقضی تا آزاد شدن هنوز در reserved_quantity حساب شده‌اند، پس برای
+    خود سفارش در دسترس به شمار می‌آیند.
+    """
+    return dict(StockReservation.objects.filter(order_id=order_id).values_list('product_id', 'quantity'))
+
+
+def _invalidate(product_ids):
+    """همگام‌سازی موجودی کارت‌ها و باطل کردن کش کاتالوگ و صفحات پس از commit"""
+    product_ids = list(product_ids)
+    product = Product.objects.filter(pk=OuterRef('pk'))
+    ProductCard.objects.filter(pk__in=product_ids).update(
+        stock_quantity=Subquery(product.values('stock_quantity')[:1]),
+    )
+
+    def invalidate():
+        bump_catalog_version()
+        bump_price_version()
+        tags = {'products', 'home'}
+        for category_slug, brand_slug in ProductCard.objects.filter(pk__in=product_ids).values_list(
+            'category_slug', 'brand_slug',
+        ):
+            tags.add(f'category:{category_slug}')
+            if brand_slug:
+                tags.add(f'brand:{brand_slug}')
+        page_cache.purge(*tags)
+
+    transaction.on_commit(invalidate)
+
+
+def decrement_stock(quantities, batch_size=DECREMENT_BATCH_SIZE):
+    """
+    کاهش موجودی محصولات با UPDATE شرطی (stock_quantity - reserved_quantity >= تعداد)
+
+    رزروهای سفارش در حال پرداخت باید پیش از این فراخوانی آزاد شده باشند
+    (Order.mark_as_paid)؛ موجودی رزرو شده برای سفارش‌های دیگر فروخته نمی‌شود.
+    همه دسته‌ها در یک تراکنش اجرا می‌شوند؛ اگر موجودی حتی یک محصول کافی نباشد
+    هیچ موجودی‌ای کم نمی‌شود.
+
+    Args:
+        quantities: نگاشت شناسه محصول به تعداد
+
+    Raises:
+        InsufficientStockError: با فهرست محصولاتی که موجودی کافی نداشتند
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return
+    product_ids = list(quantities)
+    now = timezone.now()
+    with transaction.atomic():
+        savepoint = transaction.savepoint()
+        updated = 0
+        for start in range(0, len(product_ids), batch_size):
+            batch = {product_id: quantities[product_id] for product_id in product_ids[start:start + batch_size]}
+            condition = Q()
+            for product_id, quantity in batch.items():
+                condition |= Q(pk=product_id, stock_quantity__gte=F('reserved_quantity') + quantity)
+            updated += Product.objects.filter(condition).update(
+                stock_quantity=F('stock_quantity') - _quantity_case(batch),
+                updated_at=now,
+            )
+        if updated != len(quantities):
+            transaction.savepoint_rollback(savepoint)
+            raise InsufficientStockError(shortages(quantities))
+        transaction.savepoint_commit(savepoint)
+        _invalidate(product_ids)
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from shop.feed import FEED_FORMATS, generate_feed
+
+
+class Command(BaseCommand):
+    help = 'خروجی کامل یا تغییرات کاتالوگ محصولات به صورت JSON Lines یا CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FEED_FORMATS), default='jsonl', help='فرمت خروجی')
+        parser.add_argument('--output', help='مسیر فایل خروجی (پیش‌فرض: خروجی استاندارد)')
+        parser.add_argument('--since', help='فقط محصولات تغییر کرده پس از این زمان (ISO)')
+        parser.add_argument('--base-url', default='', help='آدرس پایه سایت برای لینک‌ها و تصاویر')
+        parser.add_argument('--gzip', action='store_true', help='فشرده‌سازی خروجی با gzip')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('مقدار since نامعتبر است')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        chunks = generate_feed(
+            options['format'],
+            since=since,
+            base_url=options['base_url'].rstrip('/'),
+            compress=options['gzip'],
+        )
+        if not options['output']:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            return
+
+        size = 0
+        with open(options['output'], 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(f"✅ خروجی در {options['output']} ذخیره شد ({size} بایت)"))
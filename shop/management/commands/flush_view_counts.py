@@ -0,0 +1,29 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from shop.view_counter import VIEW_CACHE_ALIAS, flush_views, get_stats
+
+
+class Command(BaseCommand):
+    help = 'اعمال بازدیدهای بافر شده محصولات در پایگاه داده با UPDATE گروهی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true', help='فقط نمایش آمار بافر بازدید')
+
+    def handle(self, *args, **options):
+        if isinstance(caches[VIEW_CACHE_ALIAS], LocMemCache):
+            # شمارنده‌های بافر در حافظه پروسه وب‌سرور هستند و از اینجا دیده نمی‌شوند؛
+            # flush از این پروسه فقط صف را خالی می‌کرد
+            self.stdout.write(self.style.WARNING(
+                '⚠️ کش views از نوع LocMemCache است؛ بازدیدها درون پروسه وب‌سرور اعمال می‌شوند. '
+                'برای اجرای این دستور کش مشترک (Redis/Memcached) لازم است'
+            ))
+            return
+        if not options['stats']:
+            flushed = flush_views()
+            self.stdout.write(self.style.SUCCESS(f'✅ {flushed} بازدید اعمال شد'))
+
+        stats = get_stats()
+        self.stdout.write(f"📊 در انتظار: {stats['pending']} | تاخیر: {stats['lag_seconds']} ثانیه | "
+                          f"اعمال شده: {stats['flushed']} | از دست رفته: {stats['dropped']} | "
+                          f"حذف شده از کش: {stats['evicted']}")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from shop.cards import refresh_cards
+
+
+class Command(BaseCommand):
+    help = 'بازسازی کامل جدول کارت محصولات (ProductCard)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='اندازه هر دسته در درج گروهی (پیش‌فرض: 500)',
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_cards(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} کارت محصول بازسازی شد'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shop.search import fts_available, index_products
+
+
+class Command(BaseCommand):
+    help = 'بازسازی کامل ایندکس جستجوی تمام‌متن محصولات (FTS5)'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.ERROR('❌ ایندکس FTS5 در این پایگاه داده وجود ندارد'))
+            return
+        count = index_products()
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} محصول ایندکس شد'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shop.fuzzy import index_products
+
+
+class Command(BaseCommand):
+    help = 'بازسازی کامل ایندکس سه‌حرفی (trigram) نام محصولات و برندها برای جستجوی تقریبی'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='اندازه هر دسته در درج گروهی')
+
+    def handle(self, *args, **options):
+        count = index_products(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} سه‌حرفی ایندکس شد'))
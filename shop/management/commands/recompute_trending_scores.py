@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from shop.models import ProductCard
+from shop.trending import current_score, recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'بازسازی امتیاز ترند محصولات از تاریخچه بازدید و فروش'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='تعداد کارت در هر UPDATE')
+        parser.add_argument('--top', type=int, default=5, help='تعداد محصولات ترند برای نمایش')
+
+    def handle(self, *args, **options):
+        updated = recompute_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ امتیاز ترند {updated} محصول بازسازی شد'))
+
+        top = ProductCard.objects.filter(is_active=True).order_by('-trending_score', '-pk')[:options['top']]
+        for card in top:
+            self.stdout.write(f'📈 {card.name}: {current_score(card.trending_score):.2f}')
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from shop.ratings import reconcile
+
+
+class Command(BaseCommand):
+    help = 'بازسازی مجموع، تعداد، توزیع ستاره‌ها و میانگین امتیاز محصولات از نظرات تایید شده'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='تعداد محصول در هر UPDATE')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        fixed = reconcile(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'✅ امتیاز {fixed} محصول اصلاح شد ({elapsed:.2f} ثانیه)'))
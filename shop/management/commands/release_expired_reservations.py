@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from shop.inventory import RELEASE_BATCH_SIZE, release_expired
+
+
+class Command(BaseCommand):
+    help = 'آزاد کردن رزروهای منقضی شده موجودی سفارش‌های پرداخت نشده'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=RELEASE_BATCH_SIZE, help='تعداد رزرو در هر دسته')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        released = release_expired(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'✅ {released} رزرو منقضی شده آزاد شد ({elapsed:.2f} ثانیه)'))
@@ -0,0 +1,95 @@
+# Generated by Django 4.2 on 2026-10-18 01:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_product_cards(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductCard = apps.get_model('shop', 'ProductCard')
+    copied = [
+        'name', 'slug', 'price', 'original_price', 'discount_percentage', 'has_discount',
+        'rating', 'review_count', 'view_count', 'stock_quantity', 'min_stock_alert',
+        'is_active', 'is_featured', 'is_bestseller', 'is_new', 'is_luxury', 'created_at',
+    ]
+    cards = []
+    for product in Product.objects.select_related('category', 'brand').prefetch_related('images'):
+        images = sorted(product.images.all(), key=lambda img: (img.order, img.created_at))
+        image = next((img for img in images if img.is_primary), images[0] if images else None)
+        card = ProductCard(
+            product_id=product.id,
+            category_id=product.category_id,
+            category_name=product.category.name,
+            category_slug=product.category.slug,
+            brand_id=product.brand_id,
+            brand_name=product.brand.name if product.brand else '',
+            brand_slug=product.brand.slug if product.brand else '',
+            image_url=image.image.url if image and image.image else '',
+        )
+        for field in copied:
+            setattr(card, field, getattr(product, field))
+        cards.append(card)
+    ProductCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_product_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='shop.product', verbose_name='محصول')),
+                ('name', models.CharField(max_length=200, verbose_name='نام محصول')),
+                ('slug', models.SlugField(allow_unicode=True, max_length=200, verbose_name='اسلاگ')),
+                ('price', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='قیمت')),
+                ('original_price', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='قیمت اصلی')),
+                ('discount_percentage', models.PositiveIntegerField(default=0, verbose_name='درصد تخفیف')),
+                ('has_discount', models.BooleanField(default=False, verbose_name='دارای تخفیف')),
+                ('rating', models.DecimalField(decimal_places=1, default=0, max_digits=3, verbose_name='امتیاز')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات')),
+                ('view_count', models.PositiveIntegerField(default=0, verbose_name='تعداد بازدید')),
+                ('stock_quantity', models.PositiveIntegerField(default=0, verbose_name='موجودی')),
+                ('min_stock_alert', models.PositiveIntegerField(default=5, verbose_name='حداقل موجودی هشدار')),
+                ('is_active', models.BooleanField(default=True, verbose_name='فعال')),
+                ('is_featured', models.BooleanField(default=False, verbose_name='محصول ویژه')),
+                ('is_bestseller', models.BooleanField(default=False, verbose_name='پرفروش')),
+                ('is_new', models.BooleanField(default=False, verbose_name='جدید')),
+                ('is_luxury', models.BooleanField(default=False, verbose_name='لوکس')),
+                ('category_name', models.CharField(max_length=100, verbose_name='نام دسته\u200cبندی')),
+                ('category_slug', models.SlugField(allow_unicode=True, max_length=100, verbose_name='اسلاگ دسته\u200cبندی')),
+                ('brand_name', models.CharField(blank=True, max_length=100, verbose_name='نام برند')),
+                ('brand_slug', models.SlugField(allow_unicode=True, blank=True, max_length=100, verbose_name='اسلاگ برند')),
+                ('image_url', models.CharField(blank=True, max_length=500, verbose_name='آدرس تصویر اصلی')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد محصول')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+                ('brand', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.brand', verbose_name='برند')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category', verbose_name='دسته\u200cبندی')),
+            ],
+            options={
+                'verbose_name': 'کارت محصول',
+                'verbose_name_plural': 'کارت\u200cهای محصولات',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['category_slug'], name='shop_card_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['brand_slug'], name='shop_card_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['-created_at', '-product'], name='shop_card_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['-view_count', '-product'], name='shop_card_views_idx'),
+        ),
+        migrations.RunPython(build_product_cards, migrations.RunPython.noop),
+    ]
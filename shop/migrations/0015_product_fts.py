@@ -0,0 +1,69 @@
+import re
+
+from django.db import migrations
+
+# نسخه ثابت shop.search.normalize_persian در زمان این مهاجرت
+_CHAR_MAP = {
+    '\u064a': '\u06cc', '\u0649': '\u06cc', '\u0626': '\u06cc',
+    '\u0643': '\u06a9',
+    '\u0629': '\u0647', '\u06c0': '\u0647',
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0671': '\u0627',
+    '\u0624': '\u0648',
+    '\u200c': ' ',
+    '\u200e': '', '\u200f': '',
+    '\u0640': '',
+}
+_CHAR_MAP.update({chr(0x06F0 + i): str(i) for i in range(10)})
+_CHAR_MAP.update({chr(0x0660 + i): str(i) for i in range(10)})
+_TRANSLATION = str.maketrans(_CHAR_MAP)
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')
+_NON_WORD = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_persian(text):
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text).translate(_TRANSLATION)).lower()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts USING fts5("
+        "name, brand, category, body, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    Product = apps.get_model('shop', 'Product')
+    rows = []
+    for product in Product.objects.select_related('category', 'brand'):
+        body = ' '.join(filter(None, [product.short_description, product.description, product.meta_keywords]))
+        rows.append((
+            product.id,
+            normalize_persian(product.name),
+            normalize_persian(product.brand.name if product.brand else ''),
+            normalize_persian(product.category.name),
+            normalize_persian(body),
+        ))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO shop_product_fts (rowid, name, brand, category, body) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_productcard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.2 on 2026-10-18 01:47
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# نسخه ثابت shop.search.normalize_persian در زمان این مهاجرت
+_CHAR_MAP = {
+    '\u064a': '\u06cc', '\u0649': '\u06cc', '\u0626': '\u06cc',
+    '\u0643': '\u06a9',
+    '\u0629': '\u0647', '\u06c0': '\u0647',
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0671': '\u0627',
+    '\u0624': '\u0648',
+    '\u200c': ' ',
+    '\u200e': '', '\u200f': '',
+    '\u0640': '',
+}
+_CHAR_MAP.update({chr(0x06F0 + i): str(i) for i in range(10)})
+_CHAR_MAP.update({chr(0x0660 + i): str(i) for i in range(10)})
+_TRANSLATION = str.maketrans(_CHAR_MAP)
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')
+_NON_WORD = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_persian(text):
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text).translate(_TRANSLATION)).lower()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+# نسخه ثابت shop.fuzzy.trigrams در زمان این مهاجرت
+_FUZZY_CHARS = str.maketrans({'آ': 'ا', 'ة': 'ه', 'ء': ''})
+
+
+def _padded_trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def trigrams(text):
+    words = normalize_persian(text).translate(_FUZZY_CHARS).split()
+    if not words:
+        return set()
+    grams = _padded_trigrams(''.join(words))
+    for word in words:
+        grams |= _padded_trigrams(word)
+    return grams
+
+
+def build_product_trigrams(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductTrigram = apps.get_model('shop', 'ProductTrigram')
+    rows = []
+    for product in Product.objects.select_related('brand'):
+        grams = trigrams(product.name)
+        if product.brand:
+            grams |= trigrams(product.brand.name)
+        rows.extend(ProductTrigram(gram=gram, product_id=product.id) for gram in grams)
+    ProductTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_product_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3, verbose_name='سه\u200cحرفی')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='shop.product', verbose_name='محصول')),
+            ],
+            options={
+                'verbose_name': 'سه\u200cحرفی محصول',
+                'verbose_name_plural': 'سه\u200cحرفی\u200cهای محصولات',
+                'unique_together': {('gram', 'product')},
+            },
+        ),
+        migrations.RunPython(build_product_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_product_updated_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcard',
+            name='trending_score',
+            field=models.FloatField(default=0, verbose_name='امتیاز ترند'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['-trending_score', '-product'], name='shop_card_trending_idx'),
+        ),
+    ]
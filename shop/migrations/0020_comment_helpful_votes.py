@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 01:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shop', '0019_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+            ],
+            options={
+                'verbose_name': 'رای نظر',
+                'verbose_name_plural': 'رای\u200cهای نظرات',
+            },
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='helpful_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد رای مفید'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', 'is_approved', '-created_at', '-id'], name='shop_comment_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['product', 'is_approved', '-helpful_count', '-id'], name='shop_comment_helpful_idx'),
+        ),
+        migrations.AddField(
+            model_name='commentvote',
+            name='comment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='shop.comment', verbose_name='نظر'),
+        ),
+        migrations.AddField(
+            model_name='commentvote',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comment_votes', to=settings.AUTH_USER_MODEL, verbose_name='کاربر'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='commentvote',
+            unique_together={('comment', 'user')},
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 02:01
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def average_rating(total, count):
+    # نسخه ثابت shop.ratings.average_rating در زمان این مهاجرت
+    if not count:
+        return Decimal('0')
+    return (Decimal(total) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+
+
+def backfill_rating_totals(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductCard = apps.get_model('shop', 'ProductCard')
+    Comment = apps.get_model('shop', 'Comment')
+    totals = {
+        product_id: (total, count)
+        for product_id, total, count in Comment.objects.filter(is_approved=True).values_list('product_id').annotate(
+            total=Sum('rating'), count=Count('id'),
+        ).order_by()
+    }
+    products, cards = [], []
+    for product_id in Product.objects.values_list('id', flat=True):
+        total, count = totals.get(product_id, (0, 0))
+        rating = average_rating(total, count)
+        products.append(Product(id=product_id, rating_sum=total, review_count=count, rating=rating))
+        cards.append(ProductCard(product_id=product_id, review_count=count, rating=rating))
+    Product.objects.bulk_update(products, ['rating_sum', 'review_count', 'rating'], batch_size=500)
+    ProductCard.objects.bulk_update(cards, ['review_count', 'rating'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_comment_helpful_votes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='مجموع امتیازها'),
+        ),
+        migrations.RunPython(backfill_rating_totals, migrations.RunPython.noop),
+    ]
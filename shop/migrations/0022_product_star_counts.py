@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 02:03
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_star_counts(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Comment = apps.get_model('shop', 'Comment')
+    counts = {}
+    for product_id, rating, count in Comment.objects.filter(is_approved=True).values_list(
+        'product_id', 'rating',
+    ).annotate(count=Count('id')).order_by():
+        counts.setdefault(product_id, {})[f'rating_{rating}_count'] = count
+    products = []
+    for product_id, stars in counts.items():
+        product = Product(id=product_id)
+        for rating in range(1, 6):
+            setattr(product, f'rating_{rating}_count', stars.get(f'rating_{rating}_count', 0))
+        products.append(product)
+    Product.objects.bulk_update(products, [f'rating_{rating}_count' for rating in range(1, 6)], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_product_rating_sum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات ۱ ستاره'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات ۲ ستاره'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات ۳ ستاره'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات ۴ ستاره'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='تعداد نظرات ۵ ستاره'),
+        ),
+        migrations.RunPython(backfill_star_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='کلید')),
+                ('version', models.PositiveBigIntegerField(default=1, verbose_name='نسخه')),
+                ('modified_at', models.DateTimeField(verbose_name='زمان آخرین تغییر')),
+            ],
+            options={
+                'verbose_name': 'نسخه منبع',
+                'verbose_name_plural': 'نسخه\u200cهای منابع',
+            },
+        ),
+    ]
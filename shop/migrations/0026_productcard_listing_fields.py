@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 02:23
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_listing_fields(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductCard = apps.get_model('shop', 'ProductCard')
+    product = Product.objects.filter(pk=OuterRef('product_id'))
+    ProductCard.objects.update(**{
+        field: Subquery(product.values(field)[:1])
+        for field in ('short_description', 'telegram_link', 'instagram_link', 'facebook_link')
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_resource_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcard',
+            name='facebook_link',
+            field=models.URLField(blank=True, verbose_name='لینک فیسبوک'),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='instagram_link',
+            field=models.URLField(blank=True, verbose_name='لینک اینستاگرام'),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='short_description',
+            field=models.CharField(blank=True, max_length=300, verbose_name='توضیحات کوتاه'),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='telegram_link',
+            field=models.URLField(blank=True, verbose_name='لینک تلگرام'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['price', 'product'], name='shop_card_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcard',
+            index=models.Index(fields=['-rating', '-product'], name='shop_card_rating_idx'),
+        ),
+        migrations.RunPython(copy_listing_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0026_productcard_listing_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.PositiveIntegerField(verbose_name='شناسه محصول')),
+                ('slug', models.CharField(max_length=200, verbose_name='اسلاگ')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='زمان حذف')),
+            ],
+            options={
+                'verbose_name': 'محصول حذف شده',
+                'verbose_name_plural': 'محصولات حذف شده',
+                'ordering': ['deleted_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 02:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0027_deletedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue', models.CharField(choices=[('views', 'بازدیدهای بافر شده')], max_length=20, verbose_name='صف')),
+                ('marked_at', models.DateTimeField(auto_now_add=True, verbose_name='زمان ثبت')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product', verbose_name='محصول')),
+            ],
+            options={
+                'verbose_name': 'محصول در صف',
+                'verbose_name_plural': 'محصولات در صف',
+                'unique_together': {('queue', 'product')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0028_dirtyproduct'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dirtyproduct',
+            name='queue',
+            field=models.CharField(choices=[('views', 'بازدیدهای بافر شده'), ('related', 'محصولات مرتبط')], max_length=20, verbose_name='صف'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+def delete_views_queue(apps, schema_editor):
+    """بازدیدهای بافر شده دیگر در جدول صف ثبت نمی‌شوند"""
+    DirtyProduct = apps.get_model('shop', 'DirtyProduct')
+    DirtyProduct.objects.filter(queue='views').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0029_dirtyproduct_related_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_views_queue, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='dirtyproduct',
+            name='queue',
+            field=models.CharField(choices=[('related', 'محصولات مرتبط')], max_length=20, verbose_name='صف'),
+        ),
+    ]
@@ -29,7 +29,8 @@ class Brand(models.Model):
         return self.name
 
     def get_products_count(self):
-        return self.products.filter(is_active=True).count()
+        from .counts import brand_products_count
+        return brand_products_count(self.id)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -55,7 +56,8 @@ class Category(models.Model):
         return self.name
 
     def get_products_count(self):
-        return self.products.filter(is_active=True).count()
+        from .counts import category_products_count
+        return category_products_count(self.id)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -91,6 +93,8 @@ class Product(models.Model):
     
     # Inventory
     stock_quantity = models.PositiveIntegerField(default=0, verbose_name="موجودی")
+    # مجموع رزروهای باز سفارش‌های در انتظار پرداخت (shop.inventory)
+    reserved_quantity = models.PositiveIntegerField(default=0, verbose_name="موجودی رزرو شده")
     min_stock_alert = models.PositiveIntegerField(default=5, verbose_name="حداقل موجودی هشدار")
     
     # Product Details
@@ -110,6 +114,13 @@ class Product(models.Model):
     # Ratings and Reviews
     rating = models.DecimalField(max_digits=3, decimal_places=1, default=0, validators=[MinValueValidator(0), MaxValueValidator(5)], verbose_name="امتیاز")
     review_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات")
+    # مجموع امتیاز نظرات تایید شده؛ rating = rating_sum / review_count (shop.ratings)
+    rating_sum = models.PositiveIntegerField(default=0, verbose_name="مجموع امتیازها")
+    rating_1_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات ۱ ستاره")
+    rating_2_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات ۲ ستاره")
+    rating_3_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات ۳ ستاره")
+    rating_4_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات ۴ ستاره")
+    rating_5_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات ۵ ستاره")
     view_count = models.PositiveIntegerField(default=0, verbose_name="تعداد بازدید")
     
     # Status
@@ -135,6 +146,15 @@ class Product(models.Model):
         verbose_name = "محصول"
         verbose_name_plural = "محصولات"
         ordering = ['-created_at']
+        indexes = [
+            # کلیدهای صفحه‌بندی cursor در API محصولات
+            models.Index(fields=['-created_at', '-id'], name='shop_product_created_idx'),
+            models.Index(fields=['price', 'id'], name='shop_product_price_idx'),
+            models.Index(fields=['-rating', '-id'], name='shop_product_rating_idx'),
+            models.Index(fields=['-view_count', '-id'], name='shop_product_views_idx'),
+            # خروجی تغییرات کاتالوگ (since) برای شرکا
+            models.Index(fields=['updated_at', 'id'], name='shop_product_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -187,18 +207,22 @@ class Product(models.Model):
         return "موجود"
 
     def update_rating(self):
-        """بروزرسانی امتیاز و تعداد نظرات بر اساس کامنت‌های تایید شده"""
-        approved_comments = self.comments.filter(is_approved=True)
-        if approved_comments.exists():
-            total_rating = sum(comment.rating for comment in approved_comments)
-            avg_rating = total_rating / approved_comments.count()
-            self.rating = round(avg_rating, 1)
-            self.review_count = approved_comments.count()
-        else:
-            self.rating = 0
-            self.review_count = 0
-        self.save(update_fields=['rating', 'review_count'])
+        """بازمحاسبه امتیاز و تعداد نظرات از کامنت‌های تایید شده (با یک کوئری گروهی)"""
+        from .ratings import TOTAL_FIELDS, reconcile
+        reconcile([self.id])
+        self.refresh_from_db(fields=['rating', *TOTAL_FIELDS])
+
+    @property
+    def rating_histogram(self):
+        """توزیع ستاره‌های نظرات تایید شده (بدون کوئری)"""
+        from .ratings import histogram
+        return histogram(self)
     
+    @property
+    def available_quantity(self):
+        """موجودی قابل سفارش (موجودی منهای رزروهای باز)"""
+        return max(self.stock_quantity - self.reserved_quantity, 0)
+
     @property
     def is_out_of_stock(self):
         """بررسی اینکه آیا محصول موجودی ندارد"""
@@ -211,7 +235,7 @@ class Product(models.Model):
     
     def reserve_stock(self, quantity):
         """رزرو کردن موجودی (بدون کاهش)"""
-        if self.stock_quantity >= quantity:
+        if self.available_quantity >= quantity:
             return True
         return False
     
@@ -235,12 +259,12 @@ class Product(models.Model):
     
     def can_order(self, quantity=1):
         """بررسی اینکه آیا می‌توان این تعداد را سفارش داد"""
-        return self.is_active and self.stock_quantity >= quantity
+        return self.is_active and self.available_quantity >= quantity
     
     def reserve_stock_for_order(self, quantity):
         """رزرو کردن موجودی برای سفارش (بدون کاهش)"""
         if not self.can_order(quantity):
-            return False, f"موجودی کافی نیست. موجودی: {self.stock_quantity}, درخواستی: {quantity}"
+            return False, f"موجودی کافی نیست. موجودی: {self.available_quantity}, درخواستی: {quantity}"
         return True, "موجودی کافی است"
 
 class ProductImage(models.Model):
@@ -326,6 +350,7 @@ class Comment(models.Model):
     rating = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)], verbose_name="امتیاز")
     comment = models.TextField(verbose_name="نظر")
     is_approved = models.BooleanField(default=False, verbose_name="تایید شده")
+    helpful_count = models.PositiveIntegerField(default=0, verbose_name="تعداد رای مفید")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
 
@@ -333,19 +358,180 @@ class Comment(models.Model):
         verbose_name = "نظر"
         verbose_name_plural = "نظرات"
         ordering = ['-created_at']
+        indexes = [
+            # صفحه‌بندی keyset نظرات تایید شده هر محصول
+            models.Index(fields=['product', 'is_approved', '-created_at', '-id'], name='shop_comment_recent_idx'),
+            models.Index(fields=['product', 'is_approved', '-helpful_count', '-id'], name='shop_comment_helpful_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.product.name}"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update product rating when comment is saved
-        self.product.update_rating()
+
+class CommentVote(models.Model):
+    """رای «مفید بود» کاربران به نظرات (هر کاربر یک رای برای هر نظر)"""
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='votes', verbose_name="نظر")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='comment_votes', verbose_name="کاربر")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+
+    class Meta:
+        verbose_name = "رای نظر"
+        verbose_name_plural = "رای‌های نظرات"
+        unique_together = ['comment', 'user']
+
+    def __str__(self):
+        return f"{self.user} → {self.comment_id}"
+
+
+class ProductCard(models.Model):
+    """کارت محصول؛ نسخه غیرنرمال و خلاصه محصول برای صفحات لیست
+
+    این جدول توسط سیگنال‌های Product، ProductImage، Brand و Category به‌روز
+    نگه داشته می‌شود تا لیست‌ها بدون join و prefetch از یک جدول خوانده شوند.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card', verbose_name="محصول")
+    name = models.CharField(max_length=200, verbose_name="نام محصول")
+    slug = models.SlugField(max_length=200, allow_unicode=True, verbose_name="اسلاگ")
+    price = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="قیمت")
+    original_price = models.DecimalField(max_digits=10, decimal_places=0, blank=True, null=True, verbose_name="قیمت اصلی")
+    discount_percentage = models.PositiveIntegerField(default=0, verbose_name="درصد تخفیف")
+    has_discount = models.BooleanField(default=False, verbose_name="دارای تخفیف")
+    rating = models.DecimalField(max_digits=3, decimal_places=1, default=0, verbose_name="امتیاز")
+    review_count = models.PositiveIntegerField(default=0, verbose_name="تعداد نظرات")
+    view_count = models.PositiveIntegerField(default=0, verbose_name="تعداد بازدید")
+    stock_quantity = models.PositiveIntegerField(default=0, verbose_name="موجودی")
+    min_stock_alert = models.PositiveIntegerField(default=5, verbose_name="حداقل موجودی هشدار")
+    is_active = models.BooleanField(default=True, verbose_name="فعال")
+    is_featured = models.BooleanField(default=False, verbose_name="محصول ویژه")
+    is_bestseller = models.BooleanField(default=False, verbose_name="پرفروش")
+    is_new = models.BooleanField(default=False, verbose_name="جدید")
+    is_luxury = models.BooleanField(default=False, verbose_name="لوکس")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', verbose_name="دسته‌بندی")
+    category_name = models.CharField(max_length=100, verbose_name="نام دسته‌بندی")
+    category_slug = models.SlugField(max_length=100, allow_unicode=True, verbose_name="اسلاگ دسته‌بندی")
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="برند")
+    brand_name = models.CharField(max_length=100, blank=True, verbose_name="نام برند")
+    brand_slug = models.SlugField(max_length=100, blank=True, allow_unicode=True, verbose_name="اسلاگ برند")
+    image_url = models.CharField(max_length=500, blank=True, verbose_name="آدرس تصویر اصلی")
+    short_description = models.CharField(max_length=300, blank=True, verbose_name="توضیحات کوتاه")
+    telegram_link = models.URLField(blank=True, verbose_name="لینک تلگرام")
+    instagram_link = models.URLField(blank=True, verbose_name="لینک اینستاگرام")
+    facebook_link = models.URLField(blank=True, verbose_name="لینک فیسبوک")
+    # امتیاز ترند با زوال نمایی؛ در واحد زمان مبدا (shop.trending) نگهداری می‌شود
+    trending_score = models.FloatField(default=0, verbose_name="امتیاز ترند")
+    created_at = models.DateTimeField(verbose_name="تاریخ ایجاد محصول")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
+
+    class Meta:
+        verbose_name = "کارت محصول"
+        verbose_name_plural = "کارت‌های محصولات"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['category_slug'], name='shop_card_category_idx'),
+            models.Index(fields=['brand_slug'], name='shop_card_brand_idx'),
+            models.Index(fields=['-created_at', '-product'], name='shop_card_created_idx'),
+            models.Index(fields=['price', 'product'], name='shop_card_price_idx'),
+            models.Index(fields=['-rating', '-product'], name='shop_card_rating_idx'),
+            models.Index(fields=['-view_count', '-product'], name='shop_card_views_idx'),
+            models.Index(fields=['-trending_score', '-product'], name='shop_card_trending_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def is_in_stock(self):
+        """بررسی موجودی"""
+        return self.stock_quantity > 0
+
+    @property
+    def stock_status(self):
+        """وضعیت موجودی"""
+        if self.stock_quantity == 0:
+            return "ناموجود"
+        elif self.stock_quantity <= self.min_stock_alert:
+            return "کم موجود"
+        return "موجود"
+
+
+
+class ProductTrigram(models.Model):
+    """سه‌حرفی‌های نام محصول و برند برای جستجوی تقریبی (مقاوم به غلط تایپی)"""
+    gram = models.CharField(max_length=3, verbose_name="سه‌حرفی")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='trigrams', verbose_name="محصول")
+
+    class Meta:
+        verbose_name = "سه‌حرفی محصول"
+        verbose_name_plural = "سه‌حرفی‌های محصولات"
+        unique_together = ['gram', 'product']
+
+    def __str__(self):
+        return f"{self.gram} - {self.product_id}"
+
+
+class RelatedProduct(models.Model):
+    """محصولات مرتبط از پیش محاسبه شده؛ با دستور rebuild_related_products ساخته می‌شود"""
+    SOURCE_CHOICES = [
+        ('order', 'خرید مشترک'),
+        ('wishlist', 'علاقه‌مندی مشترک'),
+        ('category', 'هم‌دسته'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_links', verbose_name="محصول")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_from', verbose_name="محصول مرتبط")
+    score = models.FloatField(default=0, verbose_name="امتیاز")
+    rank = models.PositiveSmallIntegerField(verbose_name="رتبه")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, verbose_name="منبع")
+
+    class Meta:
+        verbose_name = "محصول مرتبط"
+        verbose_name_plural = "محصولات مرتبط"
+        unique_together = ['product', 'rank']
+        ordering = ['product', 'rank']
+
+    def __str__(self):
+        return f"{self.product_id} → {self.related_id}"
+
+
+class DirtyProduct(models.Model):
+    """صف محصولاتی که داده وابسته‌شان (مثل محصولات مرتبط) باید دوباره محاسبه شود"""
+    QUEUE_CHOICES = [
+        ('related', 'محصولات مرتبط'),
+    ]
+
+    queue = models.CharField(max_length=20, choices=QUEUE_CHOICES, verbose_name="صف")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', verbose_name="محصول")
+    marked_at = models.DateTimeField(auto_now_add=True, verbose_name="زمان ثبت")
+
+    class Meta:
+        verbose_name = "محصول در صف"
+        verbose_name_plural = "محصولات در صف"
+        unique_together = ['queue', 'product']
+
+    def __str__(self):
+        return f"{self.queue}: {self.product_id}"
+
+
+class DeletedProduct(models.Model):
+    """سابقه محصولات حذف شده برای خروجی تغییرات فید (tombstone)"""
+    product_id = models.PositiveIntegerField(verbose_name="شناسه محصول")
+    slug = models.CharField(max_length=200, verbose_name="اسلاگ")
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="زمان حذف")
+
+    class Meta:
+        verbose_name = "محصول حذف شده"
+        verbose_name_plural = "محصولات حذف شده"
+        ordering = ['deleted_at']
+
+    def __str__(self):
+        return f"{self.product_id} ({self.slug})"
 
 
 # Cart, Wishlist, and Order models
 class Cart(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='carts', verbose_name="کاربر")
+    # سبد کاربران مهمان با کلید نشست شناخته می‌شود و هنگام ورود با سبد کاربر ادغام می‌شود
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='carts', verbose_name="کاربر")
+    session_key = models.CharField(max_length=40, blank=True, db_index=True, verbose_name="کلید نشست")
     is_active = models.BooleanField(default=True, verbose_name="فعال")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
@@ -356,13 +542,12 @@ class Cart(models.Model):
         ordering = ['-created_at']
 
     def __str__(self) -> str:
-        return f"سبد {self.user} ({'فعال' if self.is_active else 'غیرفعال'})"
+        owner = self.user or f"مهمان {self.session_key[:8]}"
+        return f"سبد {owner} ({'فعال' if self.is_active else 'غیرفعال'})"
 
     def get_total_amount(self):
-        total = 0
-        for item in self.items.select_related('product'):
-            total += int(item.price) * item.quantity
-        return total
+        from .carts import cart_totals
+        return int(cart_totals(self)['subtotal'])
 
 
 class CartItem(models.Model):
@@ -441,16 +626,19 @@ class Order(models.Model):
         return self.status == 'paid'
 
     def check_stock_availability(self):
-        """بررسی موجودی محصولات سفارش (بدون کاهش موجودی)"""
+        """بررسی موجودی محصولات سفارش (بدون کاهش موجودی)؛ رزروهای خود سفارش در دسترس حساب می‌شوند"""
+        from .inventory import order_holds
         unavailable_items = []
+        holds = order_holds(self.id)
         
         for item in self.items.select_related('product').all():
             product = item.product
-            if product.stock_quantity < item.quantity:
+            available = max(product.stock_quantity - product.reserved_quantity, 0) + holds.get(product.id, 0)
+            if available < item.quantity:
                 unavailable_items.append({
                     'product': product.name,
                     'requested': item.quantity,
-                    'available': product.stock_quantity
+                    'available': available
                 })
         
         return {
@@ -471,11 +659,24 @@ class Order(models.Model):
         return True
 
     def mark_as_paid(self, ref_id, authority):
-        """علامت‌گذاری سفارش به عنوان پرداخت شده و کاهش موجودی محصولات"""
+        """
+        علامت‌گذاری سفارش به عنوان پرداخت شده و کاهش موجودی محصولات
+
+        موجودی با UPDATE شرطی کم می‌شود؛ در صورت کمبود InsufficientStockError
+        (زیرکلاس ValueError) با نام محصولات ناموجود ایجاد و کل تغییرات برگردانده می‌شود.
+        """
         from django.utils import timezone
         from django.db import transaction
+        from django.db.models import Sum
+        from .inventory import decrement_stock, release_holds
         
         with transaction.atomic():
+            # فراخوانی تکراری (مثلاً بازگشت دوباره از درگاه) موجودی را دوباره کم نمی‌کند
+            current_status = Order.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+            if current_status == 'paid':
+                self.status = 'paid'
+                return
+
             # تغییر وضعیت سفارش
             self.status = 'paid'
             self.payment_ref_id = ref_id
@@ -483,30 +684,32 @@ class Order(models.Model):
             self.payment_date = timezone.now()
             self.save(update_fields=['status', 'payment_ref_id', 'payment_authority', 'payment_date'])
             
-            # کاهش موجودی محصولات
-            for item in self.items.select_related('product').all():
-                product = item.product
-                if product.stock_quantity >= item.quantity:
-                    product.stock_quantity -= item.quantity
-                    product.save(update_fields=['stock_quantity'])
-                else:
-                    # اگر موجودی کافی نباشد، خطا ایجاد کن
-                    raise ValueError(f"موجودی محصول '{product.name}' کافی نیست. موجودی: {product.stock_quantity}, درخواستی: {item.quantity}")
+            # رزرو سفارش آزاد می‌شود؛ موجودی در ادامه کم می‌شود
+            release_holds([self.id])
+
+            # کاهش موجودی همه محصولات با UPDATE شرطی گروهی
+            decrement_stock(dict(
+                self.items.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total').order_by()
+            ))
 
     def mark_as_payment_failed(self, status_code, description=""):
-        """علامت‌گذاری سفارش به عنوان پرداخت ناموفق"""
+        """علامت‌گذاری سفارش به عنوان پرداخت ناموفق و آزاد کردن رزرو موجودی"""
+        from .inventory import release_holds
         self.status = 'payment_failed'
         self.payment_status_code = status_code
         self.payment_description = description
         self.save(update_fields=['status', 'payment_status_code', 'payment_description'])
+        release_holds([self.id])
     
     def cancel_order(self, reason=""):
-        """لغو سفارش"""
+        """لغو سفارش و آزاد کردن رزرو موجودی"""
+        from .inventory import release_holds
         # موجودی محصول در این مرحله برگردانده نمی‌شود
-        # چون از ابتدا کم نشده بود
+        # چون از ابتدا کم نشده بود؛ فقط رزرو آن آزاد می‌شود
         self.status = 'canceled'
         self.payment_description = f"سفارش لغو شد: {reason}"
         self.save(update_fields=['status', 'payment_description'])
+        release_holds([self.id])
 
 
 class OrderItem(models.Model):
@@ -523,6 +726,26 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} × {self.quantity}"
 
+class StockReservation(models.Model):
+    """رزرو موقت موجودی یک محصول برای سفارش در انتظار پرداخت"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations', verbose_name="سفارش")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations', verbose_name="محصول")
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], verbose_name="تعداد")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="زمان انقضا")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "رزرو موجودی"
+        verbose_name_plural = "رزروهای موجودی"
+        unique_together = ('order', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='shop_reservation_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"رزرو {self.quantity} عدد {self.product_id} برای سفارش #{self.order_id}"
+
+
 class Settings(models.Model):
     """تنظیمات کلی فروشگاه"""
     key = models.CharField(max_length=100, unique=True, verbose_name="کلید")
@@ -573,6 +796,20 @@ class ShippingSettings(models.Model):
         return f"تنظیمات ارسال - هزینه: {self.shipping_cost} تومان"
 
 
+class ResourceVersion(models.Model):
+    """نسخه و زمان آخرین تغییر یک منبع (کاتالوگ، تنظیمات ارسال و ...) برای ETag و کلید کش"""
+    key = models.CharField(max_length=100, primary_key=True, verbose_name="کلید")
+    version = models.PositiveBigIntegerField(default=1, verbose_name="نسخه")
+    modified_at = models.DateTimeField(verbose_name="زمان آخرین تغییر")
+
+    class Meta:
+        verbose_name = "نسخه منبع"
+        verbose_name_plural = "نسخه‌های منابع"
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
 class Banner(models.Model):
     BANNER_TYPES = [
         ('hero', 'بنر اصلی'),
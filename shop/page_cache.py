@@ -0,0 +1,132 @@
+"""کش کامل صفحات کاتالوگ برای کاربران مهمان
+
+HTML صفحات لیست محصولات، دسته‌بندی، برند و صفحه اصلی برای درخواست‌های GET
+کاربران وارد نشده کش می‌شود. کلید کش از مسیر و رشته کوئری مرتب‌شده ساخته
+می‌شود. هر صفحه چند «برچسب» دارد (مثلاً category:<slug>) و هر برچسب یک ردیف
+ResourceVersion در پایگاه داده دارد؛ سیگنال‌ها با افزایش نسخه برچسب‌های مرتبط فقط
+همان صفحات را باطل می‌کنند و چون نسخه‌ها مشترک‌اند، پاک‌سازی در همه پروسه‌ها دیده
+می‌شود (حتی با LocMemCache که HTML هر پروسه جداگانه کش می‌شود).
+
+آمار hit و miss در کش نگهداری می‌شود و با LocMemCache فقط مربوط به همان پروسه است.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .conditional import get_versions
+from .models import ResourceVersion
+
+PAGE_CACHE_TIMEOUT = 60 * 10
+STATS_KEYS = {
+    'hits': 'page:stats:hits',
+    'misses': 'page:stats:misses',
+    'purges': 'page:stats:purges',
+}
+
+
+def _tag_key(tag):
+    key = f'page:tag:{tag}'
+    if len(key) > ResourceVersion._meta.get_field('key').max_length:
+        key = 'page:tag:' + hashlib.sha1(tag.encode('utf-8')).hexdigest()
+    return key
+
+
+def _incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        return cache.incr(key, delta)
+
+
+def _tag_versions(tags):
+    """نسخه فعلی برچسب‌ها با یک کوئری (ردیف برچسب در اولین استفاده ساخته می‌شود)"""
+    keys = [_tag_key(tag) for tag in tags]
+    versions = get_versions(*keys)
+    return [str(versions[key]) for key in keys]
+
+
+def page_key(request, tags):
+    """کلید کش صفحه بر اساس مسیر، رشته کوئری نرمال‌شده و نسخه برچسب‌ها"""
+    query = '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(request.GET.lists())
+        for value in sorted(values)
+        if value
+    )
+    raw = f'{request.path}?{query}|{".".join(_tag_versions(tags))}'
+    return 'page:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def is_cacheable(request):
+    """فقط درخواست‌های GET کاربران مهمان بدون پیام در انتظار نمایش کش می‌شوند"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if 'messages' in request.COOKIES:
+        return False
+    return not request.user.is_authenticated
+
+
+def purge(*tags):
+    """
+    باطل کردن صفحات دارای برچسب‌های داده شده با یک UPDATE
+
+    برچسبی که ردیف ندارد هنوز در کلید هیچ صفحه کش‌شده‌ای استفاده نشده است.
+    """
+    keys = {_tag_key(tag) for tag in tags if tag}
+    if not keys:
+        return
+    ResourceVersion.objects.filter(key__in=keys).update(version=F('version') + 1, modified_at=timezone.now())
+    _incr(STATS_KEYS['purges'], len(keys))
+
+
+def get_stats():
+    """
+    آمار کش صفحات: تعداد hit، miss، purge و نرخ hit
+
+    shared نشان می‌دهد آمار مربوط به همه پروسه‌هاست یا (با LocMemCache) فقط همین پروسه.
+    """
+    values = cache.get_many(STATS_KEYS.values())
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0
+    stats['shared'] = not isinstance(caches['default'], LocMemCache)
+    return stats
+
+
+def anonymous_page_cache(*tags, timeout=PAGE_CACHE_TIMEOUT):
+    """
+    دکوریتور کش صفحه برای کاربران مهمان
+
+    برچسب‌ها می‌توانند شامل پارامترهای URL باشند، مثلاً 'category:{slug}'.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view_func(request, *args, **kwargs)
+
+            key = page_key(request, [tag.format(**kwargs) for tag in tags])
+            cached = cache.get(key)
+            if cached is not None:
+                _incr(STATS_KEYS['hits'])
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response['X-Page-Cache'] = 'HIT'
+                return response
+
+            _incr(STATS_KEYS['misses'])
+            response = view_func(request, *args, **kwargs)
+            # پاسخ‌هایی که کوکی یا توکن CSRF دارند مخصوص همان کاربر هستند
+            personal = response.cookies or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            if response.status_code == 200 and not personal and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+                response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,196 @@
+"""نگهداری تدریجی امتیاز محصولات
+
+مجموع امتیاز (rating_sum)، تعداد نظرات تایید شده (review_count) و تعداد
+نظرات هر ستاره (rating_1_count تا rating_5_count) روی محصول ذخیره می‌شوند.
+ایجاد، تایید، رد، ویرایش یا حذف یک نظر فقط اختلاف آن را با یک UPDATE اتمی
+(عبارت‌های F) روی ردیف محصول اعمال می‌کند و میانگین در همان دستور محاسبه
+می‌شود؛ نیازی به پیمایش نظرات محصول نیست. reconcile مقادیر را با یک
+کوئری گروهی از روی نظرات بازسازی می‌کند.
+"""
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, FloatField, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
+
+from .catalog import bump_catalog_version
+from .models import Comment, Product, ProductCard
+from . import page_cache
+
+
+def average_rating(total, count):
+    """میانگین امتیاز با یک رقم اعشار"""
+    if not count:
+        return Decimal('0')
+    return (Decimal(total) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+
+
+STAR_FIELDS = {stars: f'rating_{stars}_count' for stars in range(1, 6)}
+TOTAL_FIELDS = ['rating_sum', 'review_count', *STAR_FIELDS.values()]
+
+
+def contribution(rating, is_approved):
+    """سهم یک نظر در ستون‌های تجمیعی محصول (مجموع، تعداد و شمارنده ستاره)"""
+    if not is_approved:
+        return {}
+    return {'rating_sum': rating, 'review_count': 1, STAR_FIELDS[rating]: 1}
+
+
+def histogram(product):
+    """توزیع ستاره‌ها از ۵ تا ۱ همراه با درصد"""
+    total = product.review_count
+    return [
+        {
+            'stars': stars,
+            'count': getattr(product, STAR_FIELDS[stars]),
+            'percent': round(getattr(product, STAR_FIELDS[stars]) * 100 / total) if total else 0,
+        }
+        for stars in range(5, 0, -1)
+    ]
+
+
+def _invalidate(product_ids):
+    """باطل کردن کش کاتالوگ و صفحات محصولات پس از commit"""
+    product_ids = list(product_ids)
+
+    def invalidate():
+        bump_catalog_version()
+        tags = {'products', 'home'}
+        for category_slug, brand_slug in ProductCard.objects.filter(pk__in=product_ids).values_list(
+            'category_slug', 'brand_slug',
+        ):
+            tags.add(f'category:{category_slug}')
+            if brand_slug:
+                tags.add(f'brand:{brand_slug}')
+        page_cache.purge(*tags)
+
+    transaction.on_commit(invalidate)
+
+
+def sync_cards(product_ids):
+    """کپی امتیاز و تعداد نظرات محصولات به کارت‌ها با یک UPDATE"""
+    product = Product.objects.filter(pk=OuterRef('pk'))
+    ProductCard.objects.filter(pk__in=list(product_ids)).update(
+        rating=Subquery(product.values('rating')[:1]),
+        review_count=Subquery(product.values('review_count')[:1]),
+    )
+
+
+def apply_delta(product_id, deltas):
+    """
+    اعمال اختلاف ستون‌های تجمیعی روی محصول و کارت آن با یک UPDATE
+
+    Args:
+        deltas: نگاشت نام ستون (از TOTAL_FIELDS) به مقدار اختلاف
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    rating_sum = values.get('rating_sum', F('rating_sum'))
+    review_count = values.get('review_count', F('review_count'))
+    # ده برابر میانگین گرد می‌شود تا نیمه‌ها مثل average_rating دقیق رو به بالا گرد شوند
+    average = Round(Cast(rating_sum * 10, FloatField()) / NullIf(review_count, 0)) / 10
+    with transaction.atomic():
+        Product.objects.filter(pk=product_id).update(
+            rating=Coalesce(average, 0.0, output_field=DecimalField(max_digits=3, decimal_places=1)),
+            **values,
+        )
+        sync_cards([product_id])
+    _invalidate([product_id])
+
+
+def comment_changed(previous, comment):
+    """
+    اعمال تغییر یک نظر روی امتیاز محصول
+
+    Args:
+        previous: (product_id, rating, is_approved) قبل از ذخیره یا None برای نظر جدید
+        comment: نظر ذخیره شده یا None برای نظر حذف شده
+    """
+    old_product_id, old = None, {}
+    if previous:
+        old_product_id, old_rating, old_approved = previous
+        old = contribution(old_rating, old_approved)
+
+    new_product_id, new = None, {}
+    if comment is not None:
+        new_product_id = comment.product_id
+        new = contribution(comment.rating, comment.is_approved)
+
+    if old_product_id == new_product_id:
+        apply_delta(new_product_id, {
+            field: new.get(field, 0) - old.get(field, 0) for field in TOTAL_FIELDS
+        })
+        return
+    if old_product_id is not None:
+        apply_delta(old_product_id, {field: -delta for field, delta in old.items()})
+    if new_product_id is not None:
+        apply_delta(new_product_id, new)
+
+
+def reconcile(product_ids=None, batch_size=500):
+    """
+    بازسازی ستون‌های تجمیعی و میانگین امتیاز از نظرات تایید شده
+
+    Args:
+        product_ids: شناسه محصولات؛ در صورت None همه محصولات
+
+    Returns:
+        int: تعداد محصولاتی که مقادیرشان اصلاح شد
+    """
+    comments = Comment.objects.filter(is_approved=True)
+    products = Product.objects.only('id', 'rating', *TOTAL_FIELDS)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        comments = comments.filter(product_id__in=product_ids)
+        products = products.filter(id__in=product_ids)
+
+    # یک کوئری گروهی بر اساس (محصول، امتیاز)
+    totals = defaultdict(dict)
+    for product_id, rating, count in comments.values_list('product_id', 'rating').annotate(
+        count=Count('id'),
+    ).order_by():
+        row = totals[product_id]
+        for field, value in contribution(rating, True).items():
+            row[field] = row.get(field, 0) + value * count
+
+    changed = []
+    for product in products:
+        row = totals.get(product.id, {})
+        expected = {field: row.get(field, 0) for field in TOTAL_FIELDS}
+        expected['rating'] = average_rating(expected['rating_sum'], expected['review_count'])
+        if any(getattr(product, field) != value for field, value in expected.items()):
+            for field, value in expected.items():
+                setattr(product, field, value)
+            changed.append(product)
+
+    if changed:
+        with transaction.atomic():
+            Product.objects.bulk_update(changed, ['rating', *TOTAL_FIELDS], batch_size=batch_size)
+            ProductCard.objects.bulk_update(
+                [ProductCard(product_id=p.id, rating=p.rating, review_count=p.review_count) for p in changed],
+                ['rating', 'review_count'], batch_size=batch_size,
+            )
+        _invalidate(product.id for product in changed)
+    return len(changed)
+
+
+def moderate(comments, approved):
+    """
+    تایید یا رد گروهی نظرات با یک UPDATE و بازمحاسبه امتیاز محصولات درگیر
+
+    Args:
+        comments: کوئری نظرات انتخاب شده
+        approved: وضعیت تایید جدید
+
+    Returns:
+        tuple: (تعداد نظرات تغییر کرده، تعداد محصولات بازمحاسبه شده)
+    """
+    pending = comments.filter(is_approved=not approved)
+    with transaction.atomic():
+        product_ids = set(pending.order_by().values_list('product_id', flat=True).distinct())
+        updated = pending.update(is_approved=approved)
+        reconcile(product_ids)
+    return updated, len(product_ids)
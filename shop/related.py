@@ -0,0 +1,241 @@
+"""ساخت جدول محصولات مرتبط از خرید مشترک و علاقه‌مندی مشترک
+
+هر سفارش پرداخت شده و هر لیست علاقه‌مندی یک «سبد» است. تعداد دفعات حضور هم‌زمان
+هر دو محصول در سبدها در یک ماتریس تنک (دیکشنری از Counter) شمرده می‌شود و با
+فراوانی هر محصول نرمال می‌شود (شباهت کسینوسی). برای محصولاتی که همسایه کافی
+ندارند، محصولات پرطرفدار همان دسته‌بندی جایگزین می‌شوند. صفحه محصول فقط
+TOP_K ردیف آماده را با یک کوئری روی ایندکس (product, rank) می‌خواند.
+
+بازسازی تدریجی فقط ردیف محصولاتی را که از آخرین ساخت سفارش جدید، تغییر یا
+تغییر علاقه‌مندی داشته‌اند (به همراه همسایه‌هایشان) دوباره محاسبه می‌کند.
+تغییرات علاقه‌مندی در جدول DirtyProduct (صف related) ثبت می‌شوند تا بین
+پروسه‌ها مشترک باشند و ثبت همزمان با بازسازی از دست نرود.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import DirtyProduct, OrderItem, Product, ProductCard, RelatedProduct, Settings, Wishlist
+
+TOP_K = 8
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+SOURCE_WEIGHTS = {
+    'order': 3.0,
+    'wishlist': 1.0,
+}
+
+BUILT_AT_SETTING = 'related_products_built_at'
+DIRTY_QUEUE = 'related'
+
+
+def _basket_rows(source):
+    """سطرهای (شناسه سبد، شناسه محصول) یک منبع"""
+    if source == 'order':
+        return OrderItem.objects.filter(order__status__in=PAID_STATUSES), 'order_id'
+    return Wishlist.products.through.objects.all(), 'wishlist_id'
+
+
+def load_baskets(source, product_ids=None):
+    """
+    سبدهای یک منبع به صورت لیست مجموعه شناسه محصولات
+
+    Args:
+        product_ids: در صورت تعیین، فقط سبدهایی که حداقل یکی از این محصولات را دارند
+    """
+    rows, basket_field = _basket_rows(source)
+    if product_ids is not None:
+        rows = rows.filter(**{
+            f'{basket_field}__in': rows.filter(product_id__in=product_ids).values(basket_field),
+        })
+    baskets = defaultdict(set)
+    for basket_id, product_id in rows.values_list(basket_field, 'product_id').iterator(chunk_size=2000):
+        baskets[basket_id].add(product_id)
+    return list(baskets.values())
+
+
+def basket_frequencies(source):
+    """تعداد سبدهای شامل هر محصول (برای نرمال‌سازی)"""
+    rows, basket_field = _basket_rows(source)
+    return dict(rows.values_list('product_id').annotate(baskets=Count(basket_field, distinct=True)).order_by())
+
+
+def co_occurrence(baskets, product_ids=None):
+    """
+    ماتریس تنک هم‌حضوری: counts[a][b] تعداد سبدهای شامل a و b
+
+    Args:
+        product_ids: در صورت تعیین، فقط سطرهای این محصولات ساخته می‌شود
+    """
+    counts = defaultdict(Counter)
+    for basket in baskets:
+        if len(basket) < 2:
+            continue
+        for product_id in basket:
+            if product_ids is not None and product_id not in product_ids:
+                continue
+            row = counts[product_id]
+            for other_id in basket:
+                if other_id != product_id:
+                    row[other_id] += 1
+    return counts
+
+
+def _category_fallbacks(active_cards):
+    """محصولات پرطرفدار هر دسته‌بندی به ترتیب امتیاز ترند"""
+    fallbacks = defaultdict(list)
+    for product_id, category_id in active_cards:
+        if len(fallbacks[category_id]) <= TOP_K:
+            fallbacks[category_id].append(product_id)
+    return fallbacks
+
+
+def compute_neighbors(product_ids=None):
+    """
+    محاسبه TOP_K محصول مرتبط برای هر محصول
+
+    Returns:
+        dict: نگاشت شناسه محصول به لیست (شناسه مرتبط، امتیاز، منبع)
+    """
+    active_cards = list(
+        ProductCard.objects.filter(is_active=True).order_by('-trending_score', '-pk').values_list('pk', 'category_id')
+    )
+    category_of = dict(active_cards)
+    targets = set(category_of) if product_ids is None else set(product_ids) & set(category_of)
+
+    scores = defaultdict(Counter)
+    best_source = {}
+    for source, weight in SOURCE_WEIGHTS.items():
+        frequencies = basket_frequencies(source)
+        baskets = load_baskets(source, None if product_ids is None else targets)
+        for product_id, row in co_occurrence(baskets, targets).items():
+            for other_id, together in row.items():
+                if other_id not in category_of:
+                    continue
+                value = weight * together / math.sqrt(frequencies[product_id] * frequencies[other_id])
+                scores[product_id][other_id] += value
+                key = (product_id, other_id)
+                if value > best_source.get(key, (0, None))[0]:
+                    best_source[key] = (value, source)
+
+    fallbacks = _category_fallbacks(active_cards)
+    neighbors = {}
+    for product_id in targets:
+        chosen = [
+            (other_id, score, best_source[(product_id, other_id)][1])
+            for other_id, score in scores[product_id].most_common(TOP_K)
+        ]
+        seen = {product_id, *(other_id for other_id, _, _ in chosen)}
+        for other_id in fallbacks[category_of[product_id]]:
+            if len(chosen) >= TOP_K:
+                break
+            if other_id not in seen:
+                chosen.append((other_id, 0.0, 'category'))
+                seen.add(other_id)
+        neighbors[product_id] = chosen
+    return neighbors
+
+
+def save_neighbors(neighbors, product_ids=None):
+    """
+    جایگزینی ردیف‌ها در جدول
+
+    Args:
+        product_ids: محصولاتی که ردیف‌های قبلی‌شان حذف می‌شود (None یعنی کل جدول)
+    """
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=other_id, score=score, rank=rank, source=source)
+        for product_id, chosen in neighbors.items()
+        for rank, (other_id, score, source) in enumerate(chosen)
+    ]
+    with transaction.atomic():
+        stale = RelatedProduct.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=list(product_ids))
+        stale.delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def mark_dirty(product_ids):
+    """ثبت محصولاتی که علاقه‌مندی‌هایشان تغییر کرده برای بازسازی بعدی"""
+    if not product_ids:
+        return
+    # ثبت دوباره زمان را جلو می‌برد تا بازسازی در حال اجرا آن را پاک نکند
+    DirtyProduct.objects.bulk_create(
+        [DirtyProduct(queue=DIRTY_QUEUE, product_id=product_id) for product_id in set(product_ids)],
+        update_conflicts=True,
+        unique_fields=['queue', 'product'],
+        update_fields=['marked_at'],
+    )
+
+
+def dirty_products(since):
+    """محصولات دارای سفارش جدید، تغییر یا تغییر علاقه‌مندی پس از since"""
+    dirty = set(DirtyProduct.objects.filter(queue=DIRTY_QUEUE).values_list('product_id', flat=True))
+    dirty.update(OrderItem.objects.filter(
+        Q(order__created_at__gte=since) | Q(order__payment_date__gte=since)
+    ).values_list('product_id', flat=True))
+    dirty.update(Product.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+    return dirty
+
+
+def rebuild(full=False):
+    """
+    بازسازی جدول محصولات مرتبط
+
+    Args:
+        full: بازسازی کامل؛ در غیر این صورت فقط محصولات تغییر کرده و همسایه‌های
+            آن‌ها (در صورت نبود ساخت قبلی، بازسازی کامل انجام می‌شود)
+
+    Returns:
+        tuple: (تعداد محصولات بازسازی شده، تعداد ردیف‌های ذخیره شده)
+    """
+    started_at = timezone.now()
+    built_at = Settings.get_value(BUILT_AT_SETTING)
+
+    if full or not built_at:
+        product_ids = None
+    else:
+        dirty = dirty_products(parse_datetime(built_at))
+        # سطر همسایه‌ها هم با تغییر هم‌حضوری تغییر می‌کند
+        product_ids = set(dirty)
+        for source in SOURCE_WEIGHTS:
+            for basket in load_baskets(source, dirty):
+                product_ids.update(basket)
+
+    if product_ids == set():
+        neighbors = {}
+        saved = 0
+    else:
+        neighbors = compute_neighbors(product_ids)
+        saved = save_neighbors(neighbors, product_ids)
+
+    # محصولاتی که پس از شروع بازسازی ثبت شده‌اند برای ساخت بعدی می‌مانند
+    DirtyProduct.objects.filter(queue=DIRTY_QUEUE, marked_at__lte=started_at).delete()
+    Settings.set_value(BUILT_AT_SETTING, started_at.isoformat(), 'زمان آخرین ساخت محصولات مرتبط')
+    return len(neighbors), saved
+
+
+def related_cards(product):
+    """
+    کارت محصولات مرتبط برای صفحه محصول
+
+    ردیف‌های از پیش محاسبه شده با یک کوئری روی ایندکس (product, rank) خوانده
+    می‌شوند؛ اگر هنوز ساخته نشده باشند (محصول جدید) محصولات پرطرفدار همان
+    دسته‌بندی برگردانده می‌شوند.
+    """
+    cards = list(ProductCard.objects.filter(
+        product__related_from__product_id=product.id,
+        is_active=True,
+    ).order_by('product__related_from__rank'))
+    if cards:
+        return cards
+    return list(
+        ProductCard.objects.filter(category_id=product.category_id, is_active=True)
+        .exclude(pk=product.id)
+        .order_by('-trending_score', '-pk')[:TOP_K]
+    )
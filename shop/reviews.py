@@ -0,0 +1,75 @@
+"""صفحه‌بندی keyset نظرات محصولات و رای «مفید بود»
+
+صفحه محصول فقط صفحه اول نظرات را رندر می‌کند و بقیه با API و cursor خوانده
+می‌شوند؛ بنابراین حجم صفحه و زمان کوئری با تعداد نظرات رشد نمی‌کند.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from .catalog import keyset_page
+from .models import Comment, CommentVote
+
+COMMENTS_PER_PAGE = 10
+
+COMMENT_SORTS = {
+    'newest': '-created_at',
+    'helpful': '-helpful_count',
+}
+COMMENT_CURSOR_PARSERS = {
+    '-created_at': parse_datetime,
+    '-helpful_count': int,
+}
+
+
+def approved_comments(product_id, rating=None):
+    """کوئری نظرات تایید شده یک محصول"""
+    comments = Comment.objects.filter(product_id=product_id, is_approved=True).select_related('user')
+    if rating:
+        comments = comments.filter(rating=rating)
+    return comments
+
+
+def comment_page(product_id, sort='newest', rating=None, after=None, size=COMMENTS_PER_PAGE):
+    """
+    یک صفحه از نظرات تایید شده
+
+    Returns:
+        tuple: (لیست نظرات، توکن صفحه بعد یا None)؛ cursor نامعتبر ValueError
+    """
+    return keyset_page(
+        approved_comments(product_id, rating), COMMENT_SORTS.get(sort, COMMENT_SORTS['newest']),
+        after, size, parsers=COMMENT_CURSOR_PARSERS,
+    )
+
+
+def serialize_comment(comment):
+    """داده JSON یک نظر"""
+    avatar = None
+    if comment.user and comment.user.profile_image:
+        avatar = comment.user.profile_image.url
+    return {
+        'id': comment.id,
+        'name': comment.name,
+        'rating': comment.rating,
+        'comment': comment.comment,
+        'helpful_count': comment.helpful_count,
+        'created_at': comment.created_at.isoformat(),
+        'user_avatar': avatar,
+    }
+
+
+def mark_helpful(comment, user):
+    """
+    ثبت رای «مفید بود» کاربر
+
+    Returns:
+        bool: True اگر رای جدید ثبت شد (رای تکراری نادیده گرفته می‌شود)
+    """
+    try:
+        with transaction.atomic():
+            CommentVote.objects.create(comment=comment, user=user)
+            Comment.objects.filter(pk=comment.pk).update(helpful_count=F('helpful_count') + 1)
+    except IntegrityError:
+        return False
+    return True
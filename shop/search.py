@@ -0,0 +1,166 @@
+"""جستجوی تمام‌متن محصولات با SQLite FTS5 و نرمال‌سازی متن فارسی"""
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+FTS_TABLE = 'shop_product_fts'
+
+# وزن ستون‌ها در رتبه‌بندی bm25: نام، برند، دسته‌بندی، توضیحات
+BM25_WEIGHTS = (10.0, 4.0, 3.0, 1.0)
+
+# فیلدهایی از محصول که در ایندکس جستجو استفاده می‌شوند
+INDEXED_FIELDS = {'name', 'description', 'short_description', 'meta_keywords', 'brand', 'category'}
+
+_CHAR_MAP = {
+    '\u064a': '\u06cc', '\u0649': '\u06cc', '\u0626': '\u06cc',  # ي ى ئ -> ی
+    '\u0643': '\u06a9',  # ك -> ک
+    '\u0629': '\u0647', '\u06c0': '\u0647',  # ة ۀ -> ه
+    '\u0623': '\u0627', '\u0625': '\u0627', '\u0671': '\u0627',  # أ إ ٱ -> ا
+    '\u0624': '\u0648',  # ؤ -> و
+    '\u200c': ' ',  # نیم‌فاصله
+    '\u200e': '', '\u200f': '',  # نشانه‌های جهت متن
+    '\u0640': '',  # کشیده
+}
+_CHAR_MAP.update({chr(0x06F0 + i): str(i) for i in range(10)})  # ارقام فارسی
+_CHAR_MAP.update({chr(0x0660 + i): str(i) for i in range(10)})  # ارقام عربی
+_TRANSLATION = str.maketrans(_CHAR_MAP)
+
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')
+_NON_WORD = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_persian(text):
+    """
+    نرمال‌سازی متن فارسی برای ایندکس و جستجو
+
+    ی و ک عربی به فارسی، حذف اعراب و کشیده، تبدیل نیم‌فاصله به فاصله،
+    تبدیل ارقام فارسی و عربی به لاتین و حذف علائم نگارشی.
+    """
+    if not text:
+        return ''
+    text = _DIACRITICS.sub('', str(text).translate(_TRANSLATION)).lower()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+_fts_tables = {}
+
+
+def fts_available():
+    """آیا ایندکس FTS5 در پایگاه داده فعلی وجود دارد (نتیجه مثبت و منفی برای هر پایگاه داده کش می‌شود)"""
+    if connection.vendor != 'sqlite':
+        return False
+    name = str(connection.settings_dict['NAME'])
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[name]
+
+
+def _document(product):
+    body = ' '.join(filter(None, [product.short_description, product.description, product.meta_keywords]))
+    return (
+        product.id,
+        normalize_persian(product.name),
+        normalize_persian(product.brand.name if product.brand else ''),
+        normalize_persian(product.category.name),
+        normalize_persian(body),
+    )
+
+
+def index_products(product_ids=None):
+    """
+    ایندکس (یا بازایندکس) محصولات
+
+    Args:
+        product_ids: شناسه محصولات؛ در صورت None کل ایندکس بازسازی می‌شود
+
+    Returns:
+        int: تعداد محصولات ایندکس شده
+    """
+    if not fts_available():
+        return 0
+
+    products = Product.objects.select_related('category', 'brand').only(
+        'id', 'name', 'description', 'short_description', 'meta_keywords', 'category__name', 'brand__name',
+    ).order_by()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        products = products.filter(id__in=product_ids)
+
+    rows = [_document(product) for product in products.iterator(chunk_size=500)]
+    # حذف و درج در یک تراکنش؛ در صورت خطا ایندکس قبلی دست نخورده می‌ماند
+    with transaction.atomic(), connection.cursor() as cursor:
+        if product_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, brand, category, body) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+    return len(rows)
+
+
+def remove_products(product_ids):
+    """حذف محصولات از ایندکس"""
+    product_ids = list(product_ids)
+    if not product_ids or not fts_available():
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', product_ids)
+
+
+def build_match_query(query):
+    """ساخت عبارت MATCH از متن جستجو؛ هر کلمه به صورت پیشوندی جستجو می‌شود"""
+    tokens = normalize_persian(query).split()
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def match_subquery(query):
+    """
+    زیرکوئری SQL شناسه محصولات منطبق با جستجو برای فیلتر id__in
+
+    شناسه‌ها در پایتون خوانده نمی‌شوند؛ پایگاه داده مستقیماً با جدول FTS join
+    می‌کند و تعداد نتایج محدودیتی ندارد.
+
+    Returns:
+        RawSQL | None: در صورت خالی بودن عبارت جستجو None
+    """
+    match = build_match_query(query)
+    if not match:
+        return None
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+
+
+def relevance(query, model, column='id'):
+    """
+    عبارت رتبه bm25 هر ردیف برای مرتب‌سازی (مقدار کمتر یعنی مرتبط‌تر)
+
+    Args:
+        model: مدلی که ستون column آن شناسه محصول است (Product یا ProductCard)
+    """
+    match = build_match_query(query)
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    qn = connection.ops.quote_name
+    product_column = f'{qn(model._meta.db_table)}.{qn(model._meta.get_field(column).column)}'
+    return RawSQL(
+        f'(SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {product_column})',
+        [match],
+    )
+
+
+def has_matches(query):
+    """آیا حداقل یک محصول با جستجوی دقیق منطبق است"""
+    match = build_match_query(query)
+    if not match:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1', [match])
+        return cursor.fetchone() is not None
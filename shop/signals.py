@@ -0,0 +1,353 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import DeletedProduct, Product, ProductImage, ProductCard, Category, Brand, Banner, Settings, ShippingSettings, Order, Wishlist, Comment
+from .catalog import PRICE_FACET_FIELDS, bump_catalog_version, bump_price_version
+from .conditional import SHIPPING_VERSION_KEY, bump_version
+from .cards import COPIED_FIELDS, refresh_cards, update_card_fields
+from . import carts, fuzzy, page_cache, ratings, related, search, suggest, trending, wishlists
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_on_product_change(sender, instance, **kwargs):
+    """باطل کردن کش کاتالوگ هنگام تغییر محصول"""
+    update_fields = kwargs.get('update_fields')
+    # افزایش تعداد بازدید روی نتایج فیلتر تاثیری ندارد
+    if update_fields and set(update_fields) == {'view_count'}:
+        return
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_price_facets(sender, instance, **kwargs):
+    """باطل کردن بازه‌های قیمت کش شده هنگام تغییر قیمت یا عضویت محصول در فیلترها"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & PRICE_FACET_FIELDS:
+        return
+    bump_price_version()
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def invalidate_catalog(sender, instance, **kwargs):
+    """باطل کردن کش کاتالوگ هنگام تغییر تصاویر، دسته‌بندی‌ها یا برندها"""
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+def sync_product_card(sender, instance, update_fields=None, **kwargs):
+    """همگام‌سازی کارت محصول پس از ذخیره محصول"""
+    # ذخیره‌های جزئی (مثل بازدید یا امتیاز) فقط همان ستون‌ها را به‌روز می‌کنند
+    if update_fields and set(update_fields) <= set(COPIED_FIELDS):
+        if update_card_fields(instance, update_fields):
+            return
+    refresh_cards([instance.id])
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def sync_card_image(sender, instance, **kwargs):
+    """به‌روزرسانی تصویر کارت پس از تغییر تصاویر محصول"""
+    # پس از commit اجرا می‌شود تا حذف زنجیره‌ای محصول، کارت را دوباره نسازد
+    product_id = instance.product_id
+    transaction.on_commit(lambda: refresh_cards([product_id]))
+
+
+@receiver(post_save, sender=Category)
+def sync_card_category(sender, instance, **kwargs):
+    """به‌روزرسانی نام و اسلاگ دسته‌بندی در کارت‌ها"""
+    ProductCard.objects.filter(category_id=instance.id).update(
+        category_name=instance.name,
+        category_slug=instance.slug,
+    )
+
+
+@receiver(post_save, sender=Brand)
+def sync_card_brand(sender, instance, **kwargs):
+    """به‌روزرسانی نام و اسلاگ برند در کارت‌ها"""
+    ProductCard.objects.filter(brand_id=instance.id).update(
+        brand_name=instance.name,
+        brand_slug=instance.slug,
+    )
+
+
+@receiver(post_delete, sender=Brand)
+def clear_card_brand(sender, instance, **kwargs):
+    """پاک کردن برند حذف‌شده از کارت‌ها"""
+    ProductCard.objects.filter(brand__isnull=True, brand_slug=instance.slug).update(
+        brand_name='',
+        brand_slug='',
+    )
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    """ثبت زمان تغییر محصول پس از تغییر تصاویر برای خروجی تغییرات فید"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def touch_products_on_group_change(sender, instance, created=False, **kwargs):
+    """ثبت زمان تغییر محصولات پس از تغییر نام دسته‌بندی یا برند"""
+    if created:
+        return
+    instance.products.update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Brand)
+def touch_products_on_brand_delete(sender, instance, **kwargs):
+    """محصولات برند حذف‌شده بدون برند می‌مانند؛ زمان تغییرشان ثبت می‌شود"""
+    instance.products.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Product)
+def record_deleted_product(sender, instance, **kwargs):
+    """ثبت محصول حذف شده تا خروجی تغییرات فید آن را اعلام کند"""
+    DeletedProduct.objects.create(product_id=instance.id, slug=instance.slug)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """به‌روزرسانی ایندکس جستجو پس از ذخیره محصول"""
+    if update_fields and not set(update_fields) & search.INDEXED_FIELDS:
+        return
+    search.index_products([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """حذف محصول از ایندکس جستجو"""
+    search.remove_products([instance.id])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def reindex_related_products(sender, instance, created=False, **kwargs):
+    """بازایندکس محصولات پس از تغییر نام دسته‌بندی یا برند"""
+    if created:
+        return
+    search.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+def reindex_brand_products(sender, instance, **kwargs):
+    """بازایندکس محصولات برند حذف‌شده پس از commit"""
+    product_ids = list(instance.products.values_list('id', flat=True))
+    if product_ids:
+        transaction.on_commit(lambda: search.index_products(product_ids))
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, update_fields=None, **kwargs):
+    """به‌روزرسانی ایندکس پیشنهاد جستجو پس از ذخیره محصول"""
+    if update_fields and set(update_fields) == {'view_count'}:
+        suggest.update_view_count(instance.id, instance.view_count)
+        return
+    suggest.update_product(instance.id)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestion(sender, instance, **kwargs):
+    """حذف محصول از ایندکس پیشنهاد جستجو"""
+    suggest.remove('product', instance.id)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Brand)
+def update_group_suggestion(sender, instance, **kwargs):
+    """به‌روزرسانی ایندکس پیشنهاد جستجو پس از ذخیره دسته‌بندی یا برند"""
+    suggest.update_group('category' if sender is Category else 'brand', instance)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+def remove_group_suggestion(sender, instance, **kwargs):
+    """حذف دسته‌بندی یا برند از ایندکس پیشنهاد جستجو"""
+    suggest.remove('category' if sender is Category else 'brand', instance.id)
+
+
+@receiver(post_save, sender=Product)
+def update_product_trigrams(sender, instance, update_fields=None, **kwargs):
+    """به‌روزرسانی ایندکس سه‌حرفی پس از تغییر نام یا برند محصول"""
+    if update_fields and not set(update_fields) & {'name', 'brand'}:
+        return
+    fuzzy.index_products([instance.id])
+
+
+@receiver(post_save, sender=Brand)
+def update_brand_trigrams(sender, instance, created=False, **kwargs):
+    """بازسازی سه‌حرفی‌های محصولات برند پس از تغییر نام آن"""
+    if created:
+        return
+    fuzzy.index_products(instance.products.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Brand)
+def reindex_brand_trigrams(sender, instance, **kwargs):
+    """بازسازی سه‌حرفی‌های محصولات برند حذف‌شده پس از commit"""
+    product_ids = list(instance.products.values_list('id', flat=True))
+    if product_ids:
+        transaction.on_commit(lambda: fuzzy.index_products(product_ids))
+
+
+def _product_page_tags(category_slug, brand_slug):
+    """برچسب صفحاتی که یک محصول در آن‌ها نمایش داده می‌شود"""
+    tags = ['products', 'home', f'category:{category_slug}']
+    if brand_slug:
+        tags.append(f'brand:{brand_slug}')
+    return tags
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_pages(sender, instance, update_fields=None, **kwargs):
+    """ذخیره دسته‌بندی و برند قبلی محصول برای باطل کردن صفحات قبلی"""
+    if not instance.pk or (update_fields and set(update_fields) == {'view_count'}):
+        return
+    instance._previous_page_slugs = ProductCard.objects.filter(pk=instance.pk).values_list(
+        'category_slug', 'brand_slug',
+    ).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_pages(sender, instance, **kwargs):
+    """باطل کردن کش صفحات فهرست‌کننده محصول"""
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) == {'view_count'}:
+        return
+    tags = _product_page_tags(instance.category.slug, instance.brand.slug if instance.brand else '')
+    previous = getattr(instance, '_previous_page_slugs', None)
+    if previous:
+        tags += _product_page_tags(*previous)
+    page_cache.purge(*tags)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def purge_product_image_pages(sender, instance, **kwargs):
+    """باطل کردن کش صفحات پس از تغییر تصاویر محصول"""
+    card = ProductCard.objects.filter(pk=instance.product_id).values_list('category_slug', 'brand_slug').first()
+    if card:
+        page_cache.purge(*_product_page_tags(*card))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    """باطل کردن کش صفحات پس از تغییر دسته‌بندی"""
+    page_cache.purge('products', 'home', f'category:{instance.slug}')
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def purge_brand_pages(sender, instance, **kwargs):
+    """باطل کردن کش صفحات پس از تغییر برند"""
+    page_cache.purge('products', f'brand:{instance.slug}')
+
+
+@receiver(post_save, sender=Banner)
+@receiver(post_delete, sender=Banner)
+@receiver(post_save, sender='blog.Post')
+@receiver(post_delete, sender='blog.Post')
+def purge_home_page(sender, instance, **kwargs):
+    """باطل کردن کش صفحه اصلی پس از تغییر بنرها یا مطالب وبلاگ"""
+    page_cache.purge('home')
+
+
+@receiver(post_save, sender=ShippingSettings)
+@receiver(post_delete, sender=ShippingSettings)
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def invalidate_shipping_settings(sender, instance, **kwargs):
+    """تغییر نسخه تنظیمات ارسال برای API شرطی"""
+    bump_version(SHIPPING_VERSION_KEY)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    """ذخیره وضعیت قبلی سفارش برای تشخیص پرداخت"""
+    instance._previous_status = None
+    if instance.pk:
+        instance._previous_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def record_trending_sales(sender, instance, **kwargs):
+    """افزودن فروش سفارش پرداخت شده به امتیاز ترند پس از commit"""
+    if instance.status == 'paid' and getattr(instance, '_previous_status', None) != 'paid':
+        transaction.on_commit(lambda: trending.record_order_sales(instance))
+
+
+@receiver(m2m_changed, sender=Wishlist.products.through)
+def mark_wishlist_related_dirty(sender, instance, action, reverse=False, pk_set=None, **kwargs):
+    """ثبت محصولات با علاقه‌مندی تغییر کرده برای بازسازی تدریجی محصولات مرتبط"""
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            related.mark_dirty([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        related.mark_dirty(pk_set)
+    elif action == 'pre_clear':
+        related.mark_dirty(instance.products.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Wishlist.products.through)
+def sync_wishlist_ids(sender, instance, action, reverse, pk_set=None, **kwargs):
+    """به‌روزرسانی مجموعه کش شده شناسه‌های علاقه‌مندی کاربر"""
+    if reverse:
+        # تغییر از سمت محصول (product.wishlisted_by)؛ کش کاربران مربوط باطل می‌شود
+        if action in ('post_add', 'post_remove') and pk_set:
+            wishlists.invalidate(*Wishlist.objects.filter(pk__in=pk_set).values_list('user_id', flat=True))
+        elif action == 'pre_clear':
+            wishlists.invalidate(*instance.wishlisted_by.values_list('user_id', flat=True))
+        return
+    if action == 'post_add':
+        wishlists.add_ids(instance.user_id, pk_set)
+    elif action == 'post_remove':
+        wishlists.remove_ids(instance.user_id, pk_set)
+    elif action == 'post_clear':
+        wishlists.invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Wishlist)
+def clear_wishlist_ids(sender, instance, **kwargs):
+    """حذف مجموعه کش شده پس از حذف علاقه‌مندی"""
+    wishlists.invalidate(instance.user_id)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_rating(sender, instance, **kwargs):
+    """ذخیره محصول، امتیاز و وضعیت تایید قبلی نظر برای محاسبه اختلاف"""
+    instance._previous_rating_state = None
+    if instance.pk:
+        instance._previous_rating_state = Comment.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'rating', 'is_approved',
+        ).first()
+
+
+@receiver(post_save, sender=Comment)
+def update_rating_on_comment_save(sender, instance, **kwargs):
+    """اعمال تدریجی تغییر نظر روی امتیاز محصول"""
+    ratings.comment_changed(getattr(instance, '_previous_rating_state', None), instance)
+
+
+@receiver(post_delete, sender=Comment)
+def update_rating_on_comment_delete(sender, instance, **kwargs):
+    """کم کردن سهم نظر حذف شده از امتیاز محصول"""
+    ratings.comment_changed((instance.product_id, instance.rating, instance.is_approved), None)
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    """انتقال سبد مهمان نشست به سبد کاربر پس از ورود"""
+    if request is not None and hasattr(request, 'session'):
+        carts.merge_session_cart(request, user)
@@ -0,0 +1,314 @@
+"""ایندکس پیشوندی در حافظه برای پیشنهاد جستجو (autocomplete)
+
+برای هر نام (محصول، برند یا دسته‌بندی) تمام پسوندهایی که از ابتدای یک کلمه
+شروع می‌شوند در یک آرایه مرتب نگهداری می‌شوند تا جستجوی پیشوندی با bisect و
+بدون مراجعه به پایگاه داده انجام شود. ایندکس در هر پروسه در یک نخ پس‌زمینه
+ساخته می‌شود (درخواستی که به ایندکس سرد می‌رسد با یک کوئری ساده پایگاه داده
+پاسخ می‌گیرد) و با ذخیره محصول، برند یا دسته‌بندی به صورت تدریجی به‌روز می‌شود.
+هر تغییر نسخه مشترک suggest:version را در پایگاه داده افزایش می‌دهد تا
+پروسه‌های دیگر با دیدن نسخه جدید ایندکس خود را بازسازی کنند.
+"""
+import bisect
+import heapq
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.db.models import Q, Sum
+from django.urls import reverse
+
+from .conditional import bump_version, get_version
+from .models import Product, Brand, Category
+from .search import normalize_persian
+
+SUGGEST_LIMIT = 8
+MAX_QUERY_LENGTH = 64
+# حداکثر تعداد پیشوندهایی که نتیجه رتبه‌بندی آن‌ها در حافظه نگهداری می‌شود
+MAX_CACHED_PREFIXES = 2000
+# هر واحد فروش معادل این تعداد بازدید در وزن پیشنهاد حساب می‌شود
+SALES_WEIGHT = 20
+# بازسازی دوره‌ای برای دریافت تغییراتی که نسخه را افزایش نمی‌دهند (بازدید و فروش)
+INDEX_TTL = 60 * 60
+# فاصله بررسی نسخه مشترک ایندکس (ثانیه)
+VERSION_CHECK_INTERVAL = 5
+SUGGEST_VERSION_KEY = 'suggest:version'
+
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()
+_state = {
+    'keys': [],     # آرایه مرتب از (پسوند نرمال‌شده، نوع، شناسه)
+    'items': {},    # (نوع، شناسه) -> اطلاعات پیشنهاد
+    'top': {},      # (پیشوند، تعداد) -> پیشنهادهای رتبه‌بندی شده
+    'built_at': None,
+    'version': None,
+    'checked_at': 0,
+}
+
+
+def product_url(slug, name):
+    """آدرس صفحه محصول؛ محصول بدون اسلاگ به نتایج جستجوی نامش می‌رسد"""
+    if slug:
+        return reverse('shop:product_detail', args=[slug])
+    return f"{reverse('shop:product_list')}?{urlencode({'search': name})}"
+
+
+def group_url(kind, slug):
+    """آدرس برند یا فیلتر دسته‌بندی در فهرست محصولات (صفحه مستقل دسته‌بندی وجود ندارد)"""
+    if kind == 'brand' and slug:
+        return reverse('shop:brand_products', args=[slug])
+    return f"{reverse('shop:product_list')}?{urlencode({kind: slug})}"
+
+
+def _suffixes(name):
+    """پسوندهای نام که از ابتدای هر کلمه شروع می‌شوند"""
+    words = normalize_persian(name).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def _product_item(product):
+    sales = product.sales or 0
+    return {
+        'type': 'product',
+        'id': product.id,
+        'name': product.name,
+        'url': product_url(product.slug, product.name),
+        'sales': sales,
+        'weight': product.view_count + SALES_WEIGHT * sales,
+    }
+
+
+def _group_item(kind, obj, weight):
+    return {
+        'type': kind,
+        'id': obj.id,
+        'name': obj.name,
+        'url': group_url(kind, obj.slug),
+        'weight': weight,
+    }
+
+
+def _sales_filter():
+    return Q(order_items__order__status__in=PAID_STATUSES)
+
+
+def _load_items(product_ids=None):
+    """بارگذاری اطلاعات پیشنهاد از پایگاه داده"""
+    products = Product.objects.filter(is_active=True).annotate(
+        sales=Sum('order_items__quantity', filter=_sales_filter()),
+    ).only('id', 'name', 'slug', 'view_count', 'category_id', 'brand_id').order_by()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    return list(products)
+
+
+def build_index():
+    """ساخت کامل ایندکس پیشنهاد"""
+    # نسخه پیش از خواندن داده‌ها؛ تغییرات حین ساخت در بررسی بعدی دیده می‌شوند
+    version = get_version(SUGGEST_VERSION_KEY)
+    items = {}
+    category_weights = {}
+    brand_weights = {}
+    for product in _load_items():
+        item = _product_item(product)
+        items[('product', product.id)] = item
+        category_weights[product.category_id] = category_weights.get(product.category_id, 0) + item['weight'] + 1
+        if product.brand_id:
+            brand_weights[product.brand_id] = brand_weights.get(product.brand_id, 0) + item['weight'] + 1
+
+    for category in Category.objects.filter(is_active=True).only('id', 'name', 'slug'):
+        items[('category', category.id)] = _group_item('category', category, category_weights.get(category.id, 0))
+    for brand in Brand.objects.filter(is_active=True).only('id', 'name', 'slug'):
+        items[('brand', brand.id)] = _group_item('brand', brand, brand_weights.get(brand.id, 0))
+
+    keys = sorted(
+        (suffix, kind, pk)
+        for (kind, pk), item in items.items()
+        for suffix in _suffixes(item['name'])
+    )
+    with _lock:
+        _state['keys'] = keys
+        _state['items'] = items
+        _state['top'] = {}
+        _state['built_at'] = time.monotonic()
+        _state['version'] = version
+        _state['checked_at'] = time.monotonic()
+    return len(items)
+
+
+def _build_in_background():
+    try:
+        build_index()
+    finally:
+        connection.close()
+        _build_lock.release()
+
+
+def _is_stale(built_at):
+    """آیا ایندکس قدیمی است یا پروسه دیگری آن را تغییر داده است"""
+    now = time.monotonic()
+    if built_at is None or now - built_at > INDEX_TTL:
+        return True
+    if now - _state['checked_at'] < VERSION_CHECK_INTERVAL:
+        return False
+    _state['checked_at'] = now
+    return get_version(SUGGEST_VERSION_KEY) != _state['version']
+
+
+def _ensure_index():
+    """
+    شروع ساخت ایندکس در پس‌زمینه در صورت نبود یا کهنه بودن آن
+
+    ایندکس قبلی تا پایان بازسازی استفاده می‌شود.
+
+    Returns:
+        bool: آیا ایندکس ساخته شده و قابل استفاده است
+    """
+    built_at = _state['built_at']
+    if _is_stale(built_at):
+        # فقط یک ساخت همزمان؛ درخواست منتظر نمی‌ماند
+        if _build_lock.acquire(blocking=False):
+            threading.Thread(target=_build_in_background, daemon=True).start()
+    return built_at is not None
+
+
+def _suggest_from_db(query, limit):
+    """پیشنهاد با کوئری ساده پایگاه داده تا زمانی که ایندکس ساخته نشده است"""
+    results = []
+    for kind, model in (('category', Category), ('brand', Brand)):
+        for obj in model.objects.filter(is_active=True, name__istartswith=query).only('id', 'name', 'slug')[:limit]:
+            results.append({'type': kind, 'id': obj.id, 'name': obj.name, 'url': group_url(kind, obj.slug)})
+    products = Product.objects.filter(is_active=True).filter(
+        Q(name__istartswith=query) | Q(name__icontains=f' {query}'),
+    ).only('id', 'name', 'slug').order_by('-view_count')[:limit]
+    results.extend(
+        {'type': 'product', 'id': product.id, 'name': product.name, 'url': product_url(product.slug, product.name)}
+        for product in products
+    )
+    return results[:limit]
+
+
+def _publish_change():
+    """
+    اعلام تغییر ایندکس به پروسه‌های دیگر
+
+    اگر ایندکس این پروسه پیش از این تغییر به‌روز بوده، نسخه آن همگام می‌شود تا
+    خود این پروسه بی‌دلیل بازسازی نکند.
+    """
+    bump_version(SUGGEST_VERSION_KEY)
+    version = get_version(SUGGEST_VERSION_KEY)
+    with _lock:
+        if _state['version'] is not None and version == _state['version'] + 1:
+            _state['version'] = version
+
+
+def _remove(kind, pk):
+    _state['top'] = {}
+    item = _state['items'].pop((kind, pk), None)
+    if item is None:
+        return
+    keys = _state['keys']
+    for suffix in _suffixes(item['name']):
+        entry = (suffix, kind, pk)
+        position = bisect.bisect_left(keys, entry)
+        if position < len(keys) and keys[position] == entry:
+            del keys[position]
+
+
+def _insert(item):
+    _state['top'] = {}
+    _state['items'][(item['type'], item['id'])] = item
+    for suffix in _suffixes(item['name']):
+        bisect.insort(_state['keys'], (suffix, item['type'], item['id']))
+
+
+def update_product(product_id):
+    """به‌روزرسانی تدریجی یک محصول در ایندکس"""
+    if _state['built_at'] is not None:
+        products = _load_items([product_id])
+        with _lock:
+            _remove('product', product_id)
+            if products:
+                _insert(_product_item(products[0]))
+    _publish_change()
+
+
+def update_view_count(product_id, view_count):
+    """به‌روزرسانی وزن محصول پس از تغییر تعداد بازدید (بدون کوئری)"""
+    with _lock:
+        item = _state['items'].get(('product', product_id))
+        if item is not None:
+            item['weight'] = view_count + SALES_WEIGHT * item['sales']
+            _state['top'] = {}
+
+
+def update_group(kind, obj):
+    """به‌روزرسانی تدریجی برند یا دسته‌بندی در ایندکس"""
+    if _state['built_at'] is not None:
+        with _lock:
+            previous = _state['items'].get((kind, obj.id))
+            weight = previous['weight'] if previous else 0
+            _remove(kind, obj.id)
+            if obj.is_active:
+                _insert(_group_item(kind, obj, weight))
+    _publish_change()
+
+
+def remove(kind, pk):
+    """حذف یک مورد از ایندکس"""
+    if _state['built_at'] is not None:
+        with _lock:
+            _remove(kind, pk)
+    _publish_change()
+
+
+def _rank(prefix, limit):
+    """
+    پرارزش‌ترین موارد در کل بازه پیشوند (با قفل فراخوانی می‌شود)
+
+    نتیجه هر پیشوند تا تغییر بعدی ایندکس نگهداری می‌شود؛ پیشوندهای کوتاه
+    بازه بزرگی دارند ولی فقط یک بار پیمایش می‌شوند.
+    """
+    cached = _state['top'].get((prefix, limit))
+    if cached is not None:
+        return cached
+
+    keys = _state['keys']
+    items = _state['items']
+    matches = {}
+    position = bisect.bisect_left(keys, (prefix,))
+    while position < len(keys) and keys[position][0].startswith(prefix):
+        _, kind, pk = keys[position]
+        item = items.get((kind, pk))
+        if item is not None:
+            matches[(kind, pk)] = item
+        position += 1
+
+    ranked = [
+        {'type': item['type'], 'id': item['id'], 'name': item['name'], 'url': item['url']}
+        for item in heapq.nsmallest(limit, matches.values(), key=lambda item: (-item['weight'], len(item['name'])))
+    ]
+    if len(_state['top']) >= MAX_CACHED_PREFIXES:
+        _state['top'] = {}
+    _state['top'][(prefix, limit)] = ranked
+    return ranked
+
+
+def suggest(query, limit=SUGGEST_LIMIT):
+    """
+    پیشنهادهای منطبق با پیشوند عبارت جستجو
+
+    Returns:
+        list: پیشنهادها به ترتیب وزن (بازدید و فروش)
+    """
+    prefix = normalize_persian(query[:MAX_QUERY_LENGTH])
+    if not prefix:
+        return []
+    if not _ensure_index():
+        return _suggest_from_db(query[:MAX_QUERY_LENGTH].strip(), limit)
+
+    with _lock:
+        ranked = _rank(prefix, limit)
+    return [dict(item) for item in ranked]
@@ -1,3 +1,1138 @@
-from django.test import TestCase
+import base64
+import gzip
+import json
+import shutil
+import subprocess
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import DatabaseError, OperationalError, connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    catalog, counts, fuzzy, inventory, page_cache, ratings, related, search, suggest, trending, view_counter, views, wishlists,
+)
+from .conditional import bump_version
+
+from .inventory import InsufficientStockError, decrement_stock
+from .models import (
+    Brand, Cart, Category, Comment, DirtyProduct, Order, Product, ProductCard, RelatedProduct, ResourceVersion, ShippingSettings,
+    Wishlist,
+)
+
+
+def _create_product(stock_quantity, **extra):
+    category, _ = Category.objects.get_or_create(slug='test', defaults={'name': 'تست'})
+    return Product.objects.create(
+        name=extra.pop('name', 'محصول تست'), slug=extra.pop('slug', 'test-product'), category=category,
+        description=extra.pop('description', '-'), price=extra.pop('price', 1000), stock_quantity=stock_quantity, **extra,
+    )
+
+
+def _create_order(user, product, quantity):
+    order = Order.objects.create(user=user, status='pending', subtotal_amount=1000 * quantity, total_amount=1000 * quantity)
+    order.items.create(product=product, quantity=quantity, unit_price=1000, total_price=1000 * quantity)
+    return order
+
+
+class DecrementStockTests(TestCase):
+    """کاهش شرطی موجودی هنگام پرداخت"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='buyer@example.com', username='buyer', password='x')
+
+    def test_mark_as_paid_decrements_stock(self):
+        product = _create_product(5)
+        _create_order(self.user, product, 3).mark_as_paid('ref', 'auth')
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 2)
+        self.assertEqual(product.card.stock_quantity, 2)
+
+    def test_repeated_payment_decrements_once(self):
+        product = _create_product(5)
+        order = _create_order(self.user, product, 2)
+        order.mark_as_paid('ref', 'auth')
+        Order.objects.get(pk=order.pk).mark_as_paid('ref', 'auth')
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 3)
+
+    def test_shortage_rolls_back_every_product(self):
+        enough = _create_product(5)
+        short = _create_product(1, name='کم', slug='short')
+        with self.assertRaises(InsufficientStockError) as raised:
+            decrement_stock({enough.id: 2, short.id: 2})
+        self.assertEqual([item['product_id'] for item in raised.exception.items], [short.id])
+        self.assertIn('کم', str(raised.exception))
+        enough.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual((enough.stock_quantity, short.stock_quantity), (5, 1))
+
+    def test_payment_does_not_sell_stock_reserved_by_other_orders(self):
+        product = _create_product(5)
+        inventory.reserve(_create_order(self.user, product, 3), {product.id: 3})
+        # سفارش دوم رزروی ندارد (مثلاً رزروش منقضی شده)؛ فقط ۲ عدد آزاد است
+        with self.assertRaises(InsufficientStockError) as raised:
+            _create_order(self.user, product, 3).mark_as_paid('ref', 'auth')
+        self.assertEqual(raised.exception.items[0]['available'], 2)
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.reserved_quantity), (5, 3))
+
+    def test_payment_counts_the_orders_own_hold(self):
+        product = _create_product(5)
+        inventory.reserve(_create_order(self.user, product, 2), {product.id: 2})
+        order = _create_order(self.user, product, 3)
+        inventory.reserve(order, {product.id: 3})
+        order.mark_as_paid('ref', 'auth')
+        product.refresh_from_db()
+        self.assertEqual((product.stock_quantity, product.reserved_quantity), (2, 2))
+
+    def test_failed_payment_keeps_order_pending(self):
+        product = _create_product(1)
+        order = _create_order(self.user, product, 2)
+        with self.assertRaises(InsufficientStockError):
+            order.mark_as_paid('ref', 'auth')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'pending')
+
+
+class ConcurrentPaymentTests(TransactionTestCase):
+    """پرداخت‌های همزمان برای یک محصول نباید موجودی را بیش از مقدار واقعی بفروشند"""
+
+    stock = 5
+    buyers = 12
+
+    def test_parallel_payments_do_not_oversell(self):
+        user = get_user_model().objects.create_user(email='buyer@example.com', username='buyer', password='x')
+        product = _create_product(self.stock)
+        order_ids = [_create_order(user, product, 1).id for _ in range(self.buyers)]
+        barrier = threading.Barrier(self.buyers)
+        results = []
+
+        def pay(order_id):
+            try:
+                order = Order.objects.get(id=order_id)
+                barrier.wait()
+                for _ in range(200):
+                    try:
+                        order.mark_as_paid(f'ref-{order_id}', f'auth-{order_id}')
+                        results.append('paid')
+                        return
+                    except InsufficientStockError:
+                        results.append('short')
+                        return
+                    except OperationalError:
+                        # قفل پایگاه داده SQLite؛ تلاش دوباره
+                        time.sleep(0.005)
+                results.append('locked')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=pay, args=(order_id,)) for order_id in order_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        paid = Order.objects.filter(status='paid').count()
+        self.assertEqual(len(results), self.buyers)
+        self.assertLessEqual(paid, self.stock)
+        self.assertEqual(product.stock_quantity, self.stock - paid)
+        if 'locked' not in results:
+            self.assertEqual(paid, self.stock)
+            self.assertEqual(results.count('short'), self.buyers - self.stock)
+
+
+# اجرای cart.js در node با DOM حداقلی و فراخوانی رویداد DOMContentLoaded
+CART_JS_SMOKE = """
+const listeners = {};
+global.window = global;
+global.document = {
+  addEventListener: (name, handler) => { listeners[name] = handler; },
+  getElementById: () => null,
+};
+const store = {cart: JSON.stringify([{id: 1, name: 'x', price: 1000, quantity: 2}])};
+global.localStorage = {
+  getItem: key => (key in store ? store[key] : null),
+  setItem: (key, value) => { store[key] = String(value); },
+  removeItem: key => { delete store[key]; },
+};
+global.fetch = () => Promise.resolve({json: () => Promise.resolve({ok: true, cart: {items: []}})});
+global.FormData = class { append() {} };
+console.log = () => {};
+require(process.argv[1]);
+listeners.DOMContentLoaded();
+process.stdout.write(JSON.stringify(
+  ['removeFromCart', 'updateQuantity', 'checkout', 'clearCart'].map(name => typeof window[name])
+));
+"""
+
+
+class CartPageTests(TestCase):
+    """صفحه سبد خرید و اسکریپت آن"""
+
+    def test_cart_page_loads(self):
+        response = self.client.get('/shop/cart/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'js/cart.js')
+
+    @skipUnless(shutil.which('node'), 'node نصب نیست')
+    def test_cart_script_initializes(self):
+        script = settings.BASE_DIR / 'static' / 'js' / 'cart.js'
+        result = subprocess.run(
+            ['node', '-e', CART_JS_SMOKE, str(script)], capture_output=True, text=True, timeout=30,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout), ['function'] * 4)
+
+
+class BulkStockCheckTests(TestCase):
+    """اعتبارسنجی API بررسی گروهی موجودی"""
+
+    url = '/shop/api/check-stock/bulk/'
+
+    def _check(self, items):
+        return self.client.post(self.url, {'items': json.dumps(items)})
+
+    def test_reports_availability(self):
+        product = _create_product(3)
+        response = self._check([{'id': product.id, 'quantity': 2}, {'id': product.id + 1000, 'quantity': 1}])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['all_available'])
+        self.assertEqual([item['available'] for item in data['items']], [True, False])
+
+    def test_rejects_invalid_quantities(self):
+        product = _create_product(3)
+        for quantity in (0, -1, 1.5, '2', True, None, 10 ** 20):
+            with self.subTest(quantity=quantity):
+                self.assertEqual(self._check([{'id': product.id, 'quantity': quantity}]).status_code, 400)
+
+    def test_rejects_out_of_range_ids(self):
+        for product_id in (0, -5, 10 ** 20, 'x'):
+            with self.subTest(product_id=product_id):
+                self.assertEqual(self._check([{'id': product_id, 'quantity': 1}]).status_code, 400)
+
+    def test_rejects_malformed_payload(self):
+        self.assertEqual(self.client.post(self.url, {'items': '{"a": 1}'}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'items': '[]'}).status_code, 400)
+
+
+class CartTests(TestCase):
+    """سبد خرید سمت سرور: همگام‌سازی تغییرات، سقف موجودی و ادغام هنگام ورود"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+
+    def _sync(self, changes):
+        return self.client.post('/shop/api/cart/sync/', {'changes': json.dumps(changes)})
+
+    def _quantities(self, response):
+        return {item['id']: item['quantity'] for item in response.json()['cart']['items']}
+
+    def test_add_to_cart_clamps_to_stock(self):
+        response = self.client.post('/shop/api/add-to-cart/', {'product_id': self.product.id, 'quantity': 50})
+        self.assertEqual(response.json()['item_quantity'], 5)
+
+    def test_add_to_cart_rejects_bad_input(self):
+        for data in ({'product_id': 10 ** 20}, {'product_id': 'x'}, {'product_id': self.product.id, 'quantity': 'a'},
+                     {'product_id': self.product.id, 'quantity': 0}):
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post('/shop/api/add-to-cart/', data).status_code, 400)
+
+    def test_sync_applies_deltas_without_wiping_other_items(self):
+        other = _create_product(5, name='دیگر', slug='other')
+        self.client.post('/shop/api/add-to-cart/', {'product_id': other.id, 'quantity': 2})
+        self.assertEqual(self._quantities(self._sync([{'id': self.product.id, 'quantity': 3}])),
+                         {other.id: 2, self.product.id: 3})
+        self.assertEqual(self._quantities(self._sync([{'id': self.product.id, 'quantity': -5}])), {other.id: 2})
+
+    def test_sync_rejects_overflowing_values(self):
+        self.assertEqual(self._sync([{'id': 10 ** 20, 'quantity': 1}]).status_code, 400)
+        self.assertEqual(self._sync([{'id': self.product.id, 'quantity': 1e400}]).status_code, 400)
+        response = self._sync([{'id': self.product.id, 'quantity': 10 ** 20}])
+        self.assertEqual(self._quantities(response), {self.product.id: 5})
+
+    def test_login_merge_clamps_shared_items(self):
+        user = get_user_model().objects.create_user(email='cart@example.com', username='cart', password='x')
+        user_cart = Cart.objects.create(user=user)
+        user_cart.items.create(product=self.product, quantity=4, price=self.product.price)
+        self.client.post('/shop/api/add-to-cart/', {'product_id': self.product.id, 'quantity': 3})
+        self.client.force_login(user)
+        self.assertEqual(user_cart.items.get().quantity, 5)
+        self.assertFalse(Cart.objects.filter(user__isnull=True, is_active=True).exists())
+
+
+class CatalogListingTests(TestCase):
+    """فیلتر قیمت و خواندن نسخه کاتالوگ در لیست محصولات"""
+
+    def setUp(self):
+        cache.clear()
+        self.product = _create_product(5)
+
+    def test_parse_price_ignores_non_finite_values(self):
+        for value in ('inf', '-inf', 'nan', '1e400', 'abc'):
+            with self.subTest(value=value):
+                self.assertIsNone(catalog.build_spec({'min_price': value})['min_price'])
+        self.assertEqual(catalog.build_spec({'max_price': '1,500'})['max_price'], 1500)
+
+    def test_bad_price_filter_is_ignored(self):
+        for params in ({'min_price': 'inf'}, {'max_price': '1e400'}, {'min_price': 'nan'}):
+            with self.subTest(params=params):
+                response = self.client.get('/shop/products/', params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['facets']['total'], 1)
+
+    def test_featured_sidebar_uses_product_cards(self):
+        featured = _create_product(5, name='ویژه', slug='featured', is_featured=True)
+        _create_product(0, name='ناموجود', slug='sold-out', is_featured=True)
+        sidebar = list(self.client.get('/shop/products/').context['featured_products'])
+        self.assertEqual([card.pk for card in sidebar], [featured.pk])
+        self.assertIsInstance(sidebar[0], ProductCard)
+
+    def test_listing_reads_versions_once(self):
+        user = get_user_model().objects.create_user(email='list@example.com', username='list', password='x')
+        self.client.force_login(user)
+        self.client.get('/shop/products/')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/shop/products/', {'search': 'محصول'}).status_code, 200)
+        version_reads = [q for q in queries.captured_queries if 'shop_resourceversion' in q['sql']]
+        self.assertEqual(len(version_reads), 1)
+
+
+def _cursor(value, pk):
+    raw = json.dumps([value, pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+class CursorPaginationTests(TestCase):
+    """صفحه‌بندی cursor در API محصولات"""
+
+    def setUp(self):
+        for index in range(3):
+            _create_product(5, name=f'محصول {index}', slug=f'product-{index}', price=1000 * (index + 1))
+
+    def _page(self, **params):
+        return self.client.get('/shop/api/products/', params)
+
+    def test_walks_pages_in_order(self):
+        first = self._page(cursor=1, sort='price').json()
+        self.assertEqual(len(first['products']), 3)
+        self.assertFalse(first['has_next'])
+        last = first['products'][0]
+        second = self._page(after=catalog.encode_cursor(Decimal(last['price']), last['id']), sort='price').json()
+        self.assertEqual([p['id'] for p in second['products']], [p['id'] for p in first['products'][1:]])
+
+    def test_rejects_invalid_cursors(self):
+        cases = [
+            ('price', _cursor('NaN', 1)), ('price', _cursor('Infinity', 1)), ('price', _cursor('100', 0)),
+            ('price', _cursor('100', 2 ** 63)), ('price', _cursor('100', 'x')), ('price', _cursor('100', True)),
+            ('-view_count', _cursor(10 ** 30, 1)), ('-view_count', _cursor(1e400, 1)),
+            ('-created_at', _cursor('not-a-date', 1)), ('price', 'not base64!'),
+        ]
+        for sort, token in cases:
+            with self.subTest(sort=sort, token=token):
+                self.assertEqual(self._page(after=token, sort=sort).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 فقط در SQLite')
+class SearchIndexTests(TestCase):
+    """ایندکس جستجوی تمام‌متن"""
+
+    def setUp(self):
+        self.first = _create_product(5, name='گوشی سامسونگ', slug='phone')
+        self.second = _create_product(5, name='کتاب داستان', slug='book')
+
+    def _matches(self, query):
+        return set(Product.objects.filter(id__in=search.match_subquery(query)).values_list('id', flat=True))
+
+    def test_full_rebuild_indexes_every_product(self):
+        self.assertEqual(search.index_products(), 2)
+        self.assertEqual(self._matches('سامسونگ'), {self.first.id})
+        self.assertEqual(self._matches('كتاب'), {self.second.id})
+
+    def test_failed_rebuild_keeps_previous_index(self):
+        search.index_products()
+        # شناسه تکراری باعث شکست INSERT پس از DELETE می‌شود
+        with mock.patch.object(search, '_document', side_effect=lambda product: (self.first.id, 'x', '', '', '')):
+            with self.assertRaises(DatabaseError):
+                search.index_products()
+        self.assertEqual(self._matches('سامسونگ'), {self.first.id})
+        self.assertEqual(self._matches('کتاب'), {self.second.id})
+
+
+class SuggestIndexTests(TestCase):
+    """ایندکس پیشنهاد جستجو"""
+
+    def setUp(self):
+        self.product = _create_product(5, name='گوشی سامسونگ', slug='phone')
+        suggest.build_index()
+
+    def tearDown(self):
+        suggest._state.update(keys=[], items={}, top={}, built_at=None, version=None, checked_at=0)
+
+    def test_ranks_by_weight_over_the_whole_prefix_range(self):
+        category = Category.objects.get(slug='test')
+        Product.objects.bulk_create(
+            Product(name=f'گوشی مدل {index:04}', slug=f'model-{index}', category=category, description='-',
+                    price=1000, stock_quantity=1)
+            for index in range(600)
+        )
+        # از نظر الفبایی پس از همه مدل‌ها قرار می‌گیرد
+        Product.objects.filter(pk=self.product.pk).update(name='گوشی هوشمند', view_count=100)
+        suggest.build_index()
+        results = suggest.suggest('گوشی', limit=3)
+        self.assertEqual(results[0]['id'], self.product.id)
+        self.assertEqual(len(results), 3)
+
+    def test_local_changes_do_not_mark_index_stale(self):
+        _create_product(5, name='گوشی اپل', slug='apple')
+        self.assertIn('گوشی اپل', [item['name'] for item in suggest.suggest('گوشی')])
+        suggest._state['checked_at'] = 0
+        self.assertFalse(suggest._is_stale(suggest._state['built_at']))
+
+    def test_changes_from_other_processes_mark_index_stale(self):
+        bump_version(suggest.SUGGEST_VERSION_KEY)
+        self.assertFalse(suggest._is_stale(suggest._state['built_at']))
+        suggest._state['checked_at'] = 0
+        self.assertTrue(suggest._is_stale(suggest._state['built_at']))
+        suggest.build_index()
+        self.assertFalse(suggest._is_stale(suggest._state['built_at']))
+
+
+class PageCacheTests(TestCase):
+    """کش صفحات مهمان و پاک‌سازی بر اساس برچسب"""
+
+    def setUp(self):
+        cache.clear()
+        self.product = _create_product(5)
+
+    def _get(self, path='/shop/products/'):
+        return self.client.get(path)
+
+    def test_second_anonymous_request_is_a_hit(self):
+        self.assertEqual(self._get()['X-Page-Cache'], 'MISS')
+        self.assertEqual(self._get()['X-Page-Cache'], 'HIT')
+        self.assertEqual(self._get('/shop/products/?sort=price-low')['X-Page-Cache'], 'MISS')
+
+    def test_purge_invalidates_only_tagged_pages(self):
+        self._get()
+        self._get('/')
+        purges = page_cache.get_stats()['purges']
+        page_cache.purge('home')
+        self.assertEqual(self._get()['X-Page-Cache'], 'HIT')
+        self.assertEqual(self._get('/')['X-Page-Cache'], 'MISS')
+        self.assertEqual(page_cache.get_stats()['purges'], purges + 1)
+
+    def test_purge_is_shared_through_the_database(self):
+        self._get()
+        # پروسه دیگر: نسخه برچسب فقط در پایگاه داده تغییر می‌کند
+        ResourceVersion.objects.filter(key='page:tag:products').update(version=F('version') + 1)
+        self.assertEqual(self._get()['X-Page-Cache'], 'MISS')
+
+    def test_product_save_purges_listing(self):
+        self._get()
+        self.product.price = 2000
+        self.product.save()
+        self.assertEqual(self._get()['X-Page-Cache'], 'MISS')
+
+    def test_authenticated_requests_bypass_cache(self):
+        user = get_user_model().objects.create_user(email='page@example.com', username='page', password='x')
+        self.client.force_login(user)
+        self.assertNotIn('X-Page-Cache', self._get())
+        self.assertNotIn('X-Page-Cache', self._get())
+
+
+class ViewCounterTests(TestCase):
+    """بافر بازدید محصولات در کش و اعمال گروهی"""
+
+    def setUp(self):
+        self.views = caches[view_counter.VIEW_CACHE_ALIAS]
+        self.views.clear()
+        self.product = _create_product(5)
+        self.other = _create_product(5, name='دیگر', slug='other')
+
+    def _view_count(self, product):
+        product.refresh_from_db()
+        return product.view_count
+
+    def test_record_view_does_not_touch_the_database(self):
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                view_counter.record_view(self.product.id)
+        self.assertEqual(view_counter.pending_views(), {self.product.id: 3})
+        self.assertEqual(self._view_count(self.product), 0)
+
+    def test_flush_applies_buffered_views(self):
+        for product_id in (self.product.id, self.product.id, self.other.id):
+            view_counter.record_view(product_id)
+        self.assertEqual(view_counter.flush_views(), 3)
+        self.assertEqual(self._view_count(self.product), 2)
+        self.assertEqual(self.product.card.view_count, 2)
+        self.assertEqual(self._view_count(self.other), 1)
+        self.assertEqual(view_counter.pending_views(), {})
+        # بازدید بعدی همان محصول دوباره در صف ثبت می‌شود
+        view_counter.record_view(self.product.id)
+        self.assertEqual(view_counter.flush_views(), 1)
+        self.assertEqual(self._view_count(self.product), 3)
+
+    def test_evicted_counter_is_counted(self):
+        view_counter.record_view(self.product.id)
+        view_counter.record_view(self.other.id)
+        self.views.delete(view_counter._pending_key(self.product.id))
+        self.assertEqual(view_counter.flush_views(), 1)
+        self.assertEqual(view_counter.get_stats()['evicted'], 1)
+
+    def test_evicted_queue_slot_is_counted_once_it_stays_missing(self):
+        view_counter.record_view(self.product.id)
+        view_counter.record_view(self.other.id)
+        self.views.delete(view_counter._dirty_key(1))
+        # خانه خالی ممکن است هنوز در حال نوشتن باشد؛ flush روی آن منتظر می‌ماند
+        self.assertEqual(view_counter.flush_views(), 0)
+        self.assertEqual(view_counter.flush_views(), 1)
+        self.assertEqual(self._view_count(self.other), 1)
+        self.assertEqual(view_counter.get_stats()['evicted'], 1)
+
+    def test_failed_flush_keeps_views_pending(self):
+        view_counter.record_view(self.product.id)
+        with mock.patch.object(view_counter, 'apply_view_deltas', side_effect=DatabaseError), \
+                self.assertLogs('shop.view_counter', 'ERROR'):
+            self.assertEqual(view_counter.flush_views(), 0)
+        self.assertEqual(view_counter.flush_views(), 1)
+        self.assertEqual(self._view_count(self.product), 1)
+
+
+class WishlistToggleTests(TestCase):
+    """افزودن و حذف علاقه‌مندی بر اساس وضعیت پایگاه داده"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='wish@example.com', username='wish', password='x')
+        self.client.force_login(self.user)
+        self.product = _create_product(5)
+
+    def _toggle(self, product_id=None):
+        return self.client.post('/shop/api/toggle-wishlist/', {'product_id': product_id or self.product.id})
+
+    def _in_wishlist(self):
+        return Wishlist.objects.filter(user=self.user, products=self.product).exists()
+
+    def test_toggle_adds_then_removes(self):
+        self.assertTrue(self._toggle().json()['added'])
+        self.assertTrue(self._in_wishlist())
+        self.assertEqual(wishlists.get_ids(self.user.id), {self.product.id})
+        self.assertFalse(self._toggle().json()['added'])
+        self.assertFalse(self._in_wishlist())
+        self.assertEqual(wishlists.get_ids(self.user.id), set())
+        self.assertTrue(DirtyProduct.objects.filter(queue='related', product=self.product).exists())
+
+    def test_stale_cache_does_not_invert_the_toggle(self):
+        # کش پروسه دیگر محصول را در علاقه‌مندی‌ها می‌داند ولی پایگاه داده نه
+        wishlists.get_ids(self.user.id)
+        wishlists.add_ids(self.user.id, [self.product.id])
+        self.assertTrue(self._toggle().json()['added'])
+        self.assertTrue(self._in_wishlist())
+        self.assertEqual(wishlists.get_ids(self.user.id), {self.product.id})
+
+    def test_unknown_product_returns_404(self):
+        self.assertEqual(self._toggle(10 ** 6).status_code, 404)
+
+
+class SimulatedPaymentTests(TestCase):
+    """پرداخت شبیه‌سازی شده سفارش"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='pay@example.com', username='pay', password='x')
+        self.client.force_login(self.user)
+        self.product = _create_product(5)
+
+    def _pay(self, order):
+        return self.client.get(f'/shop/order/{order.id}/pay/')
+
+    def test_payment_releases_holds_and_decrements_stock(self):
+        order = _create_order(self.user, self.product, 3)
+        inventory.reserve(order, {self.product.id: 3})
+        self._pay(order)
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, 'paid')
+        self.assertEqual((self.product.stock_quantity, self.product.reserved_quantity), (2, 0))
+        # پرداخت دوباره موجودی را دوباره کم نمی‌کند
+        self._pay(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 2)
+
+    def test_payment_without_stock_fails_the_order(self):
+        order = _create_order(self.user, self.product, 3)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=1)
+        self._pay(order)
+        order.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(order.status, 'payment_failed')
+        self.assertEqual(self.product.stock_quantity, 1)
+
+    def test_cannot_pay_another_users_order(self):
+        other = get_user_model().objects.create_user(email='other@example.com', username='other', password='x',
+                                                   phone='09120000002')
+        order = _create_order(other, self.product, 1)
+        self.assertEqual(self._pay(order).status_code, 404)
+
+
+class FuzzySearchTests(TestCase):
+    """جستجوی تقریبی با ایندکس سه‌حرفی"""
+
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = _create_product(5, name='گوشی سامسونگ', slug='phone')
+            _create_product(5, name='کتاب داستان', slug='book')
+
+    def test_matches_typos_and_missing_spaces(self):
+        self.assertEqual(fuzzy.fuzzy_product_ids('سامسنگ')[:1], [self.product.id])
+        self.assertEqual(fuzzy.fuzzy_product_ids('گوشیسامسونگ')[:1], [self.product.id])
+
+    def test_matches_text_typed_on_an_english_keyboard(self):
+        self.assertEqual(fuzzy.fuzzy_product_ids("shls,k'")[:1], [self.product.id])
+
+    def test_ignores_unrelated_queries_and_inactive_products(self):
+        self.assertEqual(fuzzy.fuzzy_product_ids('یخچال'), [])
+        self.assertEqual(fuzzy.fuzzy_product_ids('  '), [])
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        self.assertNotIn(self.product.id, fuzzy.fuzzy_product_ids('سامسنگ'))
+
+    def test_search_page_falls_back_to_fuzzy_results(self):
+        response = self.client.get('/shop/search/', {'q': 'سامسنگ'})
+        self.assertTrue(response.context['fuzzy_search'])
+        self.assertEqual([card.pk for card in response.context['products']], [self.product.id])
+        response = self.client.get('/shop/search/', {'q': 'سامسونگ'})
+        self.assertFalse(response.context['fuzzy_search'])
+
+    def test_rename_reindexes_trigrams(self):
+        self.product.name = 'یخچال فریزر'
+        self.product.save()
+        self.assertEqual(fuzzy.fuzzy_product_ids('یخچل')[:1], [self.product.id])
+        self.assertNotIn(self.product.id, fuzzy.fuzzy_product_ids('سامسنگ'))
+
+
+class ConditionalGetTests(TestCase):
+    """GET شرطی API‌ها با ETag و Last-Modified"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+
+    def test_unchanged_resource_returns_304(self):
+        response = self.client.get('/shop/api/categories/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        revalidated = self.client.get('/shop/api/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+
+    def test_catalog_change_invalidates_etag(self):
+        etag = self.client.get('/shop/api/brands/')['ETag']
+        self.product.name = 'نام جدید'
+        self.product.save()
+        response = self.client.get('/shop/api/brands/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_stale_or_malformed_etag_returns_full_response(self):
+        for etag in ('"catalog:version-0"', 'garbage'):
+            with self.subTest(etag=etag):
+                self.assertEqual(self.client.get('/shop/api/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_shipping_settings_change_invalidates_etag(self):
+        etag = self.client.get('/shop/api/shipping-settings/')['ETag']
+        self.assertEqual(self.client.get('/shop/api/shipping-settings/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ShippingSettings.objects.create(shipping_cost=50000)
+        response = self.client.get('/shop/api/shipping-settings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['shipping_cost'], 50000)
+
+    def test_revalidation_reads_the_version_once(self):
+        etag = self.client.get('/shop/api/categories/')['ETag']
+        with self.assertNumQueries(1):
+            self.client.get('/shop/api/categories/', HTTP_IF_NONE_MATCH=etag)
+
+
+class ProductFieldsApiTests(TestCase):
+    """فیلدهای انتخابی API محصولات"""
+
+    def setUp(self):
+        cache.clear()
+        self.product = _create_product(5, short_description='خلاصه', description='توضیحات کامل')
+
+    def _products(self, **params):
+        response = self.client.get('/shop/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['products']
+
+    def test_default_card_profile_reads_one_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            item = self._products()[0]
+        self.assertEqual(set(item), set(views.CARD_API_FIELDS))
+        self.assertEqual(item['short_description'], 'خلاصه')
+        self.assertIsNone(item['brand_name'])
+        product_queries = [q['sql'] for q in queries.captured_queries if 'shop_product' in q['sql']]
+        self.assertTrue(all('shop_productcard' in sql and 'JOIN' not in sql for sql in product_queries))
+
+    def test_detail_profile_includes_description_and_images(self):
+        item = self._products(fields='detail')[0]
+        self.assertEqual(item['description'], 'توضیحات کامل')
+        self.assertEqual(item['images'], [])
+        self.assertEqual(item['category_slug'], 'test')
+
+    def test_field_list_returns_only_requested_fields(self):
+        self.assertEqual(self._products(fields='name,price')[0], {'id': self.product.id, 'name': 'محصول تست', 'price': 1000.0})
+        with CaptureQueriesContext(connection) as queries:
+            self._products(fields='name,description')
+        sql = next(q['sql'] for q in queries.captured_queries
+                   if 'FROM "shop_product"' in q['sql'] and 'COUNT' not in q['sql'])
+        self.assertIn('"shop_product"."description"', sql)
+        self.assertNotIn('"shop_product"."meta_keywords"', sql)
+
+    def test_unknown_fields_fall_back_to_card_profile(self):
+        self.assertEqual(set(self._products(fields='password,__class__')[0]), set(views.CARD_API_FIELDS))
+        self.assertEqual(set(self._products(fields='')[0]), set(views.CARD_API_FIELDS))
+
+
+class ProductCountTests(TestCase):
+    """شمارش کش‌شده محصولات دسته‌بندی‌ها و برندها"""
+
+    def setUp(self):
+        cache.clear()
+        self.brand = Brand.objects.create(name='سامسونگ', slug='samsung')
+        _create_product(5, brand=self.brand)
+        _create_product(0, name='ناموجود', slug='sold-out')
+        _create_product(5, name='غیرفعال', slug='inactive', is_active=False, brand=self.brand)
+
+    def test_counts_active_products_per_category_and_brand(self):
+        category = Category.objects.get(slug='test')
+        self.assertEqual(counts.category_products_count(category.id), 2)
+        self.assertEqual(counts.brand_products_count(self.brand.id), 1)
+        self.assertEqual(counts.brand_products_count(10 ** 6), 0)
+
+    def test_counts_are_cached_until_the_catalog_changes(self):
+        category = Category.objects.get(slug='test')
+        counts.get_product_counts()
+        with self.assertNumQueries(1):
+            # فقط خواندن نسخه کاتالوگ
+            self.assertEqual(counts.category_products_count(category.id), 2)
+        _create_product(5, name='جدید', slug='new', brand=self.brand)
+        self.assertEqual(counts.category_products_count(category.id), 3)
+        self.assertEqual(counts.brand_products_count(self.brand.id), 2)
+
+    def test_apis_report_counts(self):
+        categories = self.client.get('/shop/api/categories/').json()['categories']
+        self.assertEqual([(c['slug'], c['products_count']) for c in categories], [('test', 2)])
+        brands = self.client.get('/shop/api/brands/').json()['brands']
+        self.assertEqual([(b['slug'], b['products_count']) for b in brands], [('samsung', 1)])
+
+
+class ProductFeedTests(TestCase):
+    """خروجی جریانی کاتالوگ برای سایت‌های مقایسه قیمت"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+        _create_product(5, name='غیرفعال', slug='inactive', is_active=False)
+
+    def _feed(self, **params):
+        headers = {}
+        if params.pop('gzip', False):
+            headers['HTTP_ACCEPT_ENCODING'] = 'gzip'
+        response = self.client.get('/shop/feed/products/', params, **headers)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        if response.get('Content-Encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return response, content.decode('utf-8')
+
+    def _rows(self, **params):
+        return [json.loads(line) for line in self._feed(**params)[1].splitlines()]
+
+    def test_full_feed_lists_active_products(self):
+        response, _ = self._feed()
+        self.assertTrue(response.has_header('X-Feed-Generated-At'))
+        rows = self._rows()
+        self.assertEqual([row['id'] for row in rows], [self.product.id])
+        self.assertEqual(rows[0]['price'], 1000)
+        self.assertEqual(rows[0]['availability'], 'in_stock')
+        self.assertTrue(rows[0]['url'].endswith('/shop/product/test-product/'))
+
+    def test_csv_and_gzip_output(self):
+        _, content = self._feed(format='csv', gzip=True)
+        lines = content.splitlines()
+        self.assertTrue(lines[0].startswith('\ufeffid,name,url'))
+        self.assertEqual(len(lines), 2)
+
+    def test_delta_feed_includes_changes_and_tombstones(self):
+        since = timezone.now()
+        other = _create_product(5, name='تغییر کرده', slug='changed')
+        Product.objects.filter(pk=self.product.pk).update(is_active=False, updated_at=timezone.now())
+        deleted_id = _create_product(5, name='حذف شده', slug='deleted').id
+        Product.objects.filter(pk=deleted_id).delete()
+        rows = {row['id']: row for row in self._rows(since=since.isoformat())}
+        self.assertFalse(rows[other.id]['deleted'])
+        self.assertTrue(rows[self.product.id]['deleted'])
+        self.assertTrue(rows[deleted_id]['deleted'])
+
+    def test_rejects_bad_parameters(self):
+        for params in ({'format': 'xml'}, {'since': 'yesterday'}, {'since': '2024-13-45T00:00:00'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/shop/feed/products/', params).status_code, 400)
+
+
+class PriceFacetTests(TestCase):
+    """بازه و هیستوگرام قیمت فیلتر قیمت"""
+
+    def setUp(self):
+        cache.clear()
+        self.cheap = _create_product(5, name='ارزان', slug='cheap', price=20000)
+        _create_product(5, name='متوسط', slug='mid', price=150000)
+        _create_product(5, name='گران', slug='expensive', price=160000)
+        _create_product(0, name='ناموجود', slug='sold-out', price=5000000)
+
+    def test_range_and_histogram_of_available_products(self):
+        facet = catalog.get_price_facet(catalog.build_spec())
+        self.assertEqual((facet['min'], facet['max']), (20000, 160000))
+        self.assertEqual(
+            [(bucket['min'], bucket['count'], bucket['percent']) for bucket in facet['histogram']],
+            [(0, 1, 50), (50000, 0, 0), (100000, 2, 100)],
+        )
+
+    def test_current_price_filter_is_ignored(self):
+        spec = catalog.build_spec({'min_price': '100000', 'sort': 'price-low'})
+        self.assertEqual(catalog.get_price_facet(spec)['min'], 20000)
+        self.assertEqual(catalog.get_price_facet(spec), catalog.get_price_facet(catalog.build_spec()))
+
+    def test_price_change_refreshes_cached_facet(self):
+        spec = catalog.build_spec()
+        catalog.get_price_facet(spec)
+        self.cheap.price = 10
+        self.cheap.save()
+        self.assertEqual(catalog.get_price_facet(spec)['min'], 10)
+
+    def test_empty_selection(self):
+        facet = catalog.get_price_facet(catalog.build_spec({'category': 'missing'}))
+        self.assertEqual(facet, {'min': None, 'max': None, 'histogram': []})
+
+    def test_product_list_renders_price_facet(self):
+        response = self.client.get('/shop/products/', {'max_price': '50000'})
+        self.assertEqual(response.context['price_facet']['max'], 160000)
+        self.assertEqual(response.context['facets']['total'], 1)
+
+
+class TrendingTests(TestCase):
+    """امتیاز ترند با زوال زمانی از بازدید و فروش"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='trend@example.com', username='trend', password='x')
+        self.old = _create_product(50, name='قدیمی', slug='old')
+        self.new = _create_product(50, name='جدید', slug='new')
+
+    def _score(self, product):
+        return ProductCard.objects.get(pk=product.pk).trending_score
+
+    def test_events_decay_with_half_life(self):
+        now = timezone.now()
+        earlier = now - timedelta(days=trending.HALF_LIFE_DAYS)
+        self.assertAlmostEqual(trending.decay_factor(now) / trending.decay_factor(earlier), 2)
+        self.assertAlmostEqual(trending.current_score(trending.decay_factor(now), now), 1)
+
+    def test_recent_sales_outrank_older_ones(self):
+        now = timezone.now()
+        trending.add_sales({self.old.id: 3}, now - timedelta(days=trending.HALF_LIFE_DAYS * 2))
+        trending.add_sales({self.new.id: 1}, now)
+        self.assertGreater(self._score(self.new), self._score(self.old))
+        response = self.client.get('/shop/products/trending/')
+        self.assertEqual([card.pk for card in response.context['products']][:2], [self.new.id, self.old.id])
+
+    def test_paid_order_is_counted_once(self):
+        order = _create_order(self.user, self.new, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.mark_as_paid('ref', 'auth')
+        score = self._score(self.new)
+        self.assertAlmostEqual(score, 2 * trending.SALE_WEIGHT * trending.decay_factor(order.payment_date), places=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=order.pk).save()
+        self.assertEqual(self._score(self.new), score)
+
+    def test_flushed_views_feed_the_score(self):
+        caches[view_counter.VIEW_CACHE_ALIAS].clear()
+        view_counter.record_view(self.old.id)
+        view_counter.flush_views()
+        self.assertGreater(self._score(self.old), 0)
+        self.assertEqual(self._score(self.new), 0)
+
+    def test_recompute_rebuilds_scores_from_history(self):
+        order = _create_order(self.user, self.new, 1)
+        order.mark_as_paid('ref', 'auth')
+        ProductCard.objects.update(trending_score=0)
+        self.assertEqual(trending.recompute_scores(), 2)
+        self.assertGreater(self._score(self.new), self._score(self.old))
+
+
+class RelatedProductsTests(TestCase):
+    """محصولات مرتبط از خرید و علاقه‌مندی مشترک"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='rel@example.com', username='rel', password='x')
+        self.a, self.b, self.c, self.d = (
+            _create_product(50, name=f'محصول {slug}', slug=slug) for slug in ('a', 'b', 'c', 'd')
+        )
+
+    def _buy(self, *products):
+        order = Order.objects.create(user=self.user, status='paid', subtotal_amount=0, total_amount=0)
+        for product in products:
+            order.items.create(product=product, quantity=1, unit_price=1000, total_price=1000)
+
+    def _related(self, product):
+        return [card.pk for card in related.related_cards(product)]
+
+    def test_co_purchases_rank_first_and_category_fills_the_rest(self):
+        self._buy(self.a, self.b)
+        self._buy(self.a, self.b)
+        self._buy(self.a, self.c)
+        related.rebuild(full=True)
+        self.assertEqual(self._related(self.a), [self.b.id, self.c.id, self.d.id])
+        sources = dict(RelatedProduct.objects.filter(product=self.a).values_list('related_id', 'source'))
+        self.assertEqual(sources, {self.b.id: 'order', self.c.id: 'order', self.d.id: 'category'})
+
+    def test_unbuilt_product_falls_back_to_its_category(self):
+        self.assertEqual(set(self._related(self.a)), {self.b.id, self.c.id, self.d.id})
+
+    def test_inactive_products_are_never_suggested(self):
+        self._buy(self.a, self.b)
+        related.rebuild(full=True)
+        Product.objects.filter(pk=self.b.pk).update(is_active=False)
+        ProductCard.objects.filter(pk=self.b.pk).update(is_active=False)
+        self.assertNotIn(self.b.id, self._related(self.a))
+
+    def test_wishlist_change_is_rebuilt_incrementally(self):
+        related.rebuild(full=True)
+        wishlist = Wishlist.objects.create(user=self.user)
+        wishlist.products.add(self.c, self.d)
+        self.assertTrue(DirtyProduct.objects.filter(queue='related', product=self.c).exists())
+        products, _ = related.rebuild()
+        self.assertEqual(products, 2)
+        self.assertEqual(self._related(self.c)[0], self.d.id)
+        self.assertFalse(DirtyProduct.objects.filter(queue='related').exists())
+
+
+def _create_comment(product, rating, is_approved=True, **extra):
+    return Comment.objects.create(
+        product=product, name=extra.pop('name', 'کاربر'), email='c@example.com', rating=rating,
+        comment=extra.pop('comment', '-'), is_approved=is_approved, **extra,
+    )
+
+
+class ProductCommentsApiTests(TestCase):
+    """API صفحه‌بندی نظرات: مرتب‌سازی، فیلتر امتیاز و cursor"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+        self.url = f'/shop/api/products/{self.product.id}/comments/'
+        base = timezone.now()
+        self.comments = []
+        for index in range(12):
+            comment = _create_comment(self.product, index % 5 + 1, helpful_count=index % 3)
+            Comment.objects.filter(pk=comment.pk).update(created_at=base - timedelta(minutes=index))
+            self.comments.append(comment)
+        self.pending = _create_comment(self.product, 5, is_approved=False)
+
+    def _ids(self, response):
+        return [item['id'] for item in response.json()['comments']]
+
+    def test_pages_newest_first_with_cursor(self):
+        first = self.client.get(self.url).json()
+        self.assertTrue(first['has_next'])
+        self.assertEqual([item['id'] for item in first['comments']], [c.id for c in self.comments[:10]])
+        second = self.client.get(self.url, {'after': first['next_cursor']})
+        self.assertEqual(self._ids(second), [c.id for c in self.comments[10:]])
+        self.assertFalse(second.json()['has_next'])
+        self.assertNotIn(self.pending.id, self._ids(second))
+
+    def test_helpful_sort_and_rating_filter(self):
+        helpful = self._ids(self.client.get(self.url, {'sort': 'helpful'}))
+        counts = [Comment.objects.get(pk=pk).helpful_count for pk in helpful]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        rated = self.client.get(self.url, {'rating': 5}).json()
+        self.assertEqual({item['rating'] for item in rated['comments']}, {5})
+        self.assertEqual(len(rated['comments']), 2)
+
+    def test_unknown_sort_and_rating_fall_back(self):
+        response = self.client.get(self.url, {'sort': 'x', 'rating': '9'}).json()
+        self.assertEqual(response['sort'], 'newest')
+        self.assertEqual(len(response['comments']), 10)
+
+    def test_bad_cursor_and_unknown_product(self):
+        for cursor in ('x', 'e30', '!!!'):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(self.url, {'after': cursor}).status_code, 400)
+        self.assertEqual(self.client.get('/shop/api/products/999999/comments/').status_code, 404)
+
+
+class RatingAggregationTests(TestCase):
+    """نگهداری تدریجی امتیاز محصول با تغییر نظرات"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+
+    def _totals(self, product=None):
+        product = Product.objects.get(pk=(product or self.product).pk)
+        return product.rating, product.review_count, product.rating_sum
+
+    def test_approve_edit_and_delete_update_rating(self):
+        _create_comment(self.product, 4)
+        pending = _create_comment(self.product, 1, is_approved=False)
+        self.assertEqual(self._totals(), (Decimal('4.0'), 1, 4))
+
+        pending.is_approved = True
+        pending.save()
+        self.assertEqual(self._totals(), (Decimal('2.5'), 2, 5))
+        self.assertEqual(ProductCard.objects.get(pk=self.product.pk).rating, Decimal('2.5'))
+
+        pending.rating = 3
+        pending.save()
+        self.assertEqual(self._totals(), (Decimal('3.5'), 2, 7))
+
+        pending.delete()
+        self.assertEqual(self._totals(), (Decimal('4.0'), 1, 4))
+
+    def test_moving_comment_updates_both_products(self):
+        other = _create_product(5, name='دیگر', slug='other')
+        comment = _create_comment(self.product, 5)
+        comment.product = other
+        comment.save()
+        self.assertEqual(self._totals(), (Decimal('0'), 0, 0))
+        self.assertEqual(self._totals(other), (Decimal('5.0'), 1, 5))
+
+    def test_reconcile_repairs_drifted_totals(self):
+        _create_comment(self.product, 2)
+        _create_comment(self.product, 3)
+        Product.objects.filter(pk=self.product.pk).update(rating=1, review_count=9, rating_sum=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ratings.reconcile([self.product.id]), 1)
+        self.assertEqual(self._totals(), (Decimal('2.5'), 2, 5))
+        self.assertEqual(ratings.reconcile([self.product.id]), 0)
+
+
+class CommentModerationTests(TestCase):
+    """تایید و رد گروهی نظرات با بازمحاسبه یک باره امتیاز هر محصول"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+        self.other = _create_product(5, name='دیگر', slug='other')
+        for rating in (5, 4, 3):
+            _create_comment(self.product, rating, is_approved=False)
+        _create_comment(self.other, 2, is_approved=False)
+        _create_comment(self.other, 4)
+
+    def test_bulk_approve_recomputes_each_product(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(ratings.moderate(Comment.objects.all(), approved=True), (4, 2))
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.rating, product.review_count), (Decimal('4.0'), 3))
+        self.assertEqual(Product.objects.get(pk=self.other.pk).rating, Decimal('3.0'))
+
+    def test_query_count_does_not_grow_with_comments(self):
+        with CaptureQueriesContext(connection) as small:
+            ratings.moderate(Comment.objects.filter(product=self.other), approved=True)
+        for rating in (1, 2, 3, 4, 5) * 4:
+            _create_comment(self.product, rating, is_approved=False)
+        with CaptureQueriesContext(connection) as large:
+            ratings.moderate(Comment.objects.filter(product=self.product), approved=True)
+        self.assertEqual(len(large), len(small))
+
+    def test_unchanged_comments_are_skipped(self):
+        self.assertEqual(ratings.moderate(Comment.objects.filter(is_approved=True), approved=True), (0, 0))
+        self.assertEqual(ratings.moderate(Comment.objects.filter(product=self.other), approved=False), (1, 1))
+        product = Product.objects.get(pk=self.other.pk)
+        self.assertEqual((product.rating, product.review_count), (Decimal('0'), 0))
+
+
+class RatingHistogramTests(TestCase):
+    """توزیع ستاره‌های نظرات هر محصول"""
+
+    def setUp(self):
+        self.product = _create_product(5)
+
+    def _histogram(self):
+        return {row['stars']: (row['count'], row['percent']) for row in Product.objects.get(pk=self.product.pk).rating_histogram}
+
+    def test_counts_follow_comment_changes(self):
+        for rating in (5, 5, 4, 1):
+            _create_comment(self.product, rating)
+        comment = _create_comment(self.product, 2, is_approved=False)
+        self.assertEqual(self._histogram(), {5: (2, 50), 4: (1, 25), 3: (0, 0), 2: (0, 0), 1: (1, 25)})
+        comment.is_approved = True
+        comment.save()
+        comment.rating = 3
+        comment.save()
+        self.assertEqual(self._histogram()[3], (1, 20))
+        self.assertEqual(self._histogram()[2], (0, 0))
+        response = self.client.get(f'/shop/api/products/{self.product.id}/comments/').json()
+        self.assertEqual([row['stars'] for row in response['histogram']], [5, 4, 3, 2, 1])
+        self.assertEqual(response['histogram'][0]['count'], 2)
+
+    def test_empty_product_and_reconcile(self):
+        self.assertEqual(set(self._histogram().values()), {(0, 0)})
+        _create_comment(self.product, 4)
+        Product.objects.filter(pk=self.product.pk).update(rating_4_count=0, rating_1_count=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            ratings.reconcile([self.product.id])
+        self.assertEqual(self._histogram()[4], (1, 100))
+        self.assertEqual(self._histogram()[1], (0, 0))
+
+
+class ProcessOrderTests(TestCase):
+    """ثبت سفارش از سبد سمت سرور با رزرو موجودی"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='order@example.com', username='order', password='x')
+        self.client.force_login(self.user)
+        self.product = _create_product(5, price=1250)
+        self.other = _create_product(5, name='دیگر', slug='other', price=2000)
+        self.address = {
+            'receiver_name': 'گیرنده', 'receiver_phone': '09120000000', 'province_name': 'تهران',
+            'city_name': 'تهران', 'address_detail': 'خیابان', 'postal_code': '1234567890',
+        }
+
+    def _add(self, product, quantity):
+        self.client.post('/shop/api/add-to-cart/', {'product_id': product.id, 'quantity': quantity})
+
+    def test_creates_order_and_reserves_stock(self):
+        self._add(self.product, 2)
+        self._add(self.other, 1)
+        response = self.client.post('/shop/process-order/', self.address).json()
+        self.assertTrue(response['success'])
+        order = Order.objects.get(pk=response['order_id'])
+        self.assertEqual(order.subtotal_amount, Decimal('4500'))
+        self.assertEqual(order.total_amount, order.subtotal_amount + order.shipping_amount)
+        self.assertEqual(dict(order.items.values_list('product_id', 'quantity')), {self.product.id: 2, self.other.id: 1})
+        self.assertEqual(Product.objects.get(pk=self.product.pk).reserved_quantity, 2)
+        self.assertFalse(Cart.objects.filter(user=self.user, items__isnull=False).exists())
+
+    def test_shortage_and_invalid_input_create_no_order(self):
+        self.assertFalse(self.client.post('/shop/process-order/', self.address).json()['success'])
+        self._add(self.product, 3)
+        incomplete = dict(self.address, postal_code='')
+        self.assertFalse(self.client.post('/shop/process-order/', incomplete).json()['success'])
+        Product.objects.filter(pk=self.product.pk).update(reserved_quantity=4)
+        response = self.client.post('/shop/process-order/', self.address).json()
+        self.assertFalse(response['success'])
+        self.assertIn(self.product.name, response['message'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.get(user=self.user).items.get().quantity, 3)
@@ -0,0 +1,91 @@
+"""امتیاز ترند محصولات با زوال نمایی
+
+هر رویداد (بازدید یا فروش) با وزن w در زمان t مقدار w * 2^((t - EPOCH) / HALF_LIFE)
+به امتیاز محصول اضافه می‌کند. چون ضریب زوال برای همه محصولات یکسان است،
+مقایسه امتیازها در واحد زمان مبدا همان مقایسه امتیازهای زوال‌یافته در لحظه
+فعلی است؛ بنابراین امتیاز به صورت تدریجی و فقط با افزودن به‌روز می‌شود و نیازی
+به کاهش دوره‌ای امتیاز همه محصولات نیست. با نیمه‌عمر ۷ روزه دامنه float تا حدود
+۱۹ سال پس از زمان مبدا کافی است؛ پس از آن باید مبدا جابه‌جا و امتیازها بازسازی شوند.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, ProductCard, OrderItem
+
+TRENDING_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE_DAYS = 7
+VIEW_WEIGHT = 1.0
+SALE_WEIGHT = 25.0
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+
+
+def decay_factor(moment=None):
+    """ضریب رویداد در زمان داده شده نسبت به زمان مبدا"""
+    moment = moment or timezone.now()
+    days = (moment - TRENDING_EPOCH).total_seconds() / 86400
+    return 2 ** (days / HALF_LIFE_DAYS)
+
+
+def current_score(score, moment=None):
+    """امتیاز زوال‌یافته در لحظه داده شده (برای نمایش)"""
+    return score / decay_factor(moment)
+
+
+def group_by_delta(deltas):
+    """گروه‌بندی محصولات بر اساس مقدار افزایش تا هر گروه با یک UPDATE اعمال شود"""
+    by_delta = {}
+    for product_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(product_id)
+    return by_delta
+
+
+def add_sales(quantities, moment=None):
+    """
+    افزودن فروش‌ها به امتیاز ترند؛ یک UPDATE به ازای هر مقدار تعداد
+
+    Args:
+        quantities: نگاشت شناسه محصول به تعداد فروخته شده
+    """
+    factor = decay_factor(moment)
+    for quantity, product_ids in group_by_delta(quantities).items():
+        ProductCard.objects.filter(product_id__in=product_ids).update(
+            trending_score=F('trending_score') + quantity * SALE_WEIGHT * factor,
+        )
+
+
+def record_order_sales(order):
+    """ثبت فروش اقلام یک سفارش پرداخت شده در امتیاز ترند"""
+    quantities = {}
+    for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    add_sales(quantities, order.payment_date)
+
+
+def recompute_scores(batch_size=500):
+    """
+    بازسازی کامل امتیازها از تاریخچه (برای مقداردهی اولیه)
+
+    فروش‌ها در زمان پرداخت سفارش و بازدیدهای کل عمر محصول در میانه بازه
+    ایجاد محصول تا اکنون در نظر گرفته می‌شوند.
+
+    Returns:
+        int: تعداد کارت‌های به‌روز شده
+    """
+    now = timezone.now()
+    scores = {}
+    for product_id, created_at, view_count in Product.objects.values_list('id', 'created_at', 'view_count'):
+        midpoint = created_at + (now - created_at) / 2
+        scores[product_id] = view_count * VIEW_WEIGHT * decay_factor(midpoint)
+
+    sales = OrderItem.objects.filter(order__status__in=PAID_STATUSES).values_list(
+        'product_id', Coalesce('order__payment_date', 'order__created_at'),
+    ).annotate(quantity=Sum('quantity')).order_by()
+    for product_id, paid_at, quantity in sales:
+        scores[product_id] = scores.get(product_id, 0) + quantity * SALE_WEIGHT * decay_factor(paid_at)
+
+    cards = [ProductCard(product_id=product_id, trending_score=score) for product_id, score in scores.items()]
+    ProductCard.objects.bulk_update(cards, ['trending_score'], batch_size=batch_size)
+    return len(cards)
@@ -10,12 +10,15 @@ urlpatterns = [
     path('products/new/', views.new_products, name='new_products'),
     path('products/bestseller/', views.bestseller_products, name='bestseller_products'),
     path('products/most-viewed/', views.most_viewed_products, name='most_viewed_products'),
+    path('products/trending/', views.trending_products, name='trending_products'),
     
     # Product detail
     path('product/<str:slug>/', views.product_detail, name='product_detail'),
     
 
     path('product/<int:product_id>/comment/', views.add_comment, name='add_comment'),
+    path('api/products/<int:product_id>/comments/', views.product_comments_json, name='product_comments_json'),
+    path('api/comments/<int:comment_id>/helpful/', views.vote_comment, name='vote_comment'),
 
     
     # Category products
@@ -31,9 +34,17 @@ urlpatterns = [
     path('api/products/', views.get_products_json, name='get_products_json'),
     path('api/categories/', views.get_categories_json, name='get_categories_json'),
     path('api/brands/', views.get_brands_json, name='get_brands_json'),
+    path('api/suggest/', views.suggest_json, name='suggest_json'),
+    path('feed/products/', views.product_feed, name='product_feed'),
+    path('api/page-cache-stats/', views.page_cache_stats, name='page_cache_stats'),
     path('api/add-to-cart/', views.add_to_cart, name='add_to_cart'),
+    path('api/cart/', views.cart_json, name='cart_json'),
+    path('api/cart/update/', views.update_cart_item, name='update_cart_item'),
+    path('api/cart/remove/', views.remove_from_cart, name='remove_from_cart'),
+    path('api/cart/sync/', views.sync_cart, name='sync_cart'),
     path('api/toggle-wishlist/', views.toggle_wishlist, name='toggle_wishlist'),
     path('api/check-stock/', views.check_stock_api, name='check_stock_api'),
+    path('api/check-stock/bulk/', views.check_stock_bulk_api, name='check_stock_bulk_api'),
     # Cart page
     path('cart/', views.cart_view, name='cart'),
     path('checkout/', views.checkout, name='checkout'),
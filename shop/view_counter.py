@@ -0,0 +1,257 @@
+"""بافر شمارش بازدید محصولات
+
+به جای یک UPDATE در هر بازدید صفحه محصول، بازدیدها در کش شمرده می‌شوند و به
+صورت دوره‌ای (یا با دستور flush_view_counts) با یک UPDATE گروهی
+view_count = view_count + delta روی Product و ProductCard اعمال می‌شوند.
+هنگام flush فقط مقدار مشاهده‌شده از شمارنده کم می‌شود تا بازدیدهای همزمان از
+دست نروند.
+
+محصولاتی که شمارنده در انتظار دارند هم در کش ثبت می‌شوند (بدون نوشتن در
+پایگاه داده در مسیر درخواست): اولین بازدید هر محصول یک شماره ترتیبی با incr
+می‌گیرد و شناسه محصول در خانه views:dirty:<شماره> ذخیره می‌شود؛ flush خانه‌ها را
+از آخرین شماره پردازش شده به بعد می‌خواند.
+
+شمارنده‌ها در کش جداگانه views هستند تا ورودی‌های کاتالوگ آن‌ها را بیرون نکنند.
+اگر با این حال خانه صف یا شمارنده‌ای از کش حذف شود، flush آن را در آمار evicted
+می‌شمارد. برای اجرای دستور flush_view_counts در پروسه جدا (و چند worker) کش
+باید مشترک باشد (Redis یا Memcached). با LocMemCache هر پروسه بافر خودش را
+دارد و فقط flush درون همان پروسه بازدیدهایش را اعمال می‌کند.
+"""
+import logging
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product, ProductCard
+from .trending import VIEW_WEIGHT, decay_factor, group_by_delta
+
+logger = logging.getLogger(__name__)
+
+VIEW_CACHE_ALIAS = 'views'
+VIEW_FLUSH_INTERVAL = 60
+FLUSH_LOCK_TIMEOUT = 60
+
+PENDING_SINCE_KEY = 'views:pending_since'
+LAST_FLUSH_KEY = 'views:last_flush'
+FLUSH_LOCK_KEY = 'views:flush_lock'
+DIRTY_SEQ_KEY = 'views:dirty:seq'
+DIRTY_DONE_KEY = 'views:dirty:done'
+# خانه خالی که flush قبلی روی آن متوقف شد؛ اگر باز هم خالی باشد حذف شده است
+DIRTY_STALLED_KEY = 'views:dirty:stalled'
+STATS_KEYS = {
+    'flushed': 'views:stats:flushed',
+    'dropped': 'views:stats:dropped',
+    'evicted': 'views:stats:evicted',
+    'flushes': 'views:stats:flushes',
+}
+
+
+def _cache():
+    return caches[VIEW_CACHE_ALIAS]
+
+
+def _pending_key(product_id):
+    return f'views:pending:{product_id}'
+
+
+def _dirty_key(slot):
+    return f'views:dirty:{slot}'
+
+
+def _incr(key, delta=1):
+    cache = _cache()
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _mark_dirty(product_ids):
+    """ثبت محصولات در صف flush (هر محصول در یک خانه با شماره ترتیبی)"""
+    for product_id in product_ids:
+        _cache().set(_dirty_key(_incr(DIRTY_SEQ_KEY)), product_id, None)
+
+
+def record_view(product_id):
+    """ثبت یک بازدید در بافر و flush در صورت گذشتن بازه زمانی"""
+    cache = _cache()
+    try:
+        if _incr(_pending_key(product_id)) == 1:
+            # اولین بازدید در انتظار این محصول؛ ثبت در صف flush
+            _mark_dirty([product_id])
+        cache.add(PENDING_SINCE_KEY, time.time(), None)
+    except Exception:
+        logger.exception('ثبت بازدید محصول %s ناموفق بود', product_id)
+        try:
+            _incr(STATS_KEYS['dropped'])
+        except Exception:
+            pass
+        return
+
+    last_flush = cache.get(LAST_FLUSH_KEY)
+    if last_flush is None:
+        cache.add(LAST_FLUSH_KEY, time.time(), None)
+    elif time.time() - last_flush >= VIEW_FLUSH_INTERVAL:
+        flush_views()
+
+
+def _read_dirty_slots(flushing=False):
+    """
+    خواندن خانه‌های صف از آخرین شماره پردازش شده
+
+    خانه خالی ممکن است هنوز در حال نوشتن باشد (بین incr و set)؛ خواندن روی آن
+    متوقف می‌شود و اگر در flush بعدی هم خالی بود، حذف شده از کش حساب می‌شود.
+
+    Returns:
+        tuple: (شناسه محصولات، شماره خانه‌های خوانده شده، تعداد خانه‌های حذف شده)
+    """
+    cache = _cache()
+    values = cache.get_many([DIRTY_SEQ_KEY, DIRTY_DONE_KEY, DIRTY_STALLED_KEY])
+    seq = values.get(DIRTY_SEQ_KEY, 0)
+    done = values.get(DIRTY_DONE_KEY, 0)
+    if done > seq:
+        # شمارنده ترتیبی از کش حذف شده و از نو شروع شده است
+        done = 0
+    slots = range(done + 1, seq + 1)
+    found = cache.get_many([_dirty_key(slot) for slot in slots])
+
+    product_ids = set()
+    read = []
+    evicted = 0
+    for slot in slots:
+        key = _dirty_key(slot)
+        if key in found:
+            product_ids.add(found[key])
+        elif values.get(DIRTY_STALLED_KEY) == slot:
+            evicted += 1
+        else:
+            if flushing:
+                cache.set(DIRTY_STALLED_KEY, slot, None)
+            break
+        read.append(slot)
+    return product_ids, read, evicted
+
+
+def dirty_product_ids():
+    """شناسه محصولاتی که بازدید در انتظار دارند"""
+    return _read_dirty_slots()[0]
+
+
+def pending_views(product_ids=None):
+    """بازدیدهای ثبت شده و هنوز اعمال نشده: نگاشت شناسه محصول به تعداد"""
+    if product_ids is None:
+        product_ids = dirty_product_ids()
+    keys = {_pending_key(product_id): product_id for product_id in product_ids}
+    pending = _cache().get_many(keys)
+    return {keys[key]: count for key, count in pending.items() if count}
+
+
+def apply_view_deltas(deltas):
+    """
+    اعمال افزایش بازدیدها با یک UPDATE به ازای هر مقدار delta
+
+    Args:
+        deltas: نگاشت شناسه محصول به تعداد بازدید جدید
+    """
+    factor = decay_factor()
+
+    with transaction.atomic():
+        for delta, product_ids in group_by_delta(deltas).items():
+            Product.objects.filter(id__in=product_ids).update(view_count=F('view_count') + delta)
+            # امتیاز ترند در همان UPDATE کارت محصول افزایش می‌یابد
+            ProductCard.objects.filter(product_id__in=product_ids).update(
+                view_count=F('view_count') + delta,
+                trending_score=F('trending_score') + delta * VIEW_WEIGHT * factor,
+            )
+
+
+def flush_views():
+    """
+    اعمال بازدیدهای بافر شده در پایگاه داده
+
+    Returns:
+        int: تعداد بازدیدهای اعمال شده (در صورت اجرای همزمان flush دیگر صفر)
+    """
+    cache = _cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        cache.set(LAST_FLUSH_KEY, time.time(), None)
+        pending_since = cache.get(PENDING_SINCE_KEY)
+        cache.delete(PENDING_SINCE_KEY)
+
+        # خانه‌های صف پیش از خواندن شمارنده‌ها آزاد می‌شوند
+        product_ids, read, evicted = _read_dirty_slots(flushing=True)
+        if read:
+            cache.set(DIRTY_DONE_KEY, read[-1], None)
+            cache.delete_many([_dirty_key(slot) for slot in read])
+
+        counters = cache.get_many([_pending_key(product_id) for product_id in product_ids])
+        deltas = {}
+        for product_id in product_ids:
+            count = counters.get(_pending_key(product_id))
+            if count is None:
+                # محصول در صف بدون شمارنده: شمارنده از کش حذف شده است
+                evicted += 1
+            elif count:
+                deltas[product_id] = count
+        if evicted:
+            logger.warning('%s مورد از بافر بازدید پیش از flush از کش حذف شده بود', evicted)
+            _incr(STATS_KEYS['evicted'], evicted)
+
+        requeue = []
+        for product_id, delta in deltas.items():
+            # فقط مقدار خوانده شده کم می‌شود؛ بازدیدهای همزمان در شمارنده باقی
+            # می‌مانند و محصول دوباره در صف ثبت می‌شود
+            if cache.decr(_pending_key(product_id), delta) > 0:
+                requeue.append(product_id)
+        _mark_dirty(requeue)
+
+        try:
+            apply_view_deltas(deltas)
+        except Exception:
+            logger.exception('اعمال بازدیدهای بافر شده ناموفق بود')
+            # بازگرداندن شمارنده‌ها برای flush بعدی
+            for product_id, delta in deltas.items():
+                try:
+                    _incr(_pending_key(product_id), delta)
+                except Exception:
+                    _incr(STATS_KEYS['dropped'], delta)
+            _mark_dirty(deltas)
+            return 0
+
+        flushed = sum(deltas.values())
+        if flushed:
+            _incr(STATS_KEYS['flushed'], flushed)
+        _incr(STATS_KEYS['flushes'])
+        if pending_since is not None:
+            logger.info('%s بازدید با تاخیر %.1f ثانیه اعمال شد', flushed, time.time() - pending_since)
+        return flushed
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def get_stats():
+    """
+    آمار بافر بازدید
+
+    Returns:
+        dict: pending (بازدیدهای در انتظار)، lag_seconds (عمر قدیمی‌ترین بازدید
+        اعمال نشده)، seconds_since_flush، flushed، flushes، dropped و evicted
+        (خانه‌های صف یا شمارنده‌هایی که پیش از flush از کش حذف شده‌اند)
+    """
+    values = _cache().get_many([PENDING_SINCE_KEY, LAST_FLUSH_KEY, *STATS_KEYS.values()])
+    now = time.time()
+    pending_since = values.get(PENDING_SINCE_KEY)
+    last_flush = values.get(LAST_FLUSH_KEY)
+    stats = {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+    stats.update({
+        'pending': sum(pending_views().values()),
+        'lag_seconds': round(now - pending_since, 1) if pending_since else 0,
+        'seconds_since_flush': round(now - last_flush, 1) if last_flush else None,
+    })
+    return stats
@@ -1,8 +1,12 @@
+import logging
+from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator, EmptyPage, InvalidPage
-from django.db.models import Q, F
-from django.http import JsonResponse
+from django.db.models import Q, F, Prefetch
+from django.http import JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_POST
 from django.shortcuts import get_object_or_404
 from .models import Product, Cart, CartItem, Wishlist, Settings, Order, OrderItem
@@ -10,22 +14,32 @@ from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
-from .models import Category, Product, ProductImage, Brand, Comment
+from .models import Category, Product, ProductImage, Brand, Comment, ProductCard
 from django.contrib import messages
 from django.db import transaction
 from .payment_gateway import payment_gateway
+from . import carts, catalog, inventory, ratings, related, reviews, suggest, view_counter, wishlists
+from .cards import primary_image_url
+from .counts import get_product_counts
+from .feed import FEED_FORMATS, generate_feed
+from . import page_cache
+from .conditional import SHIPPING_VERSION_KEY, versioned_condition
+from .page_cache import anonymous_page_cache
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import ShippingSettings
 
+logger = logging.getLogger(__name__)
+
 
 def check_real_time_stock(product_id, quantity):
     """بررسی موجودی محصول در زمان واقعی"""
     try:
         product = Product.objects.get(id=product_id, is_active=True)
         return {
-            'available': product.stock_quantity >= quantity,
-            'current_stock': product.stock_quantity,
+            'available': product.available_quantity >= quantity,
+            'current_stock': product.available_quantity,
             'requested': quantity,
             'product_name': product.name
         }
@@ -38,6 +52,45 @@ def check_real_time_stock(product_id, quantity):
         }
 
 
+def check_real_time_stock_bulk(quantities):
+    """
+    بررسی موجودی چند محصول با یک کوئری in_bulk
+
+    Args:
+        quantities: نگاشت شناسه محصول به تعداد درخواستی
+
+    Returns:
+        list: وضعیت هر قلم به ترتیب ورودی
+    """
+    products = Product.objects.filter(is_active=True).only(
+        'id', 'name', 'price', 'stock_quantity', 'reserved_quantity',
+    ).in_bulk(list(quantities))
+    results = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            results.append({
+                'product_id': product_id,
+                'found': False,
+                'available': False,
+                'current_stock': 0,
+                'requested': quantity,
+                'price': None,
+                'product_name': 'محصول نامشخص'
+            })
+            continue
+        results.append({
+            'product_id': product_id,
+            'found': True,
+            'available': product.available_quantity >= quantity,
+            'current_stock': product.available_quantity,
+            'requested': quantity,
+            'price': int(product.price),
+            'product_name': product.name
+        })
+    return results
+
+
 def get_shipping_settings():
     """دریافت تنظیمات هزینه ارسال"""
     try:
@@ -60,6 +113,7 @@ def get_shipping_settings():
     }
 
 
+@anonymous_page_cache('products')
 def product_list(request):
     """
     This Python function retrieves filter parameters for displaying a list of products with search and
@@ -71,103 +125,29 @@ def product_list(request):
     data or query
     """
     """نمایش لیست محصولات با فیلتر و جستجو"""
-    # Get filter parameters
-    category_slug = request.GET.get('category', '')
-    brand_slug = request.GET.get('brand', '')
-    search_query = request.GET.get('search', '')
-    min_price = request.GET.get('min_price', '')
-    max_price = request.GET.get('max_price', '')
-    sort_by = request.GET.get('sort', 'default')
-    quick_filter = request.GET.get('quick_filter', '')
-    
-    
-    # Base queryset
-    products = Product.objects.filter(is_active=True, stock_quantity__gt=0).select_related('category', 'brand').prefetch_related('images')
-    
-    # Apply category filter
-    if category_slug:
-        products = products.filter(category__slug=category_slug)
-    
-    # Apply brand filter
-    if brand_slug:
-        products = products.filter(brand__slug=brand_slug)
-    
-    # Apply search filter
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(brand__name__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
-    
-    # Apply price filters
-    if min_price:
-        try:
-            products = products.filter(price__gte=float(min_price))
-        except ValueError:
-            pass
-    
-    if max_price:
-        try:
-            products = products.filter(price__lte=float(max_price))
-        except ValueError:
-            pass
-    
-    # Apply quick filters
-    if quick_filter:
-        if quick_filter == 'bestseller':
-            products = products.filter(is_bestseller=True)
-        elif quick_filter == 'discount':
-            products = products.filter(has_discount=True)
-        elif quick_filter == 'new':
-            products = products.filter(is_new=True)
-        elif quick_filter == 'luxury':
-            products = products.filter(is_luxury=True)
+    spec = catalog.build_spec(request.GET)
+    versions = catalog.catalog_versions()
+    result = catalog.query_catalog(spec, request.GET.get('page'), versions=versions)
+    facets = result['facets']
     
-    # Apply sorting
-    if sort_by == 'price-low':
-        products = products.order_by('price')
-    elif sort_by == 'price-high':
-        products = products.order_by('-price')
-    elif sort_by == 'rating':
-        products = products.order_by('-rating')
-    elif sort_by == 'name':
-        products = products.order_by('name')
-    else:
-        products = products.order_by('-created_at')
-    
-    # Pagination
-    paginator = Paginator(products, 12)  # 12 products per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Get categories for filter
-    categories = Category.objects.filter(is_active=True)
-    
-    # Get brands for filter
-    brands = Brand.objects.filter(is_active=True)
-    
-    # Get featured products for sidebar
-    featured_products = Product.objects.filter(
-        is_active=True, 
-        is_featured=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')[:6]
+    # Get featured products for sidebar (from product cards, no joins)
+    featured_products = catalog.filtered_queryset(catalog.build_spec(quick_filter='featured'), versions)[:6]
     
     context = {
-        'products': page_obj,
-        'categories': categories,
-        'brands': brands,
+        'products': result['page'],
+        'categories': facets['categories'],
+        'brands': facets['brands'],
+        'facets': facets,
+        'price_facet': catalog.get_price_facet(spec, versions),
         'featured_products': featured_products,
-        'current_category': category_slug,
-        'current_brand': brand_slug,
-        'search_query': search_query,
-        'min_price': min_price,
-        'max_price': max_price,
-        'sort_by': sort_by,
-        'quick_filter': quick_filter,
-        'total_products': products.count(),
+        'current_category': spec['category'],
+        'current_brand': spec['brand'],
+        'search_query': spec['search'],
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
+        'sort_by': spec['sort'],
+        'quick_filter': spec['quick_filter'],
+        'total_products': result['total'],
     }
     
     return render(request, 'shop/product_list.html', context)
@@ -180,62 +160,167 @@ def product_detail(request, slug):
         is_active=True
     )
     
-    # Increment view count
-    product.view_count += 1
-    product.save(update_fields=['view_count'])
+    # Increment view count (buffered; applied in batches by view_counter.flush_views)
+    view_counter.record_view(product.id)
     
-    # Get approved comments
-    comments = product.comments.filter(is_approved=True).order_by('-created_at')
+    # First page of approved comments; the rest is loaded from product_comments_json
+    comments, next_comments_cursor = reviews.comment_page(product.id)
     
-    # Get related products
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product.id).select_related('category', 'brand').prefetch_related('images')[:4]
-    
-    # Get similar products (same category or similar price range)
-    similar_products = Product.objects.filter(
-        is_active=True
-    ).exclude(id=product.id).select_related('category', 'brand').prefetch_related('images')[:4]
+    # Related products: precomputed neighbors (rebuild_related_products), same-category fallback
+    related_products = related.related_cards(product)
     
-    # Check if product is in user's wishlist
-    is_in_wishlist = False
-    if request.user.is_authenticated:
-        try:
-            wishlist = Wishlist.objects.get(user=request.user)
-            is_in_wishlist = wishlist.products.filter(id=product.id).exists()
-        except Wishlist.DoesNotExist:
-            pass
+    # Check if product is in user's wishlist (cached id set)
+    is_in_wishlist = request.user.is_authenticated and product.id in wishlists.get_ids(request.user.id)
     
     context = {
         'product': product,
         'comments': comments,
+        'next_comments_cursor': next_comments_cursor,
         'related_products': related_products,
-        'similar_products': similar_products,
         'is_in_wishlist': is_in_wishlist,
     }
     
     return render(request, 'shop/product_detail.html', context)
 
 
+# بزرگ‌ترین مقدار ستون‌های عددی ۶۴ بیتی؛ شناسه‌های بزرگ‌تر در ORM خطای OverflowError می‌دهند
+MAX_PRODUCT_ID = 2 ** 63 - 1
+
+
+def _parse_product_id(value):
+    """شناسه محصول به صورت عدد صحیح مثبت در بازه ۶۴ بیتی؛ در غیر این صورت ValueError"""
+    product_id = int(value)
+    if not 1 <= product_id <= MAX_PRODUCT_ID:
+        raise ValueError('شناسه محصول نامعتبر است.')
+    return product_id
+
+
+def _parse_quantity(value, default):
+    """تعداد ارسالی فرم؛ عدد صحیح محدود به MAX_ITEM_QUANTITY (ValueError برای مقدار غیر عددی)"""
+    quantity = int(value) if value not in (None, '') else default
+    return min(quantity, carts.MAX_ITEM_QUANTITY)
+
+
+def _cart_quantities(raw, positive=False):
+    """
+    تبدیل اقلام ارسالی فرانت‌اند ([{"id": .., "quantity": ..}]) به نگاشت شناسه به تعداد
+
+    اقلام تکراری جمع زده می‌شوند و مجموع هر قلم به بازه
+    ±MAX_ITEM_QUANTITY محدود می‌شود؛ داده نامعتبر ValueError می‌دهد.
+
+    Args:
+        positive: هر تعداد باید عدد صحیح بین ۱ و MAX_ITEM_QUANTITY باشد (نه صفر،
+            منفی، اعشاری، رشته یا بیش از سقف)
+    """
+    import json
+    limit = carts.MAX_ITEM_QUANTITY
+    try:
+        items = json.loads(raw or '[]')
+        quantities = {}
+        for item in items:
+            quantity = item['quantity']
+            if positive and (type(quantity) is not int or not 1 <= quantity <= limit):
+                raise ValueError(quantity)
+            product_id = _parse_product_id(item['id'])
+            quantities[product_id] = quantities.get(product_id, 0) + int(quantity)
+    except (TypeError, KeyError, ValueError, OverflowError) as exc:
+        raise ValueError('اقلام سبد خرید نامعتبر است.') from exc
+    if positive and any(quantity > limit for quantity in quantities.values()):
+        raise ValueError('اقلام سبد خرید نامعتبر است.')
+    return {product_id: max(-limit, min(quantity, limit)) for product_id, quantity in quantities.items()}
+
+
+def cart_json(request):
+    """محتوای سبد خرید سمت سرور (کاربر یا نشست مهمان)"""
+    return JsonResponse({'ok': True, 'cart': carts.serialize_cart(carts.get_cart(request))})
+
+
 @csrf_exempt
 @require_POST
 def add_to_cart(request):
     """افزودن محصول به سبد خرید فعال کاربر. اگر وجود داشته باشد تعداد افزایش می‌یابد."""
-    product_id = request.POST.get('product_id')
-    quantity = int(request.POST.get('quantity', 1))
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    try:
+        product_id = _parse_product_id(request.POST.get('product_id', ''))
+    except ValueError:
+        return JsonResponse({'ok': False, 'message': 'شناسه محصول نامعتبر است.'}, status=400)
+    try:
+        quantity = _parse_quantity(request.POST.get('quantity'), 1)
+    except ValueError:
+        return JsonResponse({'ok': False, 'message': 'تعداد باید عدد باشد.'}, status=400)
+    if quantity < 1:
+        return JsonResponse({'ok': False, 'message': 'تعداد نامعتبر است.'}, status=400)
+    product = get_object_or_404(Product.objects.only(*carts.PRODUCT_FIELDS), id=product_id, is_active=True)
+    if carts.item_limit(product) <= 0:
+        return JsonResponse({'ok': False, 'message': 'این محصول موجود نیست.'}, status=400)
 
-    # For now, we'll just return success since we're using localStorage
-    # In a real app, you'd handle cart in database
+    cart = carts.get_cart(request, create=True)
+    item_quantity = carts.add_item(cart, product, quantity)
+    totals = carts.cart_totals(cart)
     return JsonResponse({
         'ok': True,
         'message': 'به سبد خرید اضافه شد',
-        'item_quantity': quantity,
-        'cart_items_count': 1,  # This will be updated by frontend
+        'item_quantity': item_quantity,
+        'cart_items_count': totals['quantity'],
+        'subtotal': int(totals['subtotal']),
     })
 
 
+@csrf_exempt
+@require_POST
+def update_cart_item(request):
+    """تغییر تعداد یک محصول در سبد؛ تعداد صفر آن را حذف می‌کند"""
+    try:
+        product_id = _parse_product_id(request.POST.get('product_id', ''))
+        quantity = _parse_quantity(request.POST.get('quantity'), 0)
+    except ValueError:
+        return JsonResponse({'ok': False, 'message': 'شناسه محصول و تعداد باید عدد باشند.'}, status=400)
+    cart = carts.get_cart(request)
+    if cart is None:
+        return JsonResponse({'ok': False, 'message': 'سبد خرید یافت نشد.'}, status=404)
+    if quantity <= 0:
+        carts.remove_item(cart, product_id)
+    else:
+        product = get_object_or_404(Product.objects.only(*carts.PRODUCT_FIELDS), id=product_id, is_active=True)
+        carts.set_quantity(cart, product, quantity)
+    return JsonResponse({'ok': True, 'cart': carts.serialize_cart(cart)})
+
+
+@csrf_exempt
+@require_POST
+def remove_from_cart(request):
+    """حذف یک محصول از سبد خرید"""
+    try:
+        product_id = _parse_product_id(request.POST.get('product_id', ''))
+    except ValueError:
+        return JsonResponse({'ok': False, 'message': 'شناسه محصول باید عدد باشد.'}, status=400)
+    cart = carts.get_cart(request)
+    if cart is not None:
+        carts.remove_item(cart, product_id)
+    return JsonResponse({'ok': True, 'cart': carts.serialize_cart(cart)})
+
+
+@csrf_exempt
+@require_POST
+def sync_cart(request):
+    """
+    همگام‌سازی سبد مرورگر (localStorage) با سبد سمت سرور و بازگرداندن نسخه معتبر آن
+
+    پارامتر changes تغییر تعداد اقلام نسبت به آخرین همگام‌سازی است (تعداد منفی
+    یعنی کاهش) و روی سبد سرور اعمال می‌شود؛ پارامتر cart_data (فقط با درخواست
+    صریح کاربر، مثل خالی کردن سبد) کل سبد را جایگزین می‌کند.
+    """
+    replace = 'cart_data' in request.POST
+    try:
+        quantities = _cart_quantities(request.POST.get('cart_data' if replace else 'changes'))
+    except ValueError as exc:
+        return JsonResponse({'ok': False, 'message': str(exc)}, status=400)
+    cart = carts.get_cart(request, create=any(quantity > 0 for quantity in quantities.values()))
+    skipped = []
+    if cart is not None:
+        skipped = carts.replace_items(cart, quantities) if replace else carts.apply_changes(cart, quantities)
+    return JsonResponse({'ok': True, 'cart': carts.serialize_cart(cart), 'skipped': skipped})
+
+
 @csrf_exempt
 @require_POST
 def check_stock_api(request):
@@ -272,6 +357,37 @@ def check_stock_api(request):
         })
 
 
+@csrf_exempt
+@require_POST
+def check_stock_bulk_api(request):
+    """API بررسی موجودی همه اقلام سبد در یک درخواست و یک کوئری"""
+    try:
+        quantities = _cart_quantities(request.POST.get('items'), positive=True)
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'فهرست اقلام نامعتبر است؛ تعداد هر قلم باید عدد صحیح مثبت باشد.'
+        }, status=400)
+    if not quantities:
+        return JsonResponse({
+            'success': False,
+            'message': 'فهرست اقلام خالی است.'
+        }, status=400)
+    if len(quantities) > 200:
+        return JsonResponse({
+            'success': False,
+            'message': 'تعداد اقلام بیش از حد مجاز است.'
+        }, status=400)
+
+    items = check_real_time_stock_bulk(quantities)
+    return JsonResponse({
+        'success': True,
+        'all_available': all(item['available'] for item in items),
+        'items': items,
+    })
+
+
+@versioned_condition(SHIPPING_VERSION_KEY)
 def get_shipping_settings_api(request):
     """API برای دریافت تنظیمات هزینه ارسال"""
     settings = get_shipping_settings()
@@ -287,141 +403,86 @@ def toggle_wishlist(request):
     product = get_object_or_404(Product, id=product_id, is_active=True)
 
     wishlist, _ = Wishlist.objects.get_or_create(user=request.user)
-    added = False
-    if wishlist.products.filter(id=product.id).exists():
-        wishlist.products.remove(product)
+    # تصمیم بر اساس نتیجه DELETE در پایگاه داده (نه مجموعه کش شده)؛ درخواست‌های
+    # همزمان یا کش قدیمی پروسه دیگر وضعیت را برعکس نمی‌کنند
+    through = Wishlist.products.through
+    deleted, _ = through.objects.filter(wishlist=wishlist, product=product).delete()
+    added = not deleted
+    if added:
+        through.objects.get_or_create(wishlist=wishlist, product=product)
+        wishlists.add_ids(request.user.id, [product.id])
     else:
-        wishlist.products.add(product)
-        added = True
+        wishlists.remove_ids(request.user.id, [product.id])
+    # حذف و درج مستقیم جدول واسط سیگنال m2m_changed ندارند
+    related.mark_dirty([product.id])
 
     return JsonResponse({'ok': True, 'added': added})
 
+@anonymous_page_cache('category:{slug}')
 def category_products(request, slug):
     """نمایش محصولات یک دسته‌بندی"""
     category = get_object_or_404(Category, slug=slug, is_active=True)
-    products = Product.objects.filter(
-        category=category,
-        is_active=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    spec = catalog.build_spec(category=category.slug)
+    result = catalog.query_catalog(spec, request.GET.get('page'))
     
     context = {
         'category': category,
-        'products': page_obj,
-        'total_products': products.count(),
+        'products': result['page'],
+        'facets': result['facets'],
+        'total_products': result['total'],
     }
     
     return render(request, 'shop/category_products.html', context)
 
+@anonymous_page_cache('brand:{slug}')
 def brand_products(request, slug):
     """نمایش محصولات یک برند"""
     brand = get_object_or_404(Brand, slug=slug, is_active=True)
-    products = Product.objects.filter(
-        brand=brand,
-        is_active=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    spec = catalog.build_spec(brand=brand.slug)
+    result = catalog.query_catalog(spec, request.GET.get('page'))
     
     context = {
         'brand': brand,
-        'products': page_obj,
-        'total_products': products.count(),
+        'products': result['page'],
+        'facets': result['facets'],
+        'total_products': result['total'],
     }
     
     return render(request, 'shop/brand_products.html', context)
 
-def featured_products(request):
-    """نمایش محصولات ویژه"""
-    products = Product.objects.filter(
-        is_active=True,
-        is_featured=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def _catalog_listing(request, page_title, **spec_overrides):
+    """رندر یک لیست ثابت از کاتالوگ (ویژه، جدید، پرفروش و ...)"""
+    spec = catalog.build_spec(**spec_overrides)
+    result = catalog.query_catalog(spec, request.GET.get('page'))
     
     context = {
-        'products': page_obj,
-        'total_products': products.count(),
-        'page_title': 'محصولات ویژه',
+        'products': result['page'],
+        'facets': result['facets'],
+        'total_products': result['total'],
+        'page_title': page_title,
     }
     
     return render(request, 'shop/product_list.html', context)
 
+def featured_products(request):
+    """نمایش محصولات ویژه"""
+    return _catalog_listing(request, 'محصولات ویژه', quick_filter='featured')
+
 def new_products(request):
     """نمایش محصولات جدید"""
-    products = Product.objects.filter(
-        is_active=True,
-        is_new=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'products': page_obj,
-        'total_products': products.count(),
-        'page_title': 'محصولات جدید',
-    }
-    
-    return render(request, 'shop/product_list.html', context)
+    return _catalog_listing(request, 'محصولات جدید', quick_filter='new')
 
 def bestseller_products(request):
     """نمایش محصولات پرفروش"""
-    products = Product.objects.filter(
-        is_active=True,
-        is_bestseller=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'products': page_obj,
-        'total_products': products.count(),
-        'page_title': 'محصولات پرفروش',
-    }
-    
-    return render(request, 'shop/product_list.html', context)
+    return _catalog_listing(request, 'محصولات پرفروش', quick_filter='bestseller')
 
 def most_viewed_products(request):
     """نمایش محصولات پربازدید"""
-    products = Product.objects.filter(
-        is_active=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images').order_by('-view_count')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'products': page_obj,
-        'total_products': products.count(),
-        'page_title': 'پربازدیدترین محصولات',
-    }
-    
-    return render(request, 'shop/product_list.html', context)
+    return _catalog_listing(request, 'پربازدیدترین محصولات', sort='most-viewed')
+
+def trending_products(request):
+    """نمایش محصولات ترند (بازدید و فروش اخیر با زوال زمانی)"""
+    return _catalog_listing(request, 'محصولات ترند', sort='trending')
 
 def search_products(request):
     """جستجوی محصولات"""
@@ -429,32 +490,172 @@ def search_products(request):
     if not query:
         return redirect('shop:product_list')
     
-    products = Product.objects.filter(
-        Q(name__icontains=query) |
-        Q(description__icontains=query) |
-        Q(brand__name__icontains=query) |
-        Q(category__name__icontains=query),
-        is_active=True,
-        stock_quantity__gt=0
-    ).select_related('category', 'brand').prefetch_related('images')
-    
-    # Pagination
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    spec = catalog.build_spec(search=query)
+    versions = catalog.catalog_versions()
+    result = catalog.query_catalog(spec, request.GET.get('page'), versions=versions)
     
     context = {
-        'products': page_obj,
+        'products': result['page'],
+        'facets': result['facets'],
         'search_query': query,
-        'total_products': products.count(),
+        'fuzzy_search': catalog.is_fuzzy_search(query, versions),
+        'total_products': result['total'],
         'page_title': f'نتایج جستجو برای "{query}"',
     }
     
     return render(request, 'shop/product_list.html', context)
 
+# فیلدهای API محصولات و ستون‌های مورد نیاز هر فیلد در مدل Product
+PRODUCT_API_COLUMNS = {
+    'id': ['id'],
+    'name': ['name'],
+    'slug': ['slug'],
+    'price': ['price'],
+    'original_price': ['original_price'],
+    'discount_percentage': ['discount_percentage'],
+    'has_discount': ['has_discount'],
+    'category_name': ['category__name'],
+    'category_slug': ['category__slug'],
+    'brand_name': ['brand__name'],
+    'brand_slug': ['brand__slug'],
+    'rating': ['rating'],
+    'review_count': ['review_count'],
+    'is_bestseller': ['is_bestseller'],
+    'is_new': ['is_new'],
+    'is_featured': ['is_featured'],
+    'is_luxury': ['is_luxury'],
+    'stock_quantity': ['stock_quantity'],
+    'image_url': [],
+    'images': [],
+    'description': ['description'],
+    'short_description': ['short_description'],
+    'telegram_link': ['telegram_link'],
+    'instagram_link': ['instagram_link'],
+    'facebook_link': ['facebook_link'],
+}
+
+# فیلدهایی که مستقیماً از جدول کارت محصول (ProductCard) خوانده می‌شوند
+CARD_API_FIELDS = [
+    'id', 'name', 'slug', 'price', 'original_price', 'discount_percentage', 'has_discount',
+    'category_name', 'category_slug', 'brand_name', 'brand_slug', 'rating', 'review_count',
+    'is_bestseller', 'is_new', 'is_featured', 'is_luxury', 'stock_quantity', 'image_url',
+    'short_description', 'telegram_link', 'instagram_link', 'facebook_link',
+]
+
+PRODUCT_API_PROFILES = {
+    'card': CARD_API_FIELDS,
+    'detail': [field for field in PRODUCT_API_COLUMNS if field != 'image_url'],
+}
+
+def _parse_product_fields(value):
+    """تبدیل پارامتر fields به لیست فیلدها؛ نام پروفایل (card/detail) یا لیست جدا شده با کاما"""
+    if value in PRODUCT_API_PROFILES:
+        return PRODUCT_API_PROFILES[value]
+    requested = {field.strip() for field in value.split(',')}
+    fields = [field for field in PRODUCT_API_COLUMNS if field in requested]
+    if not fields:
+        return PRODUCT_API_PROFILES['card']
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def _products_for_fields(fields):
+    """
+    کوئری پایه محصولات با کمترین ستون‌های لازم برای فیلدهای درخواستی
+
+    اگر همه فیلدها در کارت محصول موجود باشند از ProductCard (بدون join و prefetch)
+    و در غیر این صورت از Product با only و Prefetch تصاویر خوانده می‌شود.
+    """
+    if set(fields) <= set(CARD_API_FIELDS):
+        columns = {'created_at', 'price', 'rating', 'view_count'}  # کلیدهای مرتب‌سازی cursor
+        columns.update(field for field in fields if field != 'id')
+        return ProductCard.objects.filter(is_active=True, stock_quantity__gt=0).only(*columns)
+
+    columns = {'id', 'created_at', 'view_count', 'category', 'brand'}
+    for field in fields:
+        columns.update(PRODUCT_API_COLUMNS[field])
+    products = Product.objects.filter(is_active=True, stock_quantity__gt=0).select_related('category', 'brand')
+    if 'images' in fields or 'image_url' in fields:
+        products = products.prefetch_related(Prefetch(
+            'images',
+            queryset=ProductImage.objects.only('id', 'product', 'image', 'alt_text', 'is_primary', 'order'),
+        ))
+    return products.only(*columns)
+
+def _api_value(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+def _serialize_card(card, fields):
+    """تبدیل کارت محصول به دیکشنری برای API"""
+    data = {}
+    for field in fields:
+        value = card.pk if field == 'id' else getattr(card, field)
+        if field in ('brand_name', 'brand_slug', 'image_url'):
+            value = value or None
+        data[field] = _api_value(value)
+    return data
+
+def _serialize_product(product, fields=PRODUCT_API_PROFILES['detail']):
+    """تبدیل محصول به دیکشنری برای API"""
+    if isinstance(product, ProductCard):
+        return _serialize_card(product, fields)
+
+    data = {}
+    for field in fields:
+        if field == 'images':
+            data['images'] = [{
+                'id': img.id,
+                'image': img.image.url,
+                'alt_text': img.alt_text,
+                'is_primary': img.is_primary,
+                'order': img.order
+            } for img in product.images.all()]
+        elif field == 'image_url':
+            data['image_url'] = primary_image_url(product.images.all()) or None
+        elif field in ('category_name', 'category_slug'):
+            data[field] = getattr(product.category, field[len('category_'):])
+        elif field in ('brand_name', 'brand_slug'):
+            data[field] = getattr(product.brand, field[len('brand_'):]) if product.brand else None
+        else:
+            data[field] = _api_value(getattr(product, field))
+    return data
+
+@versioned_condition(catalog.CATALOG_VERSION_KEY)
 def get_products_json(request):
-    """API endpoint برای دریافت محصولات به صورت JSON"""
-    products = Product.objects.filter(is_active=True, stock_quantity__gt=0).select_related('category', 'brand').prefetch_related('images')
+    """
+    API endpoint برای دریافت محصولات به صورت JSON
+
+    دو حالت صفحه‌بندی دارد:
+    - حالت cursor (با پارامتر cursor=1 یا after=<token>): بدون OFFSET و COUNT؛
+      تعداد کل فقط در صفحه اول برگردانده می‌شود.
+    - حالت page (قدیمی): صفحه‌بندی با شماره صفحه
+
+    پارامتر fields شکل خروجی و ستون‌های خوانده شده را تعیین می‌کند: پروفایل
+    card (پیش‌فرض؛ از جدول کارت محصول)، detail (شامل توضیحات، تصاویر و لینک‌ها)
+    یا لیستی از نام فیلدها جدا شده با کاما.
+    """
+    fields = _parse_product_fields(request.GET.get('fields', 'card'))
+    products = _products_for_fields(fields)
+    
+    after = request.GET.get('after', '')
+    if after or request.GET.get('cursor'):
+        sort = request.GET.get('sort', catalog.DEFAULT_CURSOR_SORT)
+        if sort not in catalog.CURSOR_SORTS:
+            sort = catalog.DEFAULT_CURSOR_SORT
+        try:
+            items, next_cursor = catalog.keyset_page(products, sort, after)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'cursor نامعتبر است.'}, status=400)
+        
+        response = {
+            'products': [_serialize_product(product, fields) for product in items],
+            'has_next': next_cursor is not None,
+            'next_cursor': next_cursor,
+            'sort': sort,
+        }
+        if not after:
+            response['total_products'] = catalog.get_facets(catalog.build_spec())['total']
+        return JsonResponse(response)
     
     # Pagination for infinite scroll
     page = request.GET.get('page', 1)
@@ -463,51 +664,13 @@ def get_products_json(request):
     except ValueError:
         page = 1
     
-    paginator = Paginator(products, 12)  # 12 products per page
+    paginator = Paginator(products.order_by('-created_at', '-pk'), 12)  # 12 products per page
     try:
         page_obj = paginator.page(page)
     except (EmptyPage, InvalidPage):
         page_obj = paginator.page(paginator.num_pages)
     
-    data = []
-    for product in page_obj:
-        # Get all images for the product
-        images = []
-        for img in product.images.all():
-            images.append({
-                'id': img.id,
-                'image': img.image.url,
-                'alt_text': img.alt_text,
-                'is_primary': img.is_primary,
-                'order': img.order
-            })
-        
-        data.append({
-            'id': product.id,
-            'name': product.name,
-            'slug': product.slug,
-            'price': float(product.price),
-            'original_price': float(product.original_price) if product.original_price else None,
-            'discount_percentage': product.discount_percentage,
-            'has_discount': product.has_discount,
-            'category_name': product.category.name,
-            'category_slug': product.category.slug,
-            'brand_name': product.brand.name if product.brand else None,
-            'brand_slug': product.brand.slug if product.brand else None,
-            'rating': float(product.rating),
-            'review_count': product.review_count,
-            'is_bestseller': product.is_bestseller,
-            'is_new': product.is_new,
-            'is_featured': product.is_featured,
-            'is_luxury': product.is_luxury,
-            'stock_quantity': product.stock_quantity,
-            'images': images,
-            'description': product.description,
-            'short_description': product.short_description,
-            'telegram_link': product.telegram_link,
-            'instagram_link': product.instagram_link,
-            'facebook_link': product.facebook_link,
-        })
+    data = [_serialize_product(product, fields) for product in page_obj]
     
     return JsonResponse({
         'products': data,
@@ -517,9 +680,11 @@ def get_products_json(request):
         'total_products': paginator.count
     })
 
+@versioned_condition(catalog.CATALOG_VERSION_KEY)
 def get_categories_json(request):
     """API endpoint برای دریافت دسته‌بندی‌ها به صورت JSON"""
     categories = Category.objects.filter(is_active=True)
+    counts = get_product_counts()['categories']
     
     data = []
     for category in categories:
@@ -527,14 +692,16 @@ def get_categories_json(request):
             'id': category.id,
             'name': category.name,
             'slug': category.slug,
-            'products_count': category.get_products_count(),
+            'products_count': counts.get(category.id, 0),
         })
     
     return JsonResponse({'categories': data})
 
+@versioned_condition(catalog.CATALOG_VERSION_KEY)
 def get_brands_json(request):
     """API endpoint برای دریافت برندها به صورت JSON"""
     brands = Brand.objects.filter(is_active=True)
+    counts = get_product_counts()['brands']
     
     data = []
     for brand in brands:
@@ -542,12 +709,61 @@ def get_brands_json(request):
             'id': brand.id,
             'name': brand.name,
             'slug': brand.slug,
-            'products_count': brand.get_products_count(),
+            'products_count': counts.get(brand.id, 0),
             'logo_url': brand.logo.url if brand.logo else None,
         })
     
     return JsonResponse({'brands': data})
 
+def product_feed(request):
+    """
+    خروجی جریانی کاتالوگ برای سایت‌های مقایسه قیمت
+
+    پارامترها: format (jsonl یا csv)، since (زمان ISO برای دریافت فقط تغییرات).
+    در صورت پشتیبانی کلاینت، خروجی به صورت تدریجی با gzip فشرده می‌شود.
+    """
+    feed_format = request.GET.get('format', 'jsonl')
+    if feed_format not in FEED_FORMATS:
+        return JsonResponse({'success': False, 'message': 'فرمت نامعتبر است.'}, status=400)
+    
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = parse_datetime(request.GET['since'])
+        except ValueError:
+            # قالب درست ولی تاریخ نامعتبر (مثلاً ماه ۱۳)
+            since = None
+        if since is None:
+            return JsonResponse({'success': False, 'message': 'مقدار since نامعتبر است.'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+    
+    # زمان شروع خروجی؛ شریک در درخواست بعدی از آن به عنوان since استفاده می‌کند
+    generated_at = timezone.now()
+    compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    
+    response = StreamingHttpResponse(
+        generate_feed(feed_format, since=since, base_url=base_url, compress=compress),
+        content_type=FEED_FORMATS[feed_format],
+    )
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'inline; filename="products.{feed_format}"'
+    response['X-Feed-Generated-At'] = generated_at.isoformat()
+    return response
+
+@staff_member_required
+def page_cache_stats(request):
+    """API endpoint آمار کش صفحات (فقط برای کارکنان)"""
+    return JsonResponse(page_cache.get_stats())
+
+def suggest_json(request):
+    """API endpoint پیشنهاد جستجو (autocomplete) از ایندکس پیشوندی در حافظه"""
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': suggest.suggest(query)})
+
 def test_products(request):
     """تست نمایش محصولات"""
     products = Product.objects.filter(is_active=True, stock_quantity__gt=0).select_related('category', 'brand')
@@ -608,9 +824,6 @@ def add_comment(request, product_id):
             is_approved=True  # برای تست، همه کامنت‌ها تایید می‌شوند
         )
         
-        # بروزرسانی امتیاز محصول
-        product.update_rating()
-        
         return JsonResponse({
             'success': True,
             'message': 'نظر شما با موفقیت ثبت شد.',
@@ -630,6 +843,60 @@ def add_comment(request, product_id):
         })
 
 
+def product_comments_json(request, product_id):
+    """
+    API صفحه‌بندی شده نظرات تایید شده یک محصول
+
+    پارامترها: sort (newest یا helpful)، rating (۱ تا ۵)، after (cursor صفحه قبل)
+    و html=1 برای دریافت نسخه رندر شده هر نظر.
+    """
+    product = get_object_or_404(
+        Product.objects.only('id', 'rating', *ratings.TOTAL_FIELDS), id=product_id, is_active=True,
+    )
+    sort = request.GET.get('sort', 'newest')
+    if sort not in reviews.COMMENT_SORTS:
+        sort = 'newest'
+    try:
+        rating = int(request.GET.get('rating') or 0)
+    except ValueError:
+        rating = 0
+    if rating not in range(1, 6):
+        rating = None
+
+    try:
+        comments, next_cursor = reviews.comment_page(product.id, sort, rating, request.GET.get('after') or None)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'cursor نامعتبر است.'}, status=400)
+
+    items = []
+    for comment in comments:
+        item = reviews.serialize_comment(comment)
+        if request.GET.get('html') == '1':
+            item['html'] = render_to_string('shop/comment_item.html', {'comment': comment}, request=request)
+        items.append(item)
+    return JsonResponse({
+        'success': True,
+        'comments': items,
+        'has_next': next_cursor is not None,
+        'next_cursor': next_cursor,
+        'sort': sort,
+        'rating': float(product.rating),
+        'review_count': product.review_count,
+        'histogram': product.rating_histogram,
+    })
+
+
+@login_required
+@require_POST
+@csrf_exempt
+def vote_comment(request, comment_id):
+    """ثبت رای «مفید بود» برای یک نظر (هر کاربر یک بار)"""
+    comment = get_object_or_404(Comment, id=comment_id, is_approved=True)
+    voted = reviews.mark_helpful(comment, request.user)
+    comment.refresh_from_db(fields=['helpful_count'])
+    return JsonResponse({'ok': True, 'voted': voted, 'helpful_count': comment.helpful_count})
+
+
 def cart_view(request):
     """نمایش سبد خرید بر اساس تمپلیت موجود در home.html (سکشن Cart Page) اما در صفحه جداگانه."""
     # این صفحه بیشتر فرانت‌اندی است؛ اقلام سبد خرید سمت کلاینت رندر می‌شود
@@ -667,83 +934,88 @@ def checkout(request):
 @require_POST
 @csrf_exempt
 def process_order(request):
-    """پردازش سفارش و ایجاد فاکتور"""
+    """
+    پردازش سفارش و ایجاد فاکتور
+
+    محصولات سبد با یک کوئری in_bulk خوانده می‌شوند، مبالغ با Decimal محاسبه
+    می‌شوند و تراکنش فقط ایجاد سفارش، درج گروهی اقلام، رزرو موجودی و خالی
+    کردن سبد را در بر می‌گیرد تا قفل نوشتن SQLite کوتاه بماند.
+    """
+    # دریافت داده‌های سفارش
+    receiver_name = request.POST.get('receiver_name', '').strip()
+    receiver_phone = request.POST.get('receiver_phone', '').strip()
+    province_name = request.POST.get('province_name', '').strip()
+    city_name = request.POST.get('city_name', '').strip()
+    address_detail = request.POST.get('address_detail', '').strip()
+    postal_code = request.POST.get('postal_code', '').strip()
+    
+    # اعتبارسنجی داده‌ها
+    if not all([receiver_name, receiver_phone, province_name, city_name, address_detail, postal_code]):
+        return JsonResponse({
+            'success': False,
+            'message': 'لطفاً تمام فیلدهای ضروری را پر کنید.'
+        })
+    
     try:
-        with transaction.atomic():
-            # دریافت داده‌های سفارش
-            receiver_name = request.POST.get('receiver_name', '').strip()
-            receiver_phone = request.POST.get('receiver_phone', '').strip()
-            province_name = request.POST.get('province_name', '').strip()
-            city_name = request.POST.get('city_name', '').strip()
-            address_detail = request.POST.get('address_detail', '').strip()
-            postal_code = request.POST.get('postal_code', '').strip()
-            
-            # اعتبارسنجی داده‌ها
-            if not all([receiver_name, receiver_phone, province_name, city_name, address_detail, postal_code]):
+        # سبد سمت سرور منبع سفارش است؛ سبد مرورگر در صورت ارسال ابتدا با آن همگام می‌شود
+        cart = carts.get_cart(request, create='cart_data' in request.POST)
+        if 'cart_data' in request.POST:
+            try:
+                carts.replace_items(cart, _cart_quantities(request.POST['cart_data']))
+            except ValueError:
                 return JsonResponse({
                     'success': False,
-                    'message': 'لطفاً تمام فیلدهای ضروری را پر کنید.'
+                    'message': 'خطا در پردازش سبد خرید.'
                 })
-            
-            # دریافت اقلام سبد خرید از localStorage (در فرانت‌اند)
-            cart_data = request.POST.get('cart_data', '[]')
-            import json
-            try:
-                cart_items = json.loads(cart_data)
-            except json.JSONDecodeError:
+        quantities = dict(cart.items.values_list('product_id', 'quantity')) if cart else {}
+        
+        if not quantities:
+            return JsonResponse({
+                'success': False,
+                'message': 'سبد خرید شما خالی است.'
+            })
+        
+        # همه محصولات سبد با یک کوئری
+        products = Product.objects.filter(is_active=True).only(
+            'id', 'name', 'price', 'stock_quantity', 'reserved_quantity',
+        ).in_bulk(list(quantities))
+        
+        # بررسی موجودی و محاسبه قیمت‌ها
+        subtotal = Decimal('0')
+        order_items = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
                 return JsonResponse({
                     'success': False,
-                    'message': 'خطا در پردازش سبد خرید.'
+                    'message': f'محصول با شناسه {product_id} یافت نشد.'
                 })
             
-            if not cart_items:
+            # بررسی موجودی آزاد (موجودی منهای رزروها)؛ رزرو در تراکنش قطعی می‌شود
+            if product.available_quantity < quantity:
                 return JsonResponse({
                     'success': False,
-                    'message': 'سبد خرید شما خالی است.'
+                    'message': f'موجودی محصول "{product.name}" کافی نیست. موجودی: {product.available_quantity}, درخواستی: {quantity}'
                 })
             
-            # محاسبه مبالغ
-            subtotal = 0
-            shipping_settings = get_shipping_settings()
-            
-            # بررسی موجودی و محاسبه قیمت‌ها
-            order_items_data = []
-            for item in cart_items:
-                try:
-                    product = Product.objects.get(id=item['id'], is_active=True)
-                    
-                    # بررسی موجودی در زمان واقعی
-                    if product.stock_quantity < item['quantity']:
-                        return JsonResponse({
-                            'success': False,
-                            'message': f'موجودی محصول "{product.name}" کافی نیست. موجودی: {product.stock_quantity}, درخواستی: {item["quantity"]}'
-                        })
-                    
-                    # محاسبه قیمت
-                    unit_price = float(product.price)
-                    total_price = unit_price * item['quantity']
-                    subtotal += total_price
-                    
-                    order_items_data.append({
-                        'product': product,
-                        'quantity': item['quantity'],
-                        'unit_price': unit_price,
-                        'total_price': total_price
-                    })
-                    
-                except Product.DoesNotExist:
-                    return JsonResponse({
-                        'success': False,
-                        'message': f'محصول با شناسه {item["id"]} یافت نشد.'
-                    })
-            
-            # محاسبه هزینه ارسال
-            shipping_cost = shipping_settings['shipping_cost']
-            if subtotal >= shipping_settings['free_shipping_threshold']:
-                shipping_cost = 0
-            
-            total_amount = subtotal + shipping_cost
-            
+            total_price = product.price * quantity
+            subtotal += total_price
+            order_items.append(OrderItem(
+                product=product,
+                quantity=quantity,
+                unit_price=product.price,
+                total_price=total_price
+            ))
+        
+        # محاسبه هزینه ارسال
+        shipping_settings = get_shipping_settings()
+        shipping_cost = Decimal(shipping_settings['shipping_cost'])
+        if subtotal >= shipping_settings['free_shipping_threshold']:
+            shipping_cost = Decimal('0')
+        
+        total_amount = subtotal + shipping_cost
+        
+        with transaction.atomic():
             # ایجاد سفارش
             order = Order.objects.create(
                 user=request.user,
@@ -759,40 +1031,39 @@ def process_order(request):
                 postal_code=postal_code
             )
             
-            # ایجاد آیتم‌های سفارش (بدون کاهش موجودی)
-            for item_data in order_items_data:
-                OrderItem.objects.create(
-                    order=order,
-                    product=item_data['product'],
-                    quantity=item_data['quantity'],
-                    unit_price=item_data['unit_price'],
-                    total_price=item_data['total_price']
-                )
-                
-                # موجودی محصول در این مرحله کم نمی‌شود
-                # موجودی فقط زمانی کم می‌شود که پرداخت موفق باشد
-            
-            # ارسال پیام موفقیت
-            messages.success(request, f'سفارش شما با شماره #{order.id} با موفقیت ثبت شد.')
+            # ایجاد آیتم‌های سفارش با یک INSERT (بدون کاهش موجودی)
+            # موجودی فقط زمانی کم می‌شود که پرداخت موفق باشد
+            for order_item in order_items:
+                order_item.order = order
+            OrderItem.objects.bulk_create(order_items)
             
-            # ارسال پیام به ترمینال
-            print(f"🛒 سفارش جدید ثبت شد!")
-            print(f"   شماره سفارش: #{order.id}")
-            print(f"   کاربر: {request.user.username}")
-            print(f"   مبلغ کل: {total_amount:,} تومان")
-            print(f"   تعداد آیتم‌ها: {len(order_items_data)}")
-            print(f"   تاریخ: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}")
-            print("=" * 50)
+            # رزرو موقت موجودی تا پرداخت؛ کمبود موجودی کل تراکنش را برمی‌گرداند
+            inventory.reserve(order, quantities)
             
-            return JsonResponse({
-                'success': True,
-                'message': f'سفارش شما با شماره #{order.id} با موفقیت ثبت شد.',
-                'order_id': order.id,
-                'redirect_url': f'/shop/order/{order.id}/'
-            })
+            carts.clear(cart)
+        
+        # ارسال پیام موفقیت
+        messages.success(request, f'سفارش شما با شماره #{order.id} با موفقیت ثبت شد.')
+        
+        logger.info(
+            f"🛒 سفارش جدید ثبت شد: #{order.id} - کاربر: {request.user.username} - "
+            f"مبلغ کل: {total_amount:,} تومان - تعداد آیتم‌ها: {len(order_items)}"
+        )
+        
+        return JsonResponse({
+            'success': True,
+            'message': f'سفارش شما با شماره #{order.id} با موفقیت ثبت شد.',
+            'order_id': order.id,
+            'redirect_url': f'/shop/order/{order.id}/'
+        })
             
-    except Exception as e:
-        print(f"خطا در پردازش سفارش: {e}")
+    except inventory.InsufficientStockError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        })
+    except Exception:
+        logger.exception("خطا در پردازش سفارش")
         return JsonResponse({
             'success': False,
             'message': 'خطا در پردازش سفارش. لطفاً دوباره تلاش کنید.'
@@ -822,9 +1093,13 @@ def pay_order(request, order_id):
         messages.info(request, 'این سفارش قبلاً پرداخت شده است.')
         return redirect('shop:order_detail', order_id=order.id)
     
-    # شبیه‌سازی پرداخت موفق
-    order.status = 'paid'
-    order.save(update_fields=['status'])
+    # شبیه‌سازی پرداخت موفق؛ مانند بازگشت از درگاه رزرو آزاد و موجودی کم می‌شود
+    try:
+        order.mark_as_paid(f'SIM-{order.id}', order.payment_authority)
+    except ValueError as e:
+        order.mark_as_payment_failed(-1, f"خطا در کاهش موجودی: {e}")
+        messages.error(request, f'خطا در پردازش سفارش: {e}')
+        return redirect('shop:order_detail', order_id=order.id)
     
     messages.success(request, f'پرداخت سفارش #{order.id} با موفقیت انجام شد.')
     return redirect('shop:order_detail', order_id=order.id)
@@ -965,7 +1240,7 @@ def initiate_payment(request, order_id):
     """شروع فرآیند پرداخت برای سفارش"""
     order = get_object_or_404(Order, id=order_id, user=request.user)
     
-    if not order.can_pay:
+    if not order.can_pay():
         # بررسی دلیل عدم امکان پرداخت
         if order.status != 'pending':
             messages.error(request, 'این سفارش قابل پرداخت نیست.')
@@ -0,0 +1,45 @@
+"""کش مجموعه شناسه محصولات علاقه‌مندی هر کاربر
+
+مجموعه شناسه‌ها یک بار از جدول واسط خوانده و در کش نگه داشته می‌شود و با
+toggle_wishlist و سیگنال m2m_changed در جا به‌روز می‌شود؛ بنابراین نمایش
+وضعیت علاقه‌مندی روی همه کارت‌های محصول بدون کوئری اضافه انجام می‌شود.
+"""
+from django.core.cache import cache
+
+from .models import Wishlist
+
+WISHLIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _key(user_id):
+    return f'wishlist:ids:{user_id}'
+
+
+def get_ids(user_id):
+    """مجموعه شناسه محصولات علاقه‌مندی کاربر"""
+    ids = cache.get(_key(user_id))
+    if ids is None:
+        ids = set(Wishlist.products.through.objects.filter(
+            wishlist__user_id=user_id,
+        ).values_list('product_id', flat=True))
+        cache.set(_key(user_id), ids, WISHLIST_CACHE_TIMEOUT)
+    return ids
+
+
+def add_ids(user_id, product_ids):
+    """افزودن شناسه‌ها به مجموعه کش شده (در صورت وجود)"""
+    ids = cache.get(_key(user_id))
+    if ids is not None:
+        cache.set(_key(user_id), ids | set(product_ids), WISHLIST_CACHE_TIMEOUT)
+
+
+def remove_ids(user_id, product_ids):
+    """حذف شناسه‌ها از مجموعه کش شده (در صورت وجود)"""
+    ids = cache.get(_key(user_id))
+    if ids is not None:
+        cache.set(_key(user_id), ids - set(product_ids), WISHLIST_CACHE_TIMEOUT)
+
+
+def invalidate(*user_ids):
+    """حذف مجموعه کش شده کاربران تا در خواندن بعدی از پایگاه داده ساخته شود"""
+    cache.delete_many([_key(user_id) for user_id in user_ids])
@@ -25,10 +25,79 @@ document.addEventListener('DOMContentLoaded', function() {
       shippingSettings.freeShippingThreshold = 500000;
     });
 
+  // The server cart is the source of truth (login merge, other devices).
+  // Only the changes made in this browser since the last sync are sent, as
+  // quantity deltas against the last synced snapshot; syncs run one at a time.
+  let syncQueue = Promise.resolve();
+
   // Initialize cart
   renderCartItems();
   updateCartSummary();
   updateCartCount();
+  syncCart();
+
+  function syncCart(replace = false) {
+    syncQueue = syncQueue.then(() => pushCartChanges(replace));
+    return syncQueue;
+  }
+
+  function quantitiesOf(items) {
+    const quantities = {};
+    items.forEach(item => {
+      quantities[item.id] = (quantities[item.id] || 0) + (parseInt(item.quantity) || 0);
+    });
+    return quantities;
+  }
+
+  function quantityChanges(current, previous) {
+    const ids = new Set([...Object.keys(current), ...Object.keys(previous)]);
+    return [...ids]
+      .map(id => ({ id: parseInt(id), quantity: (current[id] || 0) - (previous[id] || 0) }))
+      .filter(change => change.quantity !== 0);
+  }
+
+  function pushCartChanges(replace) {
+    const synced = JSON.parse(localStorage.getItem('cart_synced') || '{}');
+    const sent = quantitiesOf(cart);
+    const formData = new FormData();
+    if (replace) {
+      formData.append('cart_data', JSON.stringify(cart.map(item => ({ id: item.id, quantity: item.quantity }))));
+    } else {
+      formData.append('changes', JSON.stringify(quantityChanges(sent, synced)));
+    }
+    return fetch('/shop/api/cart/sync/', { method: 'POST', body: formData })
+      .then(response => response.json())
+      .then(data => {
+        if (!data.ok) return;
+        // Edits made while the request was in flight are kept and sent next
+        const pending = quantityChanges(quantitiesOf(cart), sent);
+        const localItems = cart;
+        cart = data.cart.items.map(item => ({
+          id: item.id,
+          name: item.name,
+          price: item.price,
+          quantity: item.quantity,
+          image: item.image
+        }));
+        localStorage.setItem('cart_synced', JSON.stringify(quantitiesOf(cart)));
+        pending.forEach(change => {
+          const item = cart.find(entry => entry.id === change.id);
+          if (item) {
+            item.quantity += change.quantity;
+          } else if (change.quantity > 0) {
+            const local = localItems.find(entry => entry.id === change.id);
+            if (local) cart.push({ ...local, quantity: change.quantity });
+          }
+        });
+        cart = cart.filter(item => item.quantity > 0);
+        localStorage.setItem('cart', JSON.stringify(cart));
+        renderCartItems();
+        updateCartSummary();
+        updateCartCount();
+        if (pending.length) syncCart();
+      })
+      .catch(error => console.error('Error syncing cart:', error));
+  }
 
   function renderCartItems() {
     const cartContainer = document.getElementById('cart-items');
@@ -133,6 +202,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Re-render cart
     renderCartItems();
     updateCartSummary();
+    syncCart();
   };
 
   window.updateQuantity = function(productId, newQuantity) {
@@ -152,6 +222,7 @@ document.addEventListener('DOMContentLoaded', function() {
       // Re-render cart
       renderCartItems();
       updateCartSummary();
+      syncCart();
     }
   };
 
@@ -160,8 +231,25 @@ document.addEventListener('DOMContentLoaded', function() {
       alert('سبد خرید شما خالی است!');
       return;
     }
-    // Redirect to checkout page
-    window.location.href = '/shop/checkout/';
+    // Validate the whole cart in one request before leaving the page
+    const formData = new FormData();
+    formData.append('items', JSON.stringify(cart.map(item => ({ id: item.id, quantity: parseInt(item.quantity) }))));
+    fetch('/shop/api/check-stock/bulk/', { method: 'POST', body: formData })
+      .then(response => response.json())
+      .then(data => {
+        if (data.success && !data.all_available) {
+          const missing = data.items
+            .filter(item => !item.available)
+            .map(item => `${item.product_name} (موجودی: ${item.current_stock})`);
+          alert('موجودی این محصولات کافی نیست:\n' + missing.join('\n'));
+          return;
+        }
+        // Redirect to checkout page
+        window.location.href = '/shop/checkout/';
+      })
+      .catch(() => {
+        window.location.href = '/shop/checkout/';
+      });
   };
 
   // Clear Cart function
@@ -172,6 +260,8 @@ document.addEventListener('DOMContentLoaded', function() {
     updateCartCount();
     renderCartItems();
     updateCartSummary();
+    // Explicit user action: replace the server cart instead of sending deltas
+    syncCart(true);
     console.log('Cart cleared. Current cart:', cart);
   };
 });
@@ -249,7 +249,7 @@ class CartManager {
                 // Use API data if available
                 name = productData.name;
                 price = Number(productData.price);
-                image = productData.images && productData.images.length > 0 ? productData.images[0].image : null;
+                image = productData.image_url || (productData.images && productData.images.length > 0 ? productData.images[0].image : null);
             } else {
                 // Fallback to HTML extraction
                 name = this.extractProductName(card);
@@ -32,6 +32,7 @@ let currentPageNumber = 1;
 let isLoading = false;
 let hasMoreProducts = true;
 let productsPerPage = 12;
+let nextProductsCursor = null;
 
 // Load products from API
 // Load products from API
@@ -43,7 +44,11 @@ async function loadProducts(page = 1, append = false) {
     window.isLoadingProducts = true;
     
     try {
-        const response = await fetch(`/shop/api/products/?page=${page}`);
+        // Cursor pagination: the next page is requested with the token of the last item
+        const url = append && nextProductsCursor
+            ? `/shop/api/products/?after=${encodeURIComponent(nextProductsCursor)}`
+            : '/shop/api/products/?cursor=1';
+        const response = await fetch(url);
         const data = await response.json();
         
         if (data.products && Array.isArray(data.products)) {
@@ -57,7 +62,8 @@ async function loadProducts(page = 1, append = false) {
             window.products = products;
             
             hasMoreProducts = data.has_next;
-            currentPageNumber = data.current_page;
+            nextProductsCursor = data.next_cursor;
+            currentPageNumber = page;
             
             // Apply all filters after products are loaded
             applyAllFilters();
@@ -133,6 +139,19 @@ window.updateResultsInfo = updateResultsInfo;
 window.filterProducts = filterProducts;
 window.filterProducts = filterProducts;
 
+// Primary image of a product (card profile sends image_url, detail profile sends images)
+function productImageUrl(product) {
+    if (product.image_url) return product.image_url;
+    return product.images && product.images.length > 0 ? product.images[0].image : null;
+}
+
+// Product description (card profile sends short_description, detail profile sends description)
+function productSummary(product, maxLength) {
+    const text = product.short_description || product.description || '';
+    if (!maxLength || text.length <= maxLength) return text;
+    return text.substring(0, maxLength) + '...';
+}
+
 // Load products globally for stock validation
 async function loadProductsForStockValidation() {
     if (!window.products || window.products.length === 0) {
@@ -756,7 +775,7 @@ window.addToCart = function(productId, event) {
             name: product.name,
             price: Number(product.price),
             quantity: 1,
-            image: product.images && product.images.length > 0 ? product.images[0].image : null,
+            image: productImageUrl(product),
             color: 'from-pink-200 to-purple-200',
             iconColor: 'text-gray-400'
         };
@@ -979,6 +998,33 @@ window.showNotification = function(message, type = 'success') {
     }, 5000);
 }
 
+// Search suggestions (autocomplete)
+let suggestTimer = null;
+
+function loadSearchSuggestions(query) {
+    const datalist = document.getElementById('search-suggestions');
+    if (!datalist) return;
+
+    clearTimeout(suggestTimer);
+    suggestTimer = setTimeout(() => {
+        if (!query.trim()) {
+            datalist.innerHTML = '';
+            return;
+        }
+        fetch(`/shop/api/suggest/?q=${encodeURIComponent(query)}`)
+            .then(response => response.json())
+            .then(data => {
+                datalist.innerHTML = '';
+                data.suggestions.forEach(item => {
+                    const option = document.createElement('option');
+                    option.value = item.name;
+                    datalist.appendChild(option);
+                });
+            })
+            .catch(error => console.error('Error loading suggestions:', error));
+    }, 150);
+}
+
 // Filter Functions
 document.addEventListener('DOMContentLoaded', function() {
     // Other code for toggleCompact, etc.
@@ -1429,8 +1475,8 @@ function openProductModal(productId) {
             <!-- Product Image -->
             <div class="space-y-3 lg:space-y-4">
                 <div id="main-product-image" class="w-full h-48 sm:h-64 lg:h-80 bg-gradient-to-br from-pink-200 to-purple-200 rounded-2xl flex items-center justify-center shadow-lg transition-all duration-300">
-                    ${product.images && product.images.length > 0 
-                        ? `<img src="${product.images[0].image}" alt="${product.name}" class="w-full h-full object-cover rounded-2xl">`
+                    ${productImageUrl(product)
+                        ? `<img src="${productImageUrl(product)}" alt="${product.name}" class="w-full h-full object-cover rounded-2xl">`
                         : `<i class="fas fa-image text-4xl sm:text-5xl lg:text-6xl text-gray-400"></i>`
                     }
                 </div>
@@ -1544,10 +1590,10 @@ function openProductModal(productId) {
                     </div>
                     
                     <!-- Product Description -->
-                    ${product.description ? `
+                    ${productSummary(product) ? `
                     <div class="mb-4">
                         <h4 class="font-medium mb-2 text-sm lg:text-base text-gray-900 dark:text-white">توضیحات:</h4>
-                        <p class="text-xs lg:text-sm text-gray-700 dark:text-gray-300 leading-relaxed">${product.description}</p>
+                        <p class="text-xs lg:text-sm text-gray-700 dark:text-gray-300 leading-relaxed">${productSummary(product)}</p>
                     </div>
                     ` : ''}
                     
@@ -1769,6 +1815,14 @@ function formatPriceInput(input) {
     input.value = value;
 }
 
+// Keep the price text inputs in sync with the sidebar price slider
+function syncPriceRange(range, inputId) {
+    const input = document.getElementById(inputId);
+    if (!input) return;
+    input.value = range.value;
+    formatPriceInput(input);
+}
+
 // ===== CORE APP JAVASCRIPT FUNCTIONS =====
 
 // Auth tab switching
@@ -2127,6 +2181,7 @@ document.addEventListener('DOMContentLoaded', function() {
         searchInputEl.addEventListener('input', function() {
             activeFilters.search = this.value.toLowerCase();
             filterProducts();
+            loadSearchSuggestions(this.value);
         });
     }
     
@@ -2330,6 +2385,11 @@ function applyPriceFilters() {
     filterProducts();
 }
 
+// Wishlist state rendered by the server (window.WISHLIST_IDS, see base.html)
+function isInWishlist(productId) {
+    return Boolean(window.WISHLIST_IDS && window.WISHLIST_IDS.has(Number(productId)));
+}
+
 function renderGridView(productsToRender, grid) {
     productsToRender.forEach(product => {
         
@@ -2357,8 +2417,8 @@ function renderGridView(productsToRender, grid) {
                 
                 <!-- Image Container -->
                 <div class="product-image-container">
-                    ${product.images && product.images.length > 0 
-                        ? `<img src="${product.images[0].image}" alt="${product.name}" class="product-image">`
+                    ${productImageUrl(product)
+                        ? `<img src="${productImageUrl(product)}" alt="${product.name}" class="product-image">`
                         : `<div class="placeholder-container">
                             <div class="placeholder-icon">
                                 <i class="fas fa-image"></i>
@@ -2382,7 +2442,7 @@ function renderGridView(productsToRender, grid) {
                     <div class="product-info">
                         <!-- Short Description -->
                         <div class="product-short-description text-sm text-gray-600 mb-2">
-                            ${product.description ? product.description.substring(0, 80) + (product.description.length > 80 ? '...' : '') : 'توضیحات محصول'}
+                            ${productSummary(product, 80) || 'توضیحات محصول'}
                         </div>
                         
                         <div class="product-rating">
@@ -2428,8 +2488,8 @@ function renderGridView(productsToRender, grid) {
                     
                     <!-- Action Buttons - Bottom Right -->
                     <div class="product-actions">
-                        <button class="wishlist-btn" data-product-id="${product.id}">
-                            <i class="far fa-heart"></i>
+                        <button class="wishlist-btn" data-product-id="${product.id}"${isInWishlist(product.id) ? ' style="background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%)"' : ''}>
+                            <i class="${isInWishlist(product.id) ? 'fas' : 'far'} fa-heart"></i>
                         </button>
                         <button class="cart-button" data-product-id="${product.id}">
                             <i class="fas fa-shopping-cart"></i>
@@ -2553,6 +2613,9 @@ window.addToWishlist = async function(productId, event) {
         if (response.ok) {
             const data = await response.json();
             
+            if (window.WISHLIST_IDS) {
+                window.WISHLIST_IDS[data.added ? 'add' : 'delete'](Number(productId));
+            }
             if (data.added) {
                 // Add to wishlist
                 icon.classList.remove('far');
@@ -148,7 +148,50 @@
         }).catch(() => {});
       });
     }
-    
+
+    // Comments pagination (keyset cursor from /shop/api/products/<id>/comments/)
+    const commentsList = document.getElementById('comments-list');
+    const loadMoreComments = document.getElementById('load-more-comments');
+    if (loadMoreComments && commentsList) {
+      loadMoreComments.addEventListener('click', function() {
+        const productId = root.dataset.productId;
+        const params = new URLSearchParams({ after: this.dataset.nextCursor, html: '1' });
+        this.disabled = true;
+        fetch(`/shop/api/products/${productId}/comments/?${params}`)
+          .then(resp => resp.json())
+          .then(data => {
+            if (!data.success) return;
+            data.comments.forEach(item => commentsList.insertAdjacentHTML('beforeend', item.html));
+            if (data.has_next) {
+              this.dataset.nextCursor = data.next_cursor;
+              this.disabled = false;
+            } else {
+              this.parentElement.remove();
+            }
+          })
+          .catch(() => { this.disabled = false; });
+      });
+    }
+
+    // Helpful votes
+    if (commentsList) {
+      commentsList.addEventListener('click', function(e) {
+        const btn = e.target.closest('.comment-helpful-btn');
+        if (!btn || btn.disabled) return;
+        btn.disabled = true;
+        fetch(`/shop/api/comments/${btn.dataset.commentId}/helpful/`, {
+          method: 'POST',
+          headers: { 'X-Requested-With': 'XMLHttpRequest', 'X-CSRFToken': getCsrfToken() }
+        }).then(resp => resp.ok ? resp.json() : null).then(data => {
+          if (data && data.ok) {
+            btn.querySelector('.helpful-count').textContent = data.helpful_count;
+            btn.classList.add('text-purple-600');
+          } else {
+            btn.disabled = false;
+          }
+        }).catch(() => { btn.disabled = false; });
+      });
+    }
 
     // Tabs
     function showProductTab(tabName) {
@@ -233,7 +276,7 @@
                 name: product.name,
                 price: parseFloat(product.price) || 0,
                 quantity: quantity,
-                image: product.images && product.images.length > 0 ? product.images[0].image : null,
+                image: product.image_url || (product.images && product.images.length > 0 ? product.images[0].image : null),
                 color: 'from-pink-200 to-purple-200',
                 iconColor: 'text-gray-400'
               };